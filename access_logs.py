@@ -0,0 +1,99 @@
+import os
+import base64
+import binascii
+from typing import Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from db import Database, to_epoch, to_iso
+
+# 기간 조회 한 페이지 크기 (JSON) / NDJSON 스트리밍 시 DB 에서 한 번에 읽는 행 수
+RECORDS_PAGE_SIZE = int(os.getenv("RECORDS_PAGE_SIZE", "1000"))
+RECORDS_MAX_PAGE_SIZE = int(os.getenv("RECORDS_MAX_PAGE_SIZE", "10000"))
+RECORDS_STREAM_BATCH = int(os.getenv("RECORDS_STREAM_BATCH", "1000"))
+
+RECORD_COLUMNS = ("cid", "blockchain_address", "provider_wallet", "creator_wallet", "price", "timestamp", "tx_hash", "verified")
+FILTER_COLUMNS = ("cid", "provider_wallet")  # (column, timestamp) 인덱스가 있는 컬럼만 허용
+
+
+def encode_record_cursor(timestamp: int, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp}:{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_record_cursor(cursor: str) -> Tuple[int, int]:
+    """커서 토큰 → 마지막으로 반환한 (timestamp, id) (잘못된 토큰이면 ValueError)"""
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        return int(timestamp), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+def day_bounds(start_date: Optional[str], end_date: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """YYYY-MM-DD 기간 → (시작일 00:00:00, 종료일 23:59:59) UTC epoch 초"""
+    start = to_epoch(start_date + "T00:00:00") if start_date else None
+    end = to_epoch(end_date + "T23:59:59") if end_date else None
+    if (start_date and start is None) or (end_date and end is None):
+        raise HTTPException(status_code=400, detail="날짜는 YYYY-MM-DD 형식이어야 합니다.")
+    return start, end
+
+
+def record_dict(row: tuple) -> dict:
+    record = dict(zip(RECORD_COLUMNS, row))
+    record["timestamp"] = to_iso(record["timestamp"])
+    record["verified"] = None if record["verified"] is None else bool(record["verified"])  # None: 결제 미검증
+    return record
+
+
+class AccessLogQuery:
+    """cid / provider_wallet + 기간 접속 기록 조회 (최신순, (timestamp, id) keyset 페이지네이션)"""
+
+    def __init__(self, db: Database, column: str, value: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"unsupported filter column: {column}")
+        self.db = db
+        self.column = column
+        self.value = value
+        self.start, self.end = day_bounds(start_date, end_date)
+
+    def sql(self, after: Optional[Tuple[int, int]], limit: int) -> Tuple[str, list]:
+        query = f"""
+            SELECT {", ".join(RECORD_COLUMNS)}, id
+            FROM streaming_access_logs
+            WHERE {self.column} = ?
+        """
+        params: list = [self.value]
+
+        # 기간 필터링 추가
+        if self.start is not None:
+            query += " AND timestamp >= ?"
+            params.append(self.start)
+        if self.end is not None:
+            query += " AND timestamp <= ?"
+            params.append(self.end)
+        # 이전 페이지 마지막 행 다음부터 (OFFSET 없이 인덱스에서 바로 이어서 읽음)
+        if after is not None:
+            query += " AND (timestamp < ? OR (timestamp = ? AND id < ?))"
+            params.extend((after[0], after[0], after[1]))
+
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"  # 최신 데이터부터 정렬
+        params.append(limit)
+        return query, params
+
+    def page(self, cursor: Optional[str], limit: int) -> Tuple[List[dict], Optional[str]]:
+        """한 페이지 (기록, 다음 커서) - 다음 페이지가 없으면 커서는 None"""
+        after = decode_record_cursor(cursor) if cursor else None
+        rows = self.db.fetchall(*self.sql(after, limit + 1))
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_record_cursor(rows[-1][5], rows[-1][-1])
+        return [record_dict(row[:-1]) for row in rows], next_cursor
+
+    def iter_records(self, cursor: Optional[str] = None, batch: int = RECORDS_STREAM_BATCH) -> Iterator[dict]:
+        """커서부터 끝까지 batch 행씩 읽어 하나씩 반환 (메모리 사용량은 batch 크기로 제한)"""
+        while True:
+            records, cursor = self.page(cursor, batch)
+            yield from records
+            if cursor is None:
+                return
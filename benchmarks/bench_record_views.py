@@ -0,0 +1,97 @@
+"""접속 기록 저장 처리량 벤치마크: 기존 방식(요청마다 connect + INSERT + commit) vs write-behind group commit
+
+    python benchmarks/bench_record_views.py --events 20000 --threads 8
+
+각 방식은 같은 스키마의 새 DB 파일에 여러 스레드가 동시에 기록을 넣는 시간을 잰다.
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database
+from view_log import INSERT_VIEWS, ViewLogWriter
+
+SCHEMA = """
+    CREATE TABLE streaming_access_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, cid TEXT, blockchain_address TEXT,
+        provider_wallet TEXT, creator_wallet TEXT, price REAL, timestamp TEXT, tx_hash TEXT
+    )
+"""
+
+
+def row(i):
+    return (f"Qm{i % 1000}", f"0x{i:040x}", "0xprovider", "0xcreator", 0.001, "2025-01-01T00:00:00Z", None)
+
+
+def run_threads(threads, events, func):
+    per_thread = events // threads
+
+    def worker(offset):
+        for i in range(offset, offset + per_thread):
+            func(row(i))
+
+    workers = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return per_thread * threads, time.perf_counter() - start
+
+
+def bench_legacy(path, events, threads):
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    conn.close()
+
+    def insert(values):
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            conn.execute(INSERT_VIEWS, values)
+            conn.commit()
+        finally:
+            conn.close()
+
+    return run_threads(threads, events, insert)
+
+
+def bench_write_behind(path, events, threads):
+    db = Database(path)
+    db.execute(SCHEMA)
+    writer = ViewLogWriter(db, max_pending=events + 1)
+    writer.start()
+    count, _ = run_threads(threads, events, lambda values: writer.submit([values]))
+    start = time.perf_counter()
+    writer.stop()  # 버퍼가 모두 디스크에 저장될 때까지 포함
+    drained = time.perf_counter() - start
+    stored = db.fetchone("SELECT COUNT(*) FROM streaming_access_logs")[0]
+    db.close()
+    assert stored == count, (stored, count)
+    return count, writer, drained
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        count, elapsed = bench_legacy(os.path.join(tmp, "legacy.db"), args.events, args.threads)
+        print(f"legacy        rows={count} time={elapsed:.2f}s rate={count / elapsed:,.0f} rows/s")
+
+        start = time.perf_counter()
+        count, writer, drained = bench_write_behind(os.path.join(tmp, "buffered.db"), args.events, args.threads)
+        elapsed = time.perf_counter() - start
+        print(f"write-behind  rows={count} time={elapsed:.2f}s rate={count / elapsed:,.0f} rows/s "
+              f"(batches={writer.batches}, final drain={drained * 1000:.0f}ms)")
+
+
+if __name__ == "__main__":
+    main()
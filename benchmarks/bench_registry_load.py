@@ -0,0 +1,156 @@
+"""레지스트리 조회 부하 벤치마크: 동기 redis.Redis + def 핸들러(이전) vs redis.asyncio 연결 풀 + async 핸들러(현재)
+
+    python benchmarks/bench_registry_load.py --concurrency 64 --duration 10
+
+localhost Redis(--redis-url, 기본 db 15 - 벤치마크가 비움)에 서버를 등록한 뒤 두 앱을 각각 uvicorn 으로 띄우고
+GET /get_list_stream_by_cid/{cid} 의 초당 요청 수와 p50/p99 지연을 비교한다.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import redis
+from fastapi import FastAPI, HTTPException
+
+from stream_registry import StreamRegistry, cid_key, decode_server, server_key
+
+# 이전 방식: 스레드풀에서 블로킹 클라이언트로 조회
+legacy_app = FastAPI()
+legacy_client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/15"), decode_responses=True)
+
+
+@legacy_app.get("/get_list_stream_by_cid/{cid}")
+def legacy_list_stream_by_cid(cid: str):
+    ids = legacy_client.smembers(cid_key(cid))
+    pipe = legacy_client.pipeline(transaction=False)
+    for sid in ids:
+        pipe.hgetall(server_key(sid))
+    server_list = [decode_server(fields) for fields in pipe.execute() if fields]
+    if not server_list:
+        raise HTTPException(status_code=404, detail="해당 CID에 대한 스트리밍 서버가 없습니다.")
+    return {"cid": cid, "servers": server_list}
+
+
+async def seed(url, cids, servers_per_cid):
+    import redis.asyncio as aioredis
+
+    client = aioredis.Redis.from_url(url, decode_responses=True)
+    try:
+        await client.flushdb()
+        registry = StreamRegistry(client)
+        for i in range(cids):
+            for j in range(servers_per_cid):
+                await registry.register({
+                    "cid": f"Qm{i:044d}",
+                    "video_name": f"video {i}",
+                    "content_creator_wallet": f"0x{i:040x}",
+                    "content_distributor_wallet": f"0x{j:040x}",
+                    "creator_share": 70,
+                    "provider_share": 30,
+                    "price": 0.01,
+                    "stream_url": f"https://node{j}.example.com/stream",
+                })
+    finally:
+        await client.aclose()
+
+
+async def load(base_url, cids, concurrency, duration):
+    import httpx
+
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            cid = f"Qm{random.randrange(cids):044d}"
+            start = time.perf_counter()
+            response = await client.get(f"/get_list_stream_by_cid/{cid}")
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "errors": errors,
+    }
+
+
+def wait_ready(port, timeout=30):
+    import httpx
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn 이 시작되지 않았습니다")
+
+
+def run_app(label, app, env, args):
+    port = args.port
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        wait_ready(port)
+        result = asyncio.run(load(f"http://127.0.0.1:{port}", args.cids, args.concurrency, args.duration))
+        print(f"{label:6s} rps={result['rps']:8.0f} p50={result['p50_ms']:7.2f}ms p99={result['p99_ms']:7.2f}ms errors={result['errors']}")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379/15"))
+    parser.add_argument("--cids", type=int, default=1000)
+    parser.add_argument("--servers-per-cid", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    try:
+        redis.Redis.from_url(args.redis_url).ping()
+    except redis.RedisError:
+        sys.exit(f"redis 연결 불가: {args.redis_url}")
+
+    asyncio.run(seed(args.redis_url, args.cids, args.servers_per_cid))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "REDIS_URL": args.redis_url,
+            "DB_PATH": os.path.join(tmp, "bench.db"),
+            "UPLOAD_PATH": os.path.join(tmp, "uploads"),
+            "STREAM_PATH": os.path.join(tmp, "streaming"),
+            "PYTHONPATH": os.pathsep.join([ROOT, os.path.join(ROOT, "benchmarks")]),
+        }
+        run_app("sync", "bench_registry_load:legacy_app", env, args)
+        run_app("async", "gateway:app", env, args)
+
+
+if __name__ == "__main__":
+    main()
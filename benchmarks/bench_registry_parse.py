@@ -0,0 +1,101 @@
+"""스트리밍 서버 목록 파싱 비용 벤치마크: `str(dict)` + ast.literal_eval vs Redis 해시 + decode_server
+
+    python benchmarks/bench_registry_parse.py --servers 10000
+
+Redis 가 localhost 에 떠 있으면 (--redis-url) SMEMBERS 한 번 vs SMEMBERS + 파이프라인 HGETALL 왕복도 함께 측정한다.
+"""
+import os
+import sys
+import ast
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stream_registry import decode_server, encode_server, server_id
+
+
+def make_servers(count):
+    servers = []
+    for i in range(count):
+        server = {
+            "cid": f"Qm{i % 100:044d}",
+            "video_name": f"video {i}",
+            "content_creator_wallet": f"0x{i:040x}",
+            "content_distributor_wallet": f"0x{i * 7:040x}",
+            "creator_share": 70,
+            "provider_share": 30,
+            "price": 0.01,
+            "stream_url": f"https://node{i}.example.com/stream",
+        }
+        server["server_id"] = server_id(server["cid"], server["content_distributor_wallet"], server["stream_url"])
+        server["registered_at"] = 1700000000
+        servers.append(server)
+    return servers
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:28s} {elapsed * 1000:8.1f}ms  {elapsed / count * 1e6:6.2f}us/server")
+
+
+def bench_parse(servers):
+    legacy = [str(server) for server in servers]
+    hashes = [encode_server(server) for server in servers]
+    timed("literal_eval(str(dict))", len(servers), lambda: [ast.literal_eval(member) for member in legacy])
+    timed("decode_server(hash)", len(servers), lambda: [decode_server(fields) for fields in hashes])
+
+
+def bench_redis(servers, url):
+    import redis
+
+    client = redis.Redis.from_url(url, decode_responses=True)
+    try:
+        client.ping()
+    except redis.RedisError:
+        print(f"redis 미사용 ({url} 연결 불가) - 왕복 측정 생략")
+        return
+
+    legacy_key = "bench:legacy"
+    client.delete(legacy_key)
+    client.sadd(legacy_key, *(str(server) for server in servers))
+    pipe = client.pipeline(transaction=False)
+    for server in servers:
+        pipe.hset(f"bench:server:{server['server_id']}", mapping=encode_server(server))
+        pipe.sadd("bench:index", server["server_id"])
+    pipe.execute()
+
+    # 같은 키 공간을 쓰지 않도록 벤치용 접두사로 조회
+    def fetch_hashes():
+        ids = client.smembers("bench:index")
+        pipe = client.pipeline(transaction=False)
+        for sid in ids:
+            pipe.hgetall(f"bench:server:{sid}")
+        return [decode_server(fields) for fields in pipe.execute()]
+
+    try:
+        timed("SMEMBERS + literal_eval", len(servers), lambda: [ast.literal_eval(m) for m in client.smembers(legacy_key)])
+        timed("SMEMBERS + pipelined HGETALL", len(servers), fetch_hashes)
+    finally:
+        pipe = client.pipeline(transaction=False)
+        pipe.delete(legacy_key, "bench:index")
+        for server in servers:
+            pipe.delete(f"bench:server:{server['server_id']}")
+        pipe.execute()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--servers", type=int, default=10000)
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379/15"))
+    args = parser.parse_args()
+
+    servers = make_servers(args.servers)
+    bench_parse(servers)
+    bench_redis(servers, args.redis_url)
+
+
+if __name__ == "__main__":
+    main()
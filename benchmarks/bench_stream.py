@@ -0,0 +1,81 @@
+"""세그먼트 전송 벤치마크: sendfile(2) zero-copy vs 파이썬 read 루프
+
+    python benchmarks/bench_stream.py --size-mb 512
+
+로컬 TCP 소켓으로 같은 파일을 전송하며 처리량을 비교하고,
+플레이어 탐색(seek)에 해당하는 작은 Range 읽기 비용도 함께 측정한다.
+"""
+import os
+import time
+import socket
+import argparse
+import tempfile
+import threading
+
+READ_LOOP_CHUNK = 64 * 1024  # Starlette FileResponse 기본 청크 크기
+
+
+def _drain(server: socket.socket, done: threading.Event):
+    conn, _ = server.accept()
+    with conn:
+        while conn.recv(4 * 1024 * 1024):
+            pass
+    done.set()
+
+
+def _send(path: str, mode: str, offset: int = 0, count: int = None) -> float:
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    done = threading.Event()
+    threading.Thread(target=_drain, args=(server, done), daemon=True).start()
+
+    size = os.path.getsize(path)
+    count = size - offset if count is None else count
+    client = socket.create_connection(server.getsockname())
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        if mode == "sendfile":
+            sent = 0
+            while sent < count:
+                sent += os.sendfile(client.fileno(), f.fileno(), offset + sent, count - sent)
+        else:
+            f.seek(offset)
+            remaining = count
+            while remaining:
+                chunk = f.read(min(READ_LOOP_CHUNK, remaining))
+                client.sendall(chunk)
+                remaining -= len(chunk)
+    client.close()
+    done.wait()
+    elapsed = time.perf_counter() - start
+    server.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "segment.ts")
+        with open(path, "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+        size = os.path.getsize(path)
+
+        for mode in ("read_loop", "sendfile"):
+            best = min(_send(path, mode) for _ in range(args.repeat))
+            print(f"{mode:9s} full  {size / 2**20:.0f}MiB in {best:.3f}s -> {size / 2**20 / best:.0f}MiB/s")
+
+        # 탐색: 파일 중간에서 256KiB 만 읽음 (전체 다운로드 없이 한 번의 작은 Range 읽기)
+        for mode in ("read_loop", "sendfile"):
+            best = min(_send(path, mode, offset=size // 2, count=256 * 1024) for _ in range(args.repeat))
+            print(f"{mode:9s} seek  256KiB at {size // 2**21}MiB in {best * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""업로드 저장 경로 벤치마크: 기존 file.read() 방식 vs 청크 스트리밍 방식
+
+    python benchmarks/bench_upload.py --size-mb 512
+
+각 방식은 별도 프로세스에서 실행하여 peak RSS(ru_maxrss)와 처리량을 비교한다.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _peak_rss_mb():
+    # Linux 에서 ru_maxrss 단위는 KiB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def _legacy(upload, dest_dir):
+    with open(os.path.join(dest_dir, upload.filename), "wb") as buffer:
+        buffer.write(await upload.read())
+
+
+async def _streamed(upload, dest_dir):
+    from upload_stream import save_upload_stream
+    await save_upload_stream(upload, dest_dir)
+
+
+def run_one(mode, source, dest_dir):
+    from fastapi import UploadFile
+
+    base = _peak_rss_mb()
+    size = os.path.getsize(source)
+    with open(source, "rb") as f:
+        upload = UploadFile(file=f, filename="bench.mov", size=size)
+        start = time.perf_counter()
+        asyncio.run((_legacy if mode == "legacy" else _streamed)(upload, dest_dir))
+        elapsed = time.perf_counter() - start
+    print(f"{mode:9s} size={size / 2**20:.0f}MiB time={elapsed:.2f}s "
+          f"throughput={size / 2**20 / elapsed:.0f}MiB/s peak_rss_delta={_peak_rss_mb() - base:.0f}MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--mode", choices=["legacy", "streamed"])
+    parser.add_argument("--source")
+    parser.add_argument("--dest")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_one(args.mode, args.source, args.dest)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.bin")
+        with open(source, "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+        dest = os.path.join(tmp, "out")
+        os.makedirs(dest)
+        for mode in ("legacy", "streamed"):
+            subprocess.run([sys.executable, __file__, "--mode", mode, "--source", source, "--dest", dest], check=True)
+
+
+if __name__ == "__main__":
+    main()
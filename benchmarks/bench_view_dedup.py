@@ -0,0 +1,88 @@
+"""접속 기록 중복 제거 벤치마크: 시간 구간별 Bloom filter vs Redis SET NX EX
+
+    python benchmarks/bench_view_dedup.py --events 5000000 --repeat 0.3
+    python benchmarks/bench_view_dedup.py --events 1000000 --redis redis://localhost:6379/15
+
+--repeat 비율만큼은 창 안에서 이미 본 (cid, blockchain_address, provider_wallet) 를 다시 보내고,
+처리량 / 버린 반복 수 / 새 기록을 잘못 버린 수 (오탐) / 메모리를 출력한다.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis.asyncio as redis
+
+from view_dedup import BloomViewDedup, RedisViewDedup
+
+
+def events(count, repeat, seed=1):
+    """(행, 반복 여부) 목록 - 반복은 최근 기록 중에서 고름"""
+    rng = random.Random(seed)
+    rows, unique = [], 0
+    for _ in range(count):
+        if unique and rng.random() < repeat:
+            rows.append((rows[rng.randrange(max(0, len(rows) - 100000), len(rows))][0], True))
+        else:
+            rows.append(((f"Qm{unique % 5000}", f"0x{unique:040x}", f"0xprovider{unique % 50}", "0xcreator", 0.001, 0), False))
+            unique += 1
+    return rows, unique
+
+
+def report(name, count, elapsed, repeats, accepted, unique, extra=""):
+    dropped_new = unique - accepted
+    print(f"{name:6} events={count} time={elapsed:.2f}s rate={count / elapsed:,.0f}/s "
+          f"dropped={count - accepted} (repeats={repeats}) false_drops={dropped_new} "
+          f"fp_rate={dropped_new / unique:.6f} {extra}")
+
+
+def bench_bloom(rows, unique, window, batch):
+    clock_now = [0.0]
+    dedup = BloomViewDedup(window=window, bucket_capacity=len(rows), clock=lambda: clock_now[0])
+    accepted = 0
+    start = time.perf_counter()
+    for offset in range(0, len(rows), batch):
+        clock_now[0] = offset / len(rows) * window  # 모든 기록이 창 하나 안에 도착
+        accepted += len(dedup.filter_sync([row for row, _ in rows[offset:offset + batch]]))
+    elapsed = time.perf_counter() - start
+    stats = dedup.stats()
+    report("bloom", len(rows), elapsed, len(rows) - unique, accepted, unique,
+           f"memory={stats['memory_bytes'] / 2 ** 20:.1f}MiB (max {stats['max_memory_bytes'] / 2 ** 20:.1f}MiB)")
+
+
+async def bench_redis(url, rows, unique, window, batch):
+    client = redis.Redis.from_url(url)
+    await client.flushdb()
+    dedup = RedisViewDedup(client, window=window)
+    accepted = 0
+    start = time.perf_counter()
+    for offset in range(0, len(rows), batch):
+        accepted += len(await dedup.filter([row for row, _ in rows[offset:offset + batch]]))
+    elapsed = time.perf_counter() - start
+    keys = await client.dbsize()
+    await client.flushdb()
+    await client.aclose()
+    report("redis", len(rows), elapsed, len(rows) - unique, accepted, unique, f"keys={keys} (창이 지나면 만료)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=2000000)
+    parser.add_argument("--repeat", type=float, default=0.3)
+    parser.add_argument("--window", type=int, default=600)
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--redis", default=None, help="Redis URL (지정하면 SET NX EX 도 측정, DB 를 비움)")
+    args = parser.parse_args()
+
+    rows, unique = events(args.events, args.repeat)
+    bench_bloom(rows, unique, args.window, args.batch)
+    if args.redis:
+        asyncio.run(bench_redis(args.redis, rows, unique, args.window, args.batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# 테스트가 저장소의 streaming_logs.db / uploads 를 건드리지 않도록 임시 경로 사용
+_test_dir = tempfile.mkdtemp(prefix="depin_host_test_")
+os.environ.setdefault("DB_PATH", os.path.join(_test_dir, "streaming_logs.db"))
+os.environ.setdefault("UPLOAD_PATH", os.path.join(_test_dir, "uploads"))
+os.environ.setdefault("STREAM_PATH", os.path.join(_test_dir, "streaming"))
+os.environ.setdefault("VIEW_DEAD_LETTER_PATH", os.path.join(_test_dir, "view_dead_letter.jsonl"))
@@ -0,0 +1,115 @@
+import os
+import re
+import base64
+import binascii
+from typing import List, Optional, Sequence, Tuple
+
+from db import Database
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "50"))
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", "500"))
+SEARCH_MAX_CIDS = int(os.getenv("SEARCH_MAX_CIDS", "200"))
+
+METADATA_COLUMNS = ("cid", "video_name", "content_creator_wallet", "creator_share", "provider_share", "price")
+
+
+def encode_search_cursor(row_id: int) -> str:
+    return base64.urlsafe_b64encode(str(row_id).encode()).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> int:
+    """커서 토큰 → 마지막으로 반환한 content_metadata.id (잘못된 토큰이면 ValueError)"""
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+def fts_query(text: Optional[str]) -> Optional[str]:
+    """사용자 입력 → FTS5 MATCH 식 (단어마다 접두어 검색, 모두 포함, FTS 문법 문자는 무시)"""
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{word}"*' for word in words) or None
+
+
+def metadata_dict(row: tuple) -> dict:
+    return dict(zip(METADATA_COLUMNS, row))
+
+
+class ContentSearch:
+    """content_metadata 검색 (video_name 전문 검색 + 크리에이터/가격 필터, 최신순 id keyset 페이지네이션)"""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def sql(
+        self,
+        q: Optional[str] = None,
+        creator_wallet: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        after: Optional[int] = None,
+        limit: int = SEARCH_PAGE_SIZE,
+    ) -> Tuple[str, list]:
+        columns = ", ".join(f"m.{column}" for column in METADATA_COLUMNS)
+        match = fts_query(q)
+        conditions, params = [], []
+        if match:
+            # 색인에서 일치하는 rowid 만 최신순으로 읽고 해당 행만 조회
+            query = f"SELECT {columns}, m.id FROM content_metadata_fts f JOIN content_metadata m ON m.id = f.rowid"
+            conditions.append("content_metadata_fts MATCH ?")
+            params.append(match)
+            id_column = "f.rowid"
+        else:
+            query = f"SELECT {columns}, m.id FROM content_metadata m"
+            id_column = "m.id"
+
+        if creator_wallet is not None:
+            conditions.append("m.content_creator_wallet = ?")
+            params.append(creator_wallet)
+        if min_price is not None:
+            conditions.append("m.price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("m.price <= ?")
+            params.append(max_price)
+        if after is not None:
+            conditions.append(f"{id_column} < ?")
+            params.append(after)
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {id_column} DESC LIMIT ?"
+        params.append(limit)
+        return query, params
+
+    def search(
+        self,
+        q: Optional[str] = None,
+        creator_wallet: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        cursor: Optional[str] = None,
+        limit: int = SEARCH_PAGE_SIZE,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """한 페이지 (메타데이터, 다음 커서) - 다음 페이지가 없으면 커서는 None"""
+        after = decode_search_cursor(cursor) if cursor else None
+        rows = self.db.fetchall(*self.sql(q, creator_wallet, min_price, max_price, after, limit + 1))
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_search_cursor(rows[-1][-1])
+        return [metadata_dict(row[:-1]) for row in rows], next_cursor
+
+    def by_cids(self, cids: Sequence[str]) -> Tuple[List[dict], List[str]]:
+        """여러 cid 를 한 번에 조회 (요청 순서대로, 없는 cid 는 따로 반환)"""
+        cids = list(dict.fromkeys(cids))
+        if len(cids) > SEARCH_MAX_CIDS:
+            raise ValueError(f"한 번에 최대 {SEARCH_MAX_CIDS}개의 cid 를 조회할 수 있습니다.")
+        if not cids:
+            return [], []
+        rows = self.db.fetchall(
+            f"SELECT {', '.join(METADATA_COLUMNS)} FROM content_metadata WHERE cid IN ({', '.join('?' for _ in cids)})",
+            cids,
+        )
+        found = {row[0]: metadata_dict(row) for row in rows}
+        return [found[cid] for cid in cids if cid in found], [cid for cid in cids if cid not in found]
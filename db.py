@@ -0,0 +1,216 @@
+import os
+import time
+import random
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar, Union
+
+from metrics import observe
+
+logger = logging.getLogger("gateway")
+
+T = TypeVar("T")
+
+# 연결마다 적용하는 PRAGMA (WAL: 쓰기 중에도 읽기가 막히지 않음)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))  # 연결당 페이지 캐시 64 MiB
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 ** 2)))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+# busy_timeout 이 지나도 잠겨 있으면 지수 백오프로 재시도
+SQLITE_LOCK_RETRIES = int(os.getenv("SQLITE_LOCK_RETRIES", "5"))
+SQLITE_LOCK_BACKOFF = float(os.getenv("SQLITE_LOCK_BACKOFF", "0.05"))
+
+WEI_PER_ETHER = 10 ** 18
+
+
+def to_epoch(value: Union[str, int, float, None]) -> Optional[int]:
+    """클라이언트가 보낸 시각(ISO 8601, 'YYYY-MM-DD HH:MM:SS', epoch 초) → UTC epoch 초 (해석 불가면 None)"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = value.strip()
+    try:
+        return int(float(text))
+    except ValueError:
+        pass
+    if text[-1:] in ("Z", "z"):
+        text = text[:-1] + "+00:00"  # Python 3.10 의 fromisoformat 은 'Z' 를 받지 않음
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)  # 시간대가 없으면 UTC 로 간주
+    return int(parsed.timestamp())
+
+
+def to_iso(epoch: Optional[int]) -> Optional[str]:
+    """UTC epoch 초 → '2023-07-31T12:00:00Z'"""
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def price_to_wei(price: Any) -> int:
+    """이더 금액 (REAL / 문자열) → 정수 wei (Decimal 로 변환해 float 오차 없음)"""
+    return int(Decimal(str(price or 0)) * WEI_PER_ETHER)
+
+
+# 금액 집계용 SQL 함수: wei 는 64비트 정수 범위(약 9.2 ETH)를 넘을 수 있어 10진 정수 문자열(TEXT)로 저장하고 Python int 로 계산
+def sql_to_wei(price: Any) -> str:
+    return str(price_to_wei(price))
+
+
+def sql_wei_share(wei: Optional[str], percent: Any) -> str:
+    """wei 의 percent% (내림, distribute_script 의 기록별 분배와 같은 계산)"""
+    return str(int(wei or 0) * int(percent) // 100)
+
+
+def sql_wei_add(a: Optional[str], b: Optional[str]) -> str:
+    return str(int(a or 0) + int(b or 0))
+
+
+class WeiSum:
+    """wei 문자열 합계 집계 함수 (SUM 은 REAL 로 바뀌거나 정수 overflow)"""
+
+    def __init__(self):
+        self.total = 0
+
+    def step(self, wei: Optional[str]):
+        if wei is not None:
+            self.total += int(wei)
+
+    def finalize(self) -> str:
+        return str(self.total)
+
+
+def is_locked(error: Exception) -> bool:
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+class Database:
+    """DB 파일별 스레드 로컬 연결 관리 (스레드마다 연결 하나를 재사용 → 준비된 문장 캐시 유지)"""
+
+    def __init__(
+        self,
+        path: str,
+        busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS,
+        retries: int = SQLITE_LOCK_RETRIES,
+        backoff: float = SQLITE_LOCK_BACKOFF,
+    ):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.retries = retries
+        self.backoff = backoff
+        self.lock_retries = 0
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: 자동 커밋, 쓰기는 write() 에서 BEGIN IMMEDIATE 로 명시
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=SQLITE_STATEMENT_CACHE,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA recursive_triggers=ON")  # INSERT OR REPLACE 로 지워지는 행에도 DELETE 트리거 실행 (검색 색인 동기화)
+        conn.create_function("to_wei", 1, sql_to_wei, deterministic=True)
+        conn.create_function("wei_share", 2, sql_wei_share, deterministic=True)
+        conn.create_function("wei_add", 2, sql_wei_add, deterministic=True)
+        conn.create_aggregate("wei_sum", 1, WeiSum)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """현재 스레드의 연결 (없으면 생성)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _retry(self, func: Callable[[sqlite3.Connection], T], operation: str = "read") -> T:
+        # 잠김 대기 / 재시도까지 포함한 시간을 sqlite 호출 시간으로 기록
+        with observe("sqlite", operation):
+            return self._attempt(func)
+
+    def _attempt(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        for attempt in range(self.retries + 1):
+            conn = self.connection()
+            try:
+                return func(conn)
+            except sqlite3.OperationalError as e:
+                if not is_locked(e) or attempt == self.retries:
+                    raise
+                self.lock_retries += 1
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                logger.debug("sqlite locked, retrying in %.3fs: %s", delay, e)
+                time.sleep(delay)
+
+    def write(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        """쓰기 트랜잭션 (BEGIN IMMEDIATE ~ COMMIT, 잠김 시 전체를 재시도)"""
+        def transaction(conn: sqlite3.Connection) -> T:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+        return self._retry(transaction, "write")
+
+    def execute(self, sql: str, params: Iterable[Any] = ()) -> int:
+        """쓰기 문장 한 개 실행 후 커밋 (변경된 행 수 반환)"""
+        return self.write(lambda conn: conn.execute(sql, tuple(params)).rowcount)
+
+    def executemany(self, sql: str, rows: Iterable[Iterable[Any]]) -> int:
+        rows = [tuple(row) for row in rows]
+        return self.write(lambda conn: conn.executemany(sql, rows).rowcount)
+
+    def fetchone(self, sql: str, params: Iterable[Any] = ()) -> Optional[tuple]:
+        return self._retry(lambda conn: conn.execute(sql, tuple(params)).fetchone())
+
+    def fetchall(self, sql: str, params: Iterable[Any] = ()) -> List[tuple]:
+        return self._retry(lambda conn: conn.execute(sql, tuple(params)).fetchall())
+
+    def close(self):
+        """모든 스레드의 연결 닫기 (종료 시)"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+_databases: Dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path: str) -> Database:
+    """경로별로 공유되는 Database (gateway, 색인, 풀이 같은 스레드 연결을 사용)"""
+    key = os.path.abspath(path)
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = _databases[key] = Database(path)
+        return db
@@ -0,0 +1,88 @@
+import time
+import threading
+from typing import Optional
+
+from db import get_database
+
+
+class ContentHashIndex:
+    """파일 SHA-256 → CID/FlatDirectory 색인 (동일 파일 재업로드 시 외부 작업 생략)"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.db = get_database(db_path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def init(self):
+        def create(conn):
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS content_hashes (
+                    sha256 TEXT NOT NULL,
+                    storage TEXT NOT NULL,
+                    cid TEXT NOT NULL,
+                    flat_directory TEXT,
+                    file_path TEXT,
+                    size INTEGER,
+                    created_at INTEGER,
+                    PRIMARY KEY (sha256, storage)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_content_hashes_cid ON content_hashes (cid)")
+
+        self.db.write(create)
+
+    def lookup(self, sha256: str, storage: str) -> Optional[dict]:
+        """해시로 기존 CID 조회 (hit/miss 집계)"""
+        row = self.db.fetchone("""
+            SELECT cid, flat_directory, file_path, size FROM content_hashes
+            WHERE sha256 = ? AND storage = ?
+        """, (sha256, storage))
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if not row:
+            return None
+        return {"sha256": sha256, "storage": storage, "cid": row[0], "flat_directory": row[1], "file_path": row[2], "size": row[3]}
+
+    def find_by_cid(self, cid: str) -> Optional[dict]:
+        """CID 로 로컬 원본 파일 정보 조회"""
+        row = self.db.fetchone("""
+            SELECT sha256, storage, flat_directory, file_path, size FROM content_hashes
+            WHERE cid = ? ORDER BY created_at DESC LIMIT 1
+        """, (cid,))
+
+        if not row:
+            return None
+        return {"sha256": row[0], "storage": row[1], "cid": cid, "flat_directory": row[2], "file_path": row[3], "size": row[4]}
+
+    def is_referenced(self, file_path: str) -> bool:
+        """색인 행이 가리키는 파일인지 (다른 CID / 저장소가 쓰는 파일은 지우지 않음)"""
+        return self.db.fetchone("SELECT 1 FROM content_hashes WHERE file_path = ? LIMIT 1", (file_path,)) is not None
+
+    def record(self, sha256: str, storage: str, cid: str, flat_directory: str = None, file_path: str = None, size: int = None):
+        """업로드 완료된 파일의 해시와 CID 저장"""
+        self.db.execute("""
+            INSERT OR REPLACE INTO content_hashes (sha256, storage, cid, flat_directory, file_path, size, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (sha256, storage, cid, flat_directory, file_path, size, int(time.time())))
+
+    def forget_cid(self, cid: str):
+        """콘텐츠 삭제 시 해당 CID 색인 제거"""
+        self.db.execute("DELETE FROM content_hashes WHERE cid = ?", (cid,))
+
+    def stats(self) -> dict:
+        entries = self.db.fetchone("SELECT COUNT(*) FROM content_hashes")[0]
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
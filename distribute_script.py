@@ -1,24 +1,70 @@
 import os
+import json
 import requests
-import time
+from collections import defaultdict
+from decimal import Decimal
+from functools import lru_cache
 from web3 import Web3
+from payouts import PAYOUT_LEDGER_PATH, PayoutLedger, PayoutRunner
 
 # 1. Ethereum RPC URL (e.g., Infura, local node, etc.)
 ETH_RPC_URL = os.environ.get("ETH_RPC_URL", "https://sepolia.infura.io/v3/XXXXXX")
 # 2. Private key of the operational wallet for distribution
 PRIVATE_KEY = os.environ.get("PRIVATE_KEY", "0xyourprivatekey")
+# 3. Gateway API and the split used for content without metadata (percent)
+GATEWAY_URL = os.environ.get("GATEWAY_URL", "http://localhost:8000")
+DEFAULT_CREATOR_SHARE = int(os.environ.get("DEFAULT_CREATOR_SHARE", "70"))
+DEFAULT_PROVIDER_SHARE = int(os.environ.get("DEFAULT_PROVIDER_SHARE", "30"))
+
+WEI_PER_ETHER = 10 ** 18
 
-# 3. Extract wallet address (from_address)
-#   Using web3.eth.account.privateKeyToAccount
 web3 = Web3(Web3.HTTPProvider(ETH_RPC_URL))
-account = web3.eth.account.from_key(PRIVATE_KEY)
+_account = None
+
+def get_account():
+    """
+    Operational wallet (from_address), created on first use so the settlement
+    functions can be imported and tested without a private key
+    """
+    global _account
+    if _account is None:
+        _account = web3.eth.account.from_key(PRIVATE_KEY)
+    return _account
+
+def ether_to_wei(amount):
+    """
+    Convert an ether amount (float / str from the API) to integer wei without float rounding drift
+    """
+    return int(Decimal(str(amount)) * WEI_PER_ETHER)
 
 def fetch_records(cid, start_date=None, end_date=None):
     """
-    Call get_records_cid API to fetch revenue-related records for a specific cid
+    Call get_records_cid API in NDJSON mode and yield revenue-related records for a specific cid
+    one by one, so long date ranges are processed without loading the whole response into memory
+    """
+    url = f"{GATEWAY_URL}/api/get-records/cid/{cid}"
+    params = {"format": "ndjson"}
+    if start_date:
+        params["start_date"] = start_date
+    if end_date:
+        params["end_date"] = end_date
+
+    with requests.get(url, params=params, stream=True) as resp:
+        if resp.status_code != 200:
+            raise Exception(f"Failed to fetch records: {resp.text}")
+        for line in resp.iter_lines():
+            if line:
+                yield json.loads(line)  # {cid, blockchain_address, provider_wallet, creator_wallet, price, timestamp}
+
+def fetch_earnings(cid=None, start_date=None, end_date=None):
+    """
+    Call /api/earnings to get pre-aggregated totals (all content, or a specific cid), one row per
+    (provider_wallet, creator_wallet) pair, instead of summing raw view records
     """
-    url = f"http://localhost:8000/api/get-records/cid/{cid}"
-    params = {}
+    url = f"{GATEWAY_URL}/api/earnings"
+    params = {"group_by": ["provider_wallet", "creator_wallet"]}
+    if cid:
+        params["cid"] = cid
     if start_date:
         params["start_date"] = start_date
     if end_date:
@@ -26,59 +72,75 @@ def fetch_records(cid, start_date=None, end_date=None):
 
     resp = requests.get(url, params=params)
     if resp.status_code != 200:
-        raise Exception(f"Failed to fetch records: {resp.text}")
-    data = resp.json()
-    return data["records"]  # [{cid, blockchain_address, provider_wallet, creator_wallet, price, timestamp}, ...]
+        raise Exception(f"Failed to fetch earnings: {resp.text}")
+    return resp.json()["earnings"]  # [{provider_wallet, creator_wallet, views, gross_wei, creator_wei, provider_wei}, ...]
 
-def distribute_earnings(records):
+@lru_cache(maxsize=None)
+def fetch_shares(cid):
     """
-    Analyze each transaction in the given list of records
-    and distribute earnings to creator and provider.
+    Configured (creator_share, provider_share) percent for a cid from content_metadata,
+    or the default split when the content has no metadata
     """
-    # Example distribution: creator 70%, provider 30%
-    # If price is in string format, convert to float
+    resp = requests.get(f"{GATEWAY_URL}/meta/get_metadata/{cid}")
+    if resp.status_code == 404:
+        return DEFAULT_CREATOR_SHARE, DEFAULT_PROVIDER_SHARE
+    if resp.status_code != 200:
+        raise Exception(f"Failed to fetch metadata: {resp.text}")
+    meta = resp.json()
+    return meta["creator_share"], meta["provider_share"]
+
+def credit(payouts, wallet, amount_wei):
+    if wallet and amount_wei > 0:
+        payouts[wallet.lower()] += amount_wei  # same address in different letter case is one recipient
+
+def net_totals(totals, payouts=None):
+    """
+    Net rollup rows (creator_wei / provider_wei already split by content shares, as integer
+    strings) into one amount per recipient wallet: {wallet: amount_wei}
+    """
+    payouts = defaultdict(int) if payouts is None else payouts
+    for row in totals:
+        credit(payouts, row["creator_wallet"], int(row["creator_wei"]))
+        credit(payouts, row["provider_wallet"], int(row["provider_wei"]))
+    return payouts
+
+def net_records(records, get_shares=fetch_shares, payouts=None):
+    """
+    Net raw view records (any iterable, e.g. the fetch_records stream) into one amount per
+    recipient wallet, splitting each price by its content's configured shares: {wallet: amount_wei}
+    """
+    payouts = defaultdict(int) if payouts is None else payouts
     for rec in records:
-        creator_wallet = rec["creator_wallet"]
-        provider_wallet = rec["provider_wallet"]
-        price_wei = web3.to_wei(float(rec["price"]), 'ether')
-
-        creator_amount = int(price_wei * 0.7)
-        provider_amount = price_wei - creator_amount
-
-        # 1) Send to creator
-        send_transaction(creator_wallet, creator_amount)
-        # 2) Send to provider
-        send_transaction(provider_wallet, provider_amount)
-
-        print(f"[OK] Distribution completed: cid={rec['cid']} time={rec['timestamp']}")
-        # Optionally mark 'distributed' in DB or log record
-        time.sleep(1)  # Wait 1 second between transactions as an example
-
-def send_transaction(to_address, amount_wei):
-    """
-    Send Ether transaction using web3.py
-    """
-    nonce = web3.eth.get_transaction_count(account.address)
-    tx = {
-        'nonce': nonce,
-        'to': to_address,
-        'value': amount_wei,
-        'gas': 21000,
-        'gasPrice': web3.to_wei('5', 'gwei'),
-    }
-    signed_tx = web3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-    tx_hash = web3.eth.send_raw_transaction(signed_tx.rawTransaction)
-    receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
-    print(f"Transaction completed: to={to_address} amount(wei)={amount_wei} txhash={receipt.transactionHash.hex()}")
+        creator_share, provider_share = get_shares(rec["cid"])
+        price_wei = ether_to_wei(rec["price"] or 0)
+        credit(payouts, rec["creator_wallet"], price_wei * creator_share // 100)
+        credit(payouts, rec["provider_wallet"], price_wei * provider_share // 100)
+    return payouts
+
+def settle(payouts, run_id):
+    """
+    Pay each recipient wallet once for the run: transfers are signed with locally managed nonces,
+    submitted back to back and their receipts awaited concurrently. Progress is kept in the
+    payout ledger, so re-running the same run_id only finishes what is left (no double payment).
+    """
+    runner = PayoutRunner(web3, get_account(), PayoutLedger(PAYOUT_LEDGER_PATH))
+    summary = runner.run(run_id, {Web3.to_checksum_address(wallet): amount for wallet, amount in payouts.items()})
+    print(f"[OK] Settlement {run_id}: wallets={len(payouts)} total(wei)={sum(payouts.values())} status={summary}")
+    return summary
+
+def distribute_earnings(records, run_id):
+    """
+    Analyze the given records and distribute earnings to creators and providers,
+    netted per wallet using each content's configured shares.
+    """
+    return settle(net_records(records), run_id)
 
 if __name__ == "__main__":
-    # Test CID
-    test_cid = "0x43659dACc5DF5284006df3a504562D6172063999"
-    # Example date range
+    # Example settlement period
     start_date = "2023-07-01"
     end_date   = "2023-07-31"
 
-    # 1) Fetch records
-    records = fetch_records(test_cid, start_date, end_date)
-    # 2) Distribute earnings
-    distribute_earnings(records)
+    # 1) Fetch daily rollup totals for the period (a few rows regardless of view count)
+    totals = fetch_earnings(None, start_date, end_date)
+    # 2) Net per wallet and send one transfer per wallet (resumable per period)
+    settle(net_totals(totals), f"{start_date}..{end_date}")
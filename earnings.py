@@ -0,0 +1,140 @@
+import os
+import json
+import sqlite3
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from access_logs import day_bounds
+from db import Database
+
+logger = logging.getLogger("gateway")
+
+# content_metadata 가 없는 cid 의 분배 비율 (%)
+DEFAULT_CREATOR_SHARE = int(os.getenv("DEFAULT_CREATOR_SHARE", "70"))
+DEFAULT_PROVIDER_SHARE = int(os.getenv("DEFAULT_PROVIDER_SHARE", "30"))
+# 밀린 접속 기록을 따라잡을 때 한 트랜잭션에서 집계하는 최대 id 범위
+ROLLUP_BATCH_ROWS = int(os.getenv("ROLLUP_BATCH_ROWS", "50000"))
+
+ROLLUP_NAME = "earnings_daily"
+EARNINGS_DIMENSIONS = ("day", "cid", "provider_wallet", "creator_wallet")
+# 금액은 wei 정수 문자열 (db.py 의 to_wei / wei_share / wei_add / wei_sum 으로 계산, float 합계 오차 없음)
+EARNINGS_MEASURES = ("views", "gross_wei", "creator_wei", "provider_wei")
+
+
+def rollup_sql(where: str) -> str:
+    """where 에 맞는 접속 기록을 일(UTC) 단위로 묶어 기존 집계에 더함 (기록마다 wei 로 바꿔 분배 비율로 나눔, 비율은 집계 시점의 content_metadata)"""
+    return f"""
+    INSERT INTO earnings_daily (cid, day, provider_wallet, creator_wallet, views, gross_wei, creator_wei, provider_wei)
+    SELECT
+        COALESCE(l.cid, ''),
+        date(l.timestamp, 'unixepoch'),
+        COALESCE(l.provider_wallet, ''),
+        COALESCE(l.creator_wallet, ''),
+        COUNT(*),
+        wei_sum(to_wei(l.price)),
+        wei_sum(wei_share(to_wei(l.price), COALESCE(m.creator_share, ?))),
+        wei_sum(wei_share(to_wei(l.price), COALESCE(m.provider_share, ?)))
+    FROM streaming_access_logs l
+    LEFT JOIN content_metadata m ON m.cid = l.cid
+    WHERE {where}
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (cid, day, provider_wallet, creator_wallet) DO UPDATE SET
+        views = views + excluded.views,
+        gross_wei = wei_add(gross_wei, excluded.gross_wei),
+        creator_wei = wei_add(creator_wei, excluded.creator_wei),
+        provider_wei = wei_add(provider_wei, excluded.provider_wei)
+"""
+
+
+# (last_id, upper] 구간의 기록 집계 (결제 검증에서 거부된 기록은 제외)
+ROLLUP_SQL = rollup_sql("l.id > ? AND l.id <= ? AND COALESCE(l.verified, 1) != 0")
+# 결제 확인이 필요하면 (last_id, upper] 중 확인된 기록만 집계
+ROLLUP_VERIFIED_SQL = rollup_sql("l.id > ? AND l.id <= ? AND l.verified = 1")
+# mark 가 지나간 뒤에 결제가 확인된 기록(id JSON 배열)을 집계에 더함
+ADD_VERIFIED_SQL = rollup_sql("l.id IN (SELECT value FROM json_each(?)) AND l.id <= ? AND l.verified = 1")
+
+
+class EarningsRollup:
+    """streaming_access_logs → earnings_daily 증분 집계 (high-water mark 이후 행만, 접속 기록 저장 트랜잭션 안에서 갱신)
+
+    require_payment 이면 결제가 확인된 (verified = 1) 기록만 집계 - mark 가 지나갈 때 확인된 기록은 roll_up,
+    그 뒤에 확인된 기록은 add_verified 가 더함 (기록마다 한 번만 집계, 미확인 / 거부된 기록은 정산되지 않음)
+    """
+
+    def __init__(self, db: Database, batch_rows: int = ROLLUP_BATCH_ROWS, require_payment: bool = False):
+        self.db = db
+        self.batch_rows = batch_rows
+        self.require_payment = require_payment
+
+    def last_id(self, conn: Optional[sqlite3.Connection] = None) -> int:
+        sql, params = "SELECT last_id FROM rollup_state WHERE name = ?", (ROLLUP_NAME,)
+        row = conn.execute(sql, params).fetchone() if conn is not None else self.db.fetchone(sql, params)
+        return row[0] if row else 0
+
+    def roll_up(self, conn: sqlite3.Connection, max_rows: Optional[int] = None) -> int:
+        """high-water mark 이후 기록을 집계하고 mark 를 옮김 (호출한 쪽 쓰기 트랜잭션 안에서 실행, 새 mark 반환)"""
+        last_id = self.last_id(conn)
+        upper = conn.execute("SELECT COALESCE(MAX(id), 0) FROM streaming_access_logs").fetchone()[0]
+        if max_rows:
+            upper = min(upper, last_id + max_rows)
+        if upper <= last_id:
+            return last_id
+
+        sql = ROLLUP_VERIFIED_SQL if self.require_payment else ROLLUP_SQL
+        conn.execute(sql, (DEFAULT_CREATOR_SHARE, DEFAULT_PROVIDER_SHARE, last_id, upper))
+        conn.execute(
+            "INSERT INTO rollup_state (name, last_id) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id",
+            (ROLLUP_NAME, upper),
+        )
+        return upper
+
+    def add_verified(self, conn: sqlite3.Connection, ids: Sequence[int]):
+        """결제가 확인된 기록을 집계에 더함 (호출한 쪽 쓰기 트랜잭션 안에서 실행, 아직 mark 전인 기록은 roll_up 이 집계)"""
+        if ids and self.require_payment:
+            conn.execute(ADD_VERIFIED_SQL, (DEFAULT_CREATOR_SHARE, DEFAULT_PROVIDER_SHARE, json.dumps(list(ids)), self.last_id(conn)))
+
+    def catch_up(self) -> int:
+        """아직 집계되지 않은 기록을 batch_rows 단위 트랜잭션으로 모두 집계 (시작 시 / 수동 실행)"""
+        last_id = self.last_id()
+        while True:
+            upper = self.db.write(lambda conn: self.roll_up(conn, self.batch_rows))
+            if upper == last_id:
+                return upper
+            logger.info("earnings rollup caught up to id %d", upper)
+            last_id = upper
+
+    def query(
+        self,
+        filters: Dict[str, Optional[str]],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        group_by: Sequence[str] = (),
+    ) -> List[dict]:
+        """필터/기간(YYYY-MM-DD, 양 끝 포함)별 합계 (group_by 가 비어 있으면 전체 합계 한 행)"""
+        day_bounds(start_date, end_date)  # 형식 검증 (YYYY-MM-DD 는 문자열 비교가 곧 날짜 비교)
+        dimensions = list(dict.fromkeys(group_by))
+        unknown = [name for name in [*dimensions, *filters] if name not in EARNINGS_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"unsupported earnings field: {', '.join(unknown)}")
+
+        conditions, params = [], []
+        for column, value in filters.items():
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if start_date:
+            conditions.append("day >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("day <= ?")
+            params.append(end_date)
+
+        measures = ["COALESCE(SUM(views), 0)", *(f"COALESCE(wei_sum({name}), '0')" for name in EARNINGS_MEASURES[1:])]
+        query = f"SELECT {', '.join([*dimensions, *measures])} FROM earnings_daily"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if dimensions:
+            query += f" GROUP BY {', '.join(dimensions)} ORDER BY {', '.join(dimensions)}"
+
+        columns = (*dimensions, *EARNINGS_MEASURES)
+        return [dict(zip(columns, row)) for row in self.db.fetchall(query, params)]
@@ -0,0 +1,87 @@
+"""ipfs / ethfs-cli / ffmpeg 대체용 가짜 CLI (테스트 및 로컬 개발용)
+
+    IPFS_BIN="python fake_cli.py ipfs" ETHFS_BIN="python fake_cli.py ethfs" uvicorn gateway:app
+    FFMPEG_BIN="python fake_cli.py ffmpeg" FFPROBE_BIN="python fake_cli.py ffprobe" uvicorn gateway:app
+
+환경 변수
+    FAKE_CLI_DELAY      : 명령마다 대기할 시간(초)
+    FAKE_CLI_FAIL_FILE  : 남은 실패 횟수가 적힌 파일 (0 이 될 때까지 종료 코드 1 로 실패)
+"""
+import os
+import sys
+import time
+import hashlib
+
+
+def _maybe_fail():
+    fail_file = os.getenv("FAKE_CLI_FAIL_FILE")
+    if not fail_file or not os.path.exists(fail_file):
+        return
+    with open(fail_file) as f:
+        remaining = int(f.read().strip() or 0)
+    if remaining > 0:
+        with open(fail_file, "w") as f:
+            f.write(str(remaining - 1))
+        sys.stderr.write("fake_cli: injected failure\n")
+        sys.exit(1)
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _option(args, name):
+    return args[args.index(name) + 1]
+
+
+def _fake_ffmpeg(args):
+    # 출력마다 -hls_segment_filename 패턴 바로 뒤의 인자가 플레이리스트
+    outputs = [(args[i + 2], args[i + 1]) for i, arg in enumerate(args) if arg == "-hls_segment_filename"]
+    for index in range(2):
+        for _, pattern in outputs:
+            with open(pattern % index, "wb") as f:
+                f.write(os.urandom(1024))
+        print(f"out_time_us={(index + 1) * 6_000_000}\nprogress=continue", flush=True)
+    for playlist, pattern in outputs:
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:6", "#EXT-X-PLAYLIST-TYPE:VOD"]
+        for index in range(2):
+            lines += ["#EXTINF:6.0,", os.path.basename(pattern % index)]
+        with open(playlist, "w") as f:
+            f.write("\n".join(lines + ["#EXT-X-ENDLIST"]) + "\n")
+    print("progress=end", flush=True)
+
+
+def main(argv):
+    time.sleep(float(os.getenv("FAKE_CLI_DELAY", "0")))
+    _maybe_fail()
+
+    tool, args = argv[0], argv[1:]
+    if tool == "ffprobe":
+        print("12.0")
+        return 0
+    if tool == "ffmpeg":
+        _fake_ffmpeg(args)
+        return 0
+
+    command, args = args[0], args[1:]
+    if tool == "ipfs" and command == "add":
+        print("Qm" + _file_digest(args[-1])[:44])
+    elif tool == "ethfs" and command == "create":
+        print("FlatDirectory: Address is 0x" + hashlib.sha256(str(time.time_ns()).encode()).hexdigest()[:40])
+    elif tool == "ethfs" and command == "upload":
+        _file_digest(_option(args, "-f"))
+        print(f"address = {_option(args, '-a')}")
+    elif tool == "ethfs" and command == "remove":
+        print(f"removed {_option(args, '-f')}")
+    else:
+        sys.stderr.write(f"fake_cli: unsupported command {argv}\n")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
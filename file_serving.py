@@ -0,0 +1,102 @@
+import os
+import stat
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import anyio
+from starlette.responses import FileResponse
+from starlette.types import Send
+
+# nginx 등 앞단 프록시에 전송을 맡길 때 사용 (예: X-Accel-Redirect, 접두사 /protected/)
+STREAM_SENDFILE_HEADER = os.getenv("STREAM_SENDFILE_HEADER", "")
+STREAM_SENDFILE_PREFIX = os.getenv("STREAM_SENDFILE_PREFIX", "/protected/")
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", str(1024 * 1024)))
+ETAG_CACHE_SIZE = int(os.getenv("ETAG_CACHE_SIZE", "100000"))
+
+ZEROCOPY_EXTENSION = "http.response.zerocopy"
+
+
+class ContentEtagCache:
+    """파일 내용 해시 기반 ETag (경로+크기+mtime 이 같으면 다시 계산하지 않음)"""
+
+    def __init__(self, max_entries: int = ETAG_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, stat_result: os.stat_result, sha256: Optional[str] = None) -> str:
+        key = (path, stat_result.st_size, stat_result.st_mtime_ns)
+        with self._lock:
+            etag = self._entries.get(key)
+            if etag is not None:
+                self._entries.move_to_end(key)
+                return etag
+
+        if sha256 is None:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+        etag = f'"{sha256[:32]}"'
+
+        with self._lock:
+            self._entries[key] = etag
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 헤더가 현재 ETag 와 일치하는지 (약한 비교)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+class StreamFileResponse(FileResponse):
+    """FileResponse(Range/If-Range 지원) + 서버가 ASGI zerocopy 확장을 지원하면 sendfile(2) 전송"""
+
+    chunk_size = STREAM_CHUNK_SIZE
+
+    async def __call__(self, scope, receive, send):
+        self._zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+        await super().__call__(scope, receive, send)
+
+    async def _send_zerocopy(self, send: Send, offset: int, count: int):
+        with open(self.path, "rb") as file:
+            await send({
+                "type": ZEROCOPY_EXTENSION,
+                "file": file.fileno(),
+                "offset": offset,
+                "count": count,
+                "more_body": False,
+            })
+
+    async def _handle_simple(self, send: Send, send_header_only: bool) -> None:
+        if send_header_only or not self._zerocopy:
+            return await super()._handle_simple(send, send_header_only)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await self._send_zerocopy(send, 0, int(self.headers["content-length"]))
+
+    async def _handle_single_range(self, send: Send, start: int, end: int, file_size: int, send_header_only: bool) -> None:
+        if send_header_only or not self._zerocopy:
+            return await super()._handle_single_range(send, start, end, file_size, send_header_only)
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        await self._send_zerocopy(send, start, end - start)
+
+
+async def stat_file(path: str) -> Optional[os.stat_result]:
+    """일반 파일이면 stat 결과, 없거나 디렉토리면 None"""
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        return None
+    return stat_result if stat.S_ISREG(stat_result.st_mode) else None
@@ -0,0 +1,129 @@
+import os
+import re
+import time
+import asyncio
+import sqlite3
+import logging
+from typing import Awaitable, Callable, Optional
+
+import anyio
+
+from db import get_database
+
+logger = logging.getLogger("gateway")
+
+# 미리 만들어 둘 FlatDirectory 수 (남은 수가 MIN 보다 적으면 TARGET 까지 백그라운드 생성)
+FLAT_DIRECTORY_POOL_MIN = int(os.getenv("FLAT_DIRECTORY_POOL_MIN", "1"))
+FLAT_DIRECTORY_POOL_TARGET = int(os.getenv("FLAT_DIRECTORY_POOL_TARGET", "2"))
+
+flat_directory_address = re.compile(r"^0x[a-fA-F0-9]{40}$")
+
+
+class FlatDirectoryPool:
+    """크리에이터 지갑별 FlatDirectory 할당 (미리 생성한 디렉토리를 재사용해 업로드마다 배포하지 않음)"""
+
+    def __init__(
+        self,
+        db_path: str,
+        create_directory: Callable[[], Awaitable[str]],
+        min_free: int = FLAT_DIRECTORY_POOL_MIN,
+        target_free: int = FLAT_DIRECTORY_POOL_TARGET,
+    ):
+        self.db_path = db_path
+        self.db = get_database(db_path)
+        self.create_directory = create_directory
+        self.min_free = min_free
+        self.target_free = max(target_free, min_free)
+        self._refill_task: Optional[asyncio.Task] = None
+
+    def init(self, seed: Optional[str] = None):
+        """테이블 생성 및 환경 변수로 지정된 FlatDirectory 를 풀에 등록"""
+        def create(conn):
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS flat_directories (
+                    address TEXT PRIMARY KEY,
+                    creator_wallet TEXT UNIQUE,
+                    created_at INTEGER,
+                    assigned_at INTEGER
+                )
+            """)
+            if seed and flat_directory_address.match(seed):
+                conn.execute("""
+                    INSERT OR IGNORE INTO flat_directories (address, created_at) VALUES (?, ?)
+                """, (seed, int(time.time())))
+
+        self.db.write(create)
+
+    def _assigned(self, wallet: str) -> Optional[str]:
+        row = self.db.fetchone("SELECT address FROM flat_directories WHERE creator_wallet = ?", (wallet,))
+        return row[0] if row else None
+
+    def _claim_free(self, wallet: str) -> Optional[str]:
+        def claim(conn):
+            row = conn.execute("SELECT address FROM flat_directories WHERE creator_wallet = ?", (wallet,)).fetchone()
+            if row:
+                return row[0]
+            conn.execute("""
+                UPDATE flat_directories SET creator_wallet = ?, assigned_at = ?
+                WHERE address = (SELECT address FROM flat_directories WHERE creator_wallet IS NULL ORDER BY created_at LIMIT 1)
+            """, (wallet, int(time.time())))
+            row = conn.execute("SELECT address FROM flat_directories WHERE creator_wallet = ?", (wallet,)).fetchone()
+            return row[0] if row else None
+
+        try:
+            return self.db.write(claim)
+        except sqlite3.IntegrityError:
+            # 같은 지갑에 대한 동시 요청이 먼저 할당받은 경우
+            return self._assigned(wallet)
+
+    def _insert(self, address: str, wallet: Optional[str] = None) -> str:
+        now = int(time.time())
+        try:
+            self.db.execute("""
+                INSERT INTO flat_directories (address, creator_wallet, created_at, assigned_at) VALUES (?, ?, ?, ?)
+            """, (address, wallet, now, now if wallet else None))
+            return address
+        except sqlite3.IntegrityError:
+            # 그 사이 다른 요청이 이 지갑에 디렉토리를 할당함 → 새 디렉토리는 풀에 반납
+            self.db.execute("INSERT OR IGNORE INTO flat_directories (address, created_at) VALUES (?, ?)", (address, now))
+            return self._assigned(wallet)
+
+    async def acquire(self, wallet: str) -> str:
+        """지갑에 할당된 FlatDirectory 반환 (없으면 풀에서 꺼내고, 풀이 비었으면 즉시 생성)
+        SQLite 잠금 대기/재시도가 이벤트 루프를 막지 않도록 DB 작업은 스레드에서 실행"""
+        address = await anyio.to_thread.run_sync(self._claim_free, wallet)
+        if address is None:
+            address = await anyio.to_thread.run_sync(self._insert, await self.create_directory(), wallet)
+        await self.ensure_refill()
+        return address
+
+    def free_count(self) -> int:
+        return self.db.fetchone("SELECT COUNT(*) FROM flat_directories WHERE creator_wallet IS NULL")[0]
+
+    async def ensure_refill(self):
+        """남은 디렉토리가 부족하면 백그라운드에서 보충"""
+        if self.min_free <= 0 or await anyio.to_thread.run_sync(self.free_count) >= self.min_free:
+            return
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self.refill())
+
+    async def refill(self):
+        while await anyio.to_thread.run_sync(self.free_count) < self.target_free:
+            try:
+                address = await self.create_directory()
+            except Exception as e:
+                logger.warning("FlatDirectory pool refill failed: %s", e)
+                return
+            await anyio.to_thread.run_sync(self._insert, address)
+
+    async def stop(self):
+        if self._refill_task is not None and not self._refill_task.done():
+            self._refill_task.cancel()
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+        self._refill_task = None
+
+    def stats(self) -> dict:
+        total, free = self.db.fetchone("""
+            SELECT COUNT(*), COALESCE(SUM(creator_wallet IS NULL), 0) FROM flat_directories
+        """)
+        return {"total": total, "free": free, "assigned": total - free, "min_free": self.min_free, "target_free": self.target_free}
@@ -1,21 +1,82 @@
 import random
 import os
 import re
-import ast
-import redis
-import subprocess
 import sqlite3
 import json
+import itertools
+import anyio
+import httpx
+import logging
+from contextlib import asynccontextmanager
 from web3 import Web3
 from urllib.parse import urlparse
-from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Form, Query
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Response, Form, Query
 from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-
-app = FastAPI()
-
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, field_validator, model_validator
+from redis.exceptions import RedisError
+from upload_stream import HashingReader, StoredUpload, UploadSizeLimitMiddleware, original_filename, safe_filename, save_upload_stream
+from resumable_upload import UploadSessionStore, parse_content_range
+from ingest_jobs import IPFS_BIN, ETHFS_BIN, Job, JobQueue, run_command
+from ipfs_client import IPFS_API_URL, IPFSClient, IPFSError, ipfs_add_args
+from db import get_database, to_epoch
+from migrations import migrate
+from view_log import ViewLogWriter
+from view_dedup import create_view_dedup
+from payment_verifier import PAYMENT_RECEIVER_ADDRESS, PaymentVerifier
+from earnings import EARNINGS_DIMENSIONS, EarningsRollup
+from access_logs import RECORDS_MAX_PAGE_SIZE, RECORDS_PAGE_SIZE, RECORDS_STREAM_BATCH, AccessLogQuery
+from dedup_index import ContentHashIndex
+from flat_directory_pool import FlatDirectoryPool
+from segment_cache import SegmentCache
+from transcoder import Transcoder
+from stream_registry import StreamRegistry, create_redis_client
+from server_selector import ServerSelector
+from content_search import SEARCH_MAX_PAGE_SIZE, SEARCH_PAGE_SIZE, ContentSearch
+from metadata_cache import ALL_METADATA, MetadataCache, metadata_key
+from metrics import CONTENT_TYPE_LATEST, UPLOAD_BYTES, MetricsMiddleware, render_metrics
+from profiling import ProfilingMiddleware
+from file_serving import ContentEtagCache, StreamFileResponse, STREAM_SENDFILE_HEADER, STREAM_SENDFILE_PREFIX, etag_matches, stat_file
+
+logger = logging.getLogger("gateway")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """백그라운드 워커 시작/종료"""
+    await ingest_queue.start()
+    await transcoder.queue.start()
+    server_selector.start()
+    stream_registry.start()
+    metadata_cache.start()
+    upload_sessions.start()
+    await anyio.to_thread.run_sync(earnings.catch_up)
+    view_log.start()
+    if payment_verifier is not None:
+        payment_verifier.start()
+    yield
+    if payment_verifier is not None:
+        await anyio.to_thread.run_sync(payment_verifier.stop)
+    # 버퍼에 남은 접속 기록을 모두 저장한 뒤 종료
+    await anyio.to_thread.run_sync(view_log.stop)
+    await metadata_cache.stop()
+    await upload_sessions.stop()
+    await stream_registry.stop()
+    await server_selector.stop()
+    await ingest_queue.stop()
+    await transcoder.queue.stop()
+    await flat_directories.stop()
+    if ipfs_client is not None:
+        await ipfs_client.aclose()
+    await redis_client.connection_pool.disconnect()
+    db.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# 업로드 본문 크기 제한 (본문을 임시 파일로 받기 전 / 받는 중에 413, CORS 안쪽이라 413 응답에도 CORS 헤더 포함)
+app.add_middleware(UploadSizeLimitMiddleware, paths=("/upload-content", "/upload-content-web3"))
 # CORS 설정
 app.add_middleware(
     CORSMiddleware,
@@ -24,12 +85,16 @@ app.add_middleware(
     allow_methods=["*"],  # 모든 HTTP 메서드 허용
     allow_headers=["*"],   # 모든 헤더 허용
 )
+# 요청 프로파일링 (PROFILE_ENABLED) 과 라우트별 메트릭 (가장 바깥: CORS / 프로파일링 처리 시간까지 포함)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
-UPLOAD_PATH = "./uploads/"
-STREAM_PATH = "./streaming/"
+UPLOAD_PATH = os.getenv("UPLOAD_PATH", "./uploads/")
+UPLOAD_SESSION_PATH = os.path.join(UPLOAD_PATH, ".sessions")  # 재개 가능한 업로드 임시 저장소
+STREAM_PATH = os.getenv("STREAM_PATH", "./streaming/")
 IPFS_GATEWAY = "https://ipfs.io/ipfs/"  # IPFS 게이트웨이 설정
 ETH_RPC_URL = os.getenv("ETH_RPC_URL", "http://localhost:8545")
-PRIVATEKEY = os.getenv("PRIVATEKEY")
+PRIVATEKEY = os.getenv("PRIVATEKEY", "")
 FLAT_DIRECTORY = os.getenv("FLAT_DIRECTORY")
 
 web3 = Web3(Web3.HTTPProvider(ETH_RPC_URL))
@@ -37,47 +102,57 @@ web3 = Web3(Web3.HTTPProvider(ETH_RPC_URL))
 os.makedirs(UPLOAD_PATH, exist_ok=True)
 os.makedirs(STREAM_PATH, exist_ok=True)
 
+upload_sessions = UploadSessionStore(UPLOAD_SESSION_PATH)
+ingest_queue = JobQueue()  # IPFS/EthStorage CLI 작업 큐
+ipfs_client = IPFSClient(IPFS_API_URL) if IPFS_API_URL else None  # Kubo HTTP API (없으면 CLI 사용)
+
+# HLS 변환 결과 캐시 (STREAM_PATH/<cid>/...) 및 ffmpeg 변환 작업 큐
+segment_cache = SegmentCache(STREAM_PATH)
+segment_cache.load()
+transcoder = Transcoder(STREAM_PATH, segment_cache)
+etag_cache = ContentEtagCache()
+
 class FileRequest(BaseModel):
     cid: str  # Filecoin/IPFS CID
     filename: str  # file name
 
 # Redis 및 데이터베이스 설정
-redis_client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
-DB_PATH = "./streaming_logs.db"
+redis_client = create_redis_client()  # REDIS_URL, 연결 풀 공유
+stream_registry = StreamRegistry(redis_client)
+server_selector = ServerSelector(redis_client)  # 노드 상태/부하 기반 서버 선택 + 백그라운드 프로브
+metadata_cache = MetadataCache(redis_client)  # /meta 응답 캐시 (로컬 LRU + Redis, 쓰기 시 무효화)
+REGISTRY_PAGE_SIZE = int(os.getenv("REGISTRY_PAGE_SIZE", "100"))
+REGISTRY_MAX_PAGE_SIZE = int(os.getenv("REGISTRY_MAX_PAGE_SIZE", "1000"))
+HEARTBEAT_MAX_LEASES = int(os.getenv("HEARTBEAT_MAX_LEASES", "1000"))
+VIEW_BULK_MAX_ROWS = int(os.getenv("VIEW_BULK_MAX_ROWS", "10000"))
+DB_PATH = os.getenv("DB_PATH", "./streaming_logs.db")
 
-STREAMING_SERVERS_BY_CID = "streaming_servers_by_cid"  # CID 기반 색인
-STREAMING_SERVERS_BY_ADDRESS = "streaming_servers_by_addr"  # 서버 URL 기반 색인
 ETHSTORAGE_CONTRACT_ADDRESS = "0x..."  # 실제 EthStorage 컨트랙트 주소 입력
-cid_pattern = re.compile(r"address = (0x[a-fA-F0-9]{40})")
 address_pattern = re.compile(r"FlatDirectory: Address is (0x[a-fA-F0-9]{40})")
+TX_HASH_PATTERN = re.compile(r"0x[0-9a-fA-F]{64}")
+
+# 데이터베이스 초기화 (기록용) - 스레드별 연결 재사용, WAL
+db = get_database(DB_PATH)
+migrate(db)  # 테이블 생성 / 컬럼 추가 / epoch 변환 / 인덱스 (PRAGMA user_version 으로 적용 여부 관리)
+
+# 일별 수익 집계 (접속 기록 저장 트랜잭션에서 함께 갱신, 시작 시 밀린 기록 따라잡기)
+# PAYMENT_RECEIVER_ADDRESS 가 있으면 결제가 확인된 기록만 집계 (정산 대상)
+earnings = EarningsRollup(db, require_payment=bool(PAYMENT_RECEIVER_ADDRESS))
+
+# 접속 기록 write-behind 버퍼 (묶어서 저장)
+view_log = ViewLogWriter(db, after_insert=earnings.roll_up)
+# 시청 결제 검증 (PAYMENT_RECEIVER_ADDRESS 가 있을 때만, 확인된 기록을 수익 집계에 더함)
+payment_verifier = PaymentVerifier(db, web3, PAYMENT_RECEIVER_ADDRESS, after_verify=earnings.add_verified) if PAYMENT_RECEIVER_ADDRESS else None
+
+# 같은 시청자/콘텐츠/제공자 접속 기록이 VIEW_DEDUP_WINDOW 안에 반복되면 저장하지 않음 (bloom | redis | off)
+view_dedup = create_view_dedup(redis_client)
 
-# 데이터베이스 초기화 (기록용)
-conn = sqlite3.connect(DB_PATH)
-cursor = conn.cursor()
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS streaming_access_logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        cid TEXT,
-        blockchain_address TEXT,
-        creator_wallet TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-""")
-conn.commit()
-
-# 콘텐츠 메타데이터 테이블 생성
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS content_metadata (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        cid TEXT UNIQUE,
-        video_name TEXT,
-        content_creator_wallet TEXT,
-        creator_share INTEGER,
-        provider_share INTEGER,
-        price REAL
-    )
-""")
-conn.commit()
+# video_name 전문 검색 / 필터 / 일괄 조회
+content_search = ContentSearch(db)
+
+# 파일 해시 → CID 색인 (중복 업로드 감지)
+content_hashes = ContentHashIndex(DB_PATH)
+content_hashes.init()
 
 
 # 등록 요청 데이터 모델
@@ -90,6 +165,7 @@ class StreamServer(BaseModel):
     creator_share: int  # 예: 70%
     provider_share: int  # 예: 30%
     price: float  
+    region: Optional[str] = None  # 노드 지역 (예: "ap-northeast"), 지역 우선 선택에 사용
 
 class ContentMeta(BaseModel):
     video_name: str
@@ -99,9 +175,23 @@ class ContentMeta(BaseModel):
     price: float
     cid: str = None  # Optional, will be assigned later
 
+class UploadSessionRequest(BaseModel):
+    filename: str
+    length: int  # 전체 파일 크기 (bytes)
+    storage: str = "ipfs"  # "ipfs" 또는 "ethstorage"
+    meta: ContentMeta
+
+class HeartbeatRequest(BaseModel):
+    leases: List[str] = []  # /register 응답의 lease_id 목록 (한 번에 일괄 연장)
+    stream_url: Optional[str] = None  # 지정하면 노드 상태/부하도 갱신
+    load: Optional[float] = None  # 현재 부하 (예: 동시 스트림 수)
+    capacity: Optional[int] = None  # 처리 가능한 최대 부하
+    region: Optional[str] = None
+
 class DeregisterRequest(BaseModel):
     cid: str
     content_distributor_wallet: str  # 요청자의 지갑 주소 (소유자 검증용)
+    stream_url: Optional[str] = None  # 없으면 해당 지갑이 CID 에 등록한 모든 서버 제거
 
 
 # ✅ 요청 데이터 모델
@@ -110,8 +200,204 @@ class RecordViewRequest(BaseModel):
     blockchain_address: str
     provider_wallet: str
     creator_wallet: str
-    price: str
-    timestamp: str
+    price: float
+    timestamp: int  # ISO 8601 문자열 또는 epoch 초 → UTC epoch 초로 저장
+    tx_hash: Optional[str] = None  # 시청 결제 트랜잭션 (PAYMENT_RECEIVER_ADDRESS 가 있으면 필수, PaymentVerifier 가 확인)
+
+    @field_validator("timestamp", mode="before")
+    @classmethod
+    def parse_timestamp(cls, value):
+        epoch = to_epoch(value)
+        if epoch is None:
+            raise ValueError("timestamp 는 ISO 8601 문자열 또는 epoch 초여야 합니다.")
+        return epoch
+
+    @field_validator("tx_hash")
+    @classmethod
+    def parse_tx_hash(cls, value):
+        if value is not None and not TX_HASH_PATTERN.fullmatch(value):
+            raise ValueError("tx_hash 는 0x 로 시작하는 64자리 16진수여야 합니다.")
+        return value.lower() if value else value
+
+    @model_validator(mode="after")
+    def require_tx_hash(self):
+        if PAYMENT_RECEIVER_ADDRESS and self.tx_hash is None:
+            raise ValueError("결제 검증을 사용하므로 tx_hash 가 필요합니다.")
+        return self
+
+    def row(self) -> tuple:
+        return (self.cid, self.blockchain_address, self.provider_wallet, self.creator_wallet, self.price, self.timestamp, self.tx_hash)
+
+
+async def store_to_ipfs(file_location: str) -> str:
+    """IPFS에 파일 추가 후 CID 반환 (HTTP API 우선, 실패 시 CLI)"""
+    if ipfs_client is not None:
+        try:
+            return await ipfs_client.add_file(file_location)
+        except (IPFSError, httpx.HTTPError) as e:
+            logger.warning("IPFS HTTP API add failed, falling back to CLI: %s", e)
+
+    stdout = await run_command(IPFS_BIN + ["add", "-r", "--quieter", *ipfs_add_args(), file_location])
+    UPLOAD_BYTES.labels("ipfs").inc(os.path.getsize(file_location))
+    return stdout.strip()
+
+
+async def create_flat_directory() -> str:
+    """EthStorage FlatDirectory 컨트랙트 생성 후 주소 반환"""
+    stdout = await run_command(ETHFS_BIN + ["create", "-p", PRIVATEKEY, "-c", "11155111", "-r", ETH_RPC_URL, "--type", "blob"])
+    match = address_pattern.search(stdout)
+    if not match:
+        raise HTTPException(status_code=500, detail="EthStorage create failed.")
+    return match.group(1)
+
+
+# 크리에이터 지갑별 FlatDirectory 풀 (FLAT_DIRECTORY 환경 변수 값은 첫 번째 여유 디렉토리로 등록)
+flat_directories = FlatDirectoryPool(DB_PATH, create_flat_directory)
+flat_directories.init(FLAT_DIRECTORY)
+
+
+def web3_url(cid: str) -> str:
+    """콘텐츠 ID(`<FlatDirectory>:<파일명>` 또는 주소)를 web3:// URL 로 변환"""
+    if ":" in cid:
+        address, filename = cid.split(":", 1)
+        return f"web3://{address}/{filename}"
+    return f"web3://{cid}"
+
+
+async def store_to_ethstorage(file_location: str, creator_wallet: str, job: Job, state: dict) -> str:
+    """크리에이터의 FlatDirectory 에 파일 업로드 후 콘텐츠 ID(`<FlatDirectory>:<파일명>`) 반환"""
+    # 풀에서 FlatDirectory 할당 (재시도 시에는 이미 받은 디렉토리 재사용)
+    if "flat_directory" not in state:
+        job.set_stage("flat_directory")
+        state["flat_directory"] = await flat_directories.acquire(creator_wallet)
+
+    # 한 디렉토리에 여러 파일이 올라가므로 디렉토리 주소와 파일명으로 콘텐츠 식별
+    # (저장 파일명에 SHA-256 앞부분이 들어가지만, 같은 이름이 이미 있으면 기존 파일을 덮어쓰기 전에 거부 → 가스 낭비 / 원본 손실 없음)
+    cid = f"{state['flat_directory']}:{os.path.basename(file_location)}"
+    if await anyio.to_thread.run_sync(content_id_exists, cid):
+        raise HTTPException(status_code=409, detail=f"{cid} already exists in the FlatDirectory.")
+
+    # EthStorage 업로드 수행 (ethfs-uploader 활용)
+    job.set_stage("ethfs_upload")
+    await run_command(ETHFS_BIN + ["upload", "-f", file_location, "-a", state["flat_directory"], "-p", PRIVATEKEY, "-c", "11155111", "-r", ETH_RPC_URL, "--type", "blob"])
+    UPLOAD_BYTES.labels("ethfs").inc(os.path.getsize(file_location))
+    return cid
+
+
+def content_id_exists(cid: str) -> bool:
+    """이미 메타데이터나 해시 색인에 있는 콘텐츠 ID 인지"""
+    return db.fetchone(
+        "SELECT 1 FROM content_metadata WHERE cid = ? UNION ALL SELECT 1 FROM content_hashes WHERE cid = ? LIMIT 1", (cid, cid)
+    ) is not None
+
+
+def submit_ingest_job(stored: StoredUpload, meta: ContentMeta, storage: str) -> Job:
+    """저장된 파일의 IPFS/EthStorage 업로드 및 메타데이터 기록을 작업 큐에 등록 (progress: upload → ipfs / ethfs → metadata)"""
+    state = {}
+    storage_step = "ethfs" if storage == "ethstorage" else "ipfs"
+
+    async def ingest(job: Job):
+        if storage == "ethstorage":
+            meta.cid = await store_to_ethstorage(stored.path, meta.content_creator_wallet, job, state)
+        else:
+            job.set_stage("ipfs_add")
+            meta.cid = await store_to_ipfs(stored.path)
+
+        await anyio.to_thread.run_sync(
+            content_hashes.record, stored.sha256, storage, meta.cid, state.get("flat_directory"), stored.path, stored.size
+        )
+        job.complete(storage_step)
+
+        job.set_stage("metadata")
+        await insert_content_metadata(meta)
+        job.complete("metadata")
+
+        result = {"meta": meta.model_dump(), "sha256": stored.sha256, "size": stored.size}
+        if storage == "ethstorage":
+            result["web3_url"] = web3_url(meta.cid)  # Web3:// URL 반환
+        return result
+
+    job = ingest_queue.submit(f"upload:{storage}", ingest, steps=("upload", storage_step, "metadata"))
+    job.complete("upload")  # 파일은 이미 디스크에 저장됨
+    return job
+
+
+def fetch_content_metadata(cid: str) -> Optional[dict]:
+    """CID 로 콘텐츠 메타데이터 한 건 조회"""
+    row = db.fetchone("""
+        SELECT cid, video_name, content_creator_wallet, creator_share, provider_share, price
+        FROM content_metadata WHERE cid = ?
+    """, (cid,))
+
+    if not row:
+        return None
+    return {
+        "cid": row[0],
+        "video_name": row[1],
+        "content_creator_wallet": row[2],
+        "creator_share": row[3],
+        "provider_share": row[4],
+        "price": row[5]
+    }
+
+
+def claim_existing_upload(sha256: str, file_location: Optional[str], storage: str) -> Optional[tuple]:
+    """같은 해시의 기존 업로드 (색인 항목, 메타데이터) 조회 및 중복 파일 정리 (SQLite 를 쓰므로 스레드에서 실행)"""
+    hit = content_hashes.lookup(sha256, storage)
+    if hit is None:
+        return None
+
+    # 방금 저장한 중복 파일 정리 (기존 파일이 없어졌다면 새 파일을 기준으로 갱신, 색인이 가리키는 파일은 지우지 않음)
+    if file_location and hit["file_path"] != file_location:
+        if hit["file_path"] and os.path.exists(hit["file_path"]):
+            if not content_hashes.is_referenced(file_location):
+                os.remove(file_location)
+        else:
+            content_hashes.record(sha256, storage, hit["cid"], hit["flat_directory"], file_location, hit["size"])
+
+    return hit, fetch_content_metadata(hit["cid"])
+
+
+async def reuse_existing_upload(sha256: str, file_location: Optional[str], meta: ContentMeta, storage: str) -> Optional[dict]:
+    """같은 해시의 파일이 이미 저장되어 있으면 기존 CID/FlatDirectory 로 응답 (외부 작업 생략)"""
+    claimed = await anyio.to_thread.run_sync(claim_existing_upload, sha256, file_location, storage)
+    if claimed is None:
+        return None
+
+    hit, existing = claimed
+    if existing is None:
+        meta.cid = hit["cid"]
+        await insert_content_metadata(meta)
+        existing = meta.model_dump()
+
+    response = {"message": "File already uploaded.", "deduplicated": True, "meta": existing}
+    if storage == "ethstorage":
+        response["web3_url"] = web3_url(hit["cid"])
+    return response
+
+
+def job_accepted(message: str, job: Job, **extra) -> dict:
+    return {"message": message, "job_id": job.job_id, "status_url": f"/jobs/{job.job_id}", **extra}
+
+
+async def insert_content_metadata(meta: ContentMeta):
+    """SQLite에 콘텐츠 메타데이터 저장 후 캐시 무효화 (잠금 대기/재시도가 이벤트 루프를 막지 않도록 스레드에서 실행)"""
+    try:
+        await anyio.to_thread.run_sync(db.execute, """
+            INSERT INTO content_metadata (cid, video_name, content_creator_wallet, creator_share, provider_share, price)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (meta.cid, meta.video_name, meta.content_creator_wallet, meta.creator_share, meta.provider_share, meta.price))
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="CID already exists in the database.")
+    await metadata_cache.invalidate(meta.cid)
+
+
+def parse_content_meta(json_data: str) -> ContentMeta:
+    """JSON 문자열을 ContentMeta 모델로 변환"""
+    try:
+        return ContentMeta(**json.loads(json_data))
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON format")
 
 
 # test URL
@@ -123,171 +409,337 @@ class RecordViewRequest(BaseModel):
 
 
 
-@app.post("/upload-content")
+@app.post("/upload-content", status_code=202)
 async def upload_content(
+    response: Response,
     file: UploadFile = File(...), 
     json_data: str = Form(...)
 ):
     """파일을 업로드 후 IPFS에 저장 및 CID 반환, SQLite에 메타데이터 저장"""
     
     # 1️⃣ JSON 데이터를 Pydantic 모델로 변환
-    try:
-        meta = ContentMeta(**json.loads(json_data))
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid JSON format")
-    
-    file_location = os.path.join(UPLOAD_PATH, file.filename)
+    meta = parse_content_meta(json_data)
+
+    # 2️⃣ IPFS HTTP API 가 있으면 업로드 스트림을 디스크를 거치지 않고 바로 전송
+    if ipfs_client is not None:
+        reader = HashingReader(file)
+        try:
+            entry = await ipfs_client.add_stream(reader.chunks(), safe_filename(file.filename))
+        except (IPFSError, httpx.HTTPError) as e:
+            logger.warning("IPFS HTTP API add failed, falling back to CLI: %s", e)
+            await file.seek(0)
+        else:
+            response.status_code = 200
+            duplicate = await reuse_existing_upload(reader.sha256, None, meta, "ipfs")
+            if duplicate:
+                return duplicate
+            meta.cid = entry["Hash"]
+            await anyio.to_thread.run_sync(lambda: content_hashes.record(reader.sha256, "ipfs", meta.cid, size=reader.size))
+            await insert_content_metadata(meta)
+            return {"message": "File uploaded successfully.", "meta": meta, "sha256": reader.sha256, "size": reader.size}
     
-    # 2️⃣ 파일 저장
-    with open(file_location, "wb") as buffer:
-        buffer.write(await file.read())
+    # 3️⃣ CLI 경로: 파일 저장 (청크 단위 스트리밍, 임시 파일 → rename)
+    stored = await save_upload_stream(file, UPLOAD_PATH)
 
-    # 3️⃣ IPFS를 통해 파일 업로드
-    cmd = f"ipfs add -r --quieter {file_location}"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    # 이미 올린 파일이면 기존 CID 반환
+    duplicate = await reuse_existing_upload(stored.sha256, stored.path, meta, "ipfs")
+    if duplicate:
+        response.status_code = 200
+        return duplicate
 
-    if result.returncode != 0:
-        raise HTTPException(status_code=500, detail="IPFS upload failed.")
+    # 4️⃣ IPFS 업로드 및 메타데이터 저장은 백그라운드 작업으로 처리 (/jobs/{job_id} 로 진행 상황 조회)
+    job = submit_ingest_job(stored, meta, "ipfs")
 
-    # 4️⃣ CID 추출
-    cid = result.stdout.strip()
-    meta.cid = cid  # CID 저장
-    
-    # 5️⃣ SQLite에 메타데이터 저장
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    try:
-        cursor.execute("""
-            INSERT INTO content_metadata (cid, video_name, content_creator_wallet, creator_share, provider_share, price)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (meta.cid, meta.video_name, meta.content_creator_wallet, meta.creator_share, meta.provider_share, meta.price))
-
-        conn.commit()
-    except sqlite3.IntegrityError:
-        raise HTTPException(status_code=400, detail="CID already exists in the database.")
-    finally:
-        conn.close()
-
-    return {
-        "message": "File uploaded successfully.",
-        "meta": meta
-    }
+    return job_accepted("File uploaded, IPFS ingestion queued.", job, meta=meta)
 
 # curl -X POST "http://localhost:8000/upload-content-web3" \
 #      -H "Content-Type: multipart/form-data" \
 #      -F "file=@./data/source1.mov" \
 #      -F 'json_data={"video_name": "source1.mov", "content_creator_wallet": "0xB9a3799106B0364331d4e154F5f76BFF7E62D4BC", "creator_share": 70, "provider_share": 30, "price": 0.001}'
 
-@app.post("/upload-content-web3")
+@app.post("/upload-content-web3", status_code=202)
 async def upload_content_web3(
+    response: Response,
     file: UploadFile = File(...), 
     json_data: str = Form(...)
 ):
     """파일을 업로드 후 EthStorage에 저장 및 CID 반환, SQLite에 메타데이터 저장"""
     
     # 1️⃣ JSON 데이터를 Pydantic 모델로 변환
-    try:
-        meta = ContentMeta(**json.loads(json_data))
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid JSON format")
+    meta = parse_content_meta(json_data)
     
-    file_location = os.path.join(UPLOAD_PATH, file.filename)
+    # 2️⃣ 파일 저장 (청크 단위 스트리밍, 임시 파일 → rename)
+    stored = await save_upload_stream(file, UPLOAD_PATH)
+
+    # 이미 올린 파일이면 기존 FlatDirectory 주소 반환 (create/upload 가스 비용 절약)
+    duplicate = await reuse_existing_upload(stored.sha256, stored.path, meta, "ethstorage")
+    if duplicate:
+        response.status_code = 200
+        return duplicate
+
+    # 3️⃣ EthStorage 업로드 및 메타데이터 저장은 백그라운드 작업으로 처리 (/jobs/{job_id} 로 진행 상황 조회)
+    job = submit_ingest_job(stored, meta, "ethstorage")
+
+    return job_accepted("File uploaded, EthStorage ingestion queued.", job, meta=meta)
     
-    # 2️⃣ 파일 저장
-    with open(file_location, "wb") as buffer:
-        buffer.write(await file.read())
 
-    # # 3️⃣ EthStorage 업로드 수행 (ethfs-uploader 활용)
-    cmd = f"ethfs-cli create -p {PRIVATEKEY} -c 11155111 -r {ETH_RPC_URL} --type blob"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+# 재개 가능한(resumable) 업로드
+#
+# curl -X POST "http://localhost:8000/uploads" -H "Content-Type: application/json" \
+#      -d '{"filename": "source1.mov", "length": 1048576, "storage": "ipfs", "meta": {"video_name": "lobster dance", "content_creator_wallet": "0x1234", "creator_share": 70, "provider_share": 30, "price": 0.001}}'
+# curl -X PUT "http://localhost:8000/uploads/{upload_id}" -H "Content-Range: bytes 0-524287/1048576" --data-binary @part0
+# curl -I "http://localhost:8000/uploads/{upload_id}"
+# curl -X POST "http://localhost:8000/uploads/{upload_id}/finalize"
 
-    if result.returncode != 0:
-        raise HTTPException(status_code=500, detail="EthStorage create failed.")
+@app.post("/uploads", status_code=201)
+def create_upload_session(request: UploadSessionRequest):
+    """재개 가능한 업로드 세션 생성"""
+    if request.storage not in ("ipfs", "ethstorage"):
+        raise HTTPException(status_code=400, detail="storage must be 'ipfs' or 'ethstorage'")
 
-    FLAT_DIRECTORY = address_pattern.search(result.stdout).group(1)
+    session = upload_sessions.create(request.filename, request.length, request.storage, request.meta.model_dump(exclude_none=True))
+    return {**upload_sessions.status(session), "location": f"/uploads/{session['upload_id']}"}
 
-    # 3️⃣ EthStorage 업로드 수행 (ethfs-uploader 활용)
-    cmd = f"ethfs-cli upload -f {file_location} -a {FLAT_DIRECTORY} -p {PRIVATEKEY} -c 11155111 -r {ETH_RPC_URL} --type blob"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
 
-    if result.returncode != 0:
-        raise HTTPException(status_code=500, detail="EthStorage upload failed.")
+@app.put("/uploads/{upload_id}")
+async def upload_session_range(upload_id: str, request: Request):
+    """Content-Range 로 지정한 바이트 구간 업로드 (여러 구간 병렬 전송 가능)"""
+    session = upload_sessions.get(upload_id)
+    start, end = parse_content_range(request.headers.get("content-range"), session["length"])
 
-    # 4️⃣ CID 추출
-    cid = cid_pattern.search(result.stdout).group(1)
+    session = await upload_sessions.write_range(upload_id, start, end, request.stream())
+    return upload_sessions.status(session)
 
-    meta.cid = cid  # CID 저장
-    
-    # 5️⃣ SQLite에 메타데이터 저장
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
-    try:
-        cursor.execute("""
-            INSERT INTO content_metadata (cid, video_name, content_creator_wallet, creator_share, provider_share, price)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (meta.cid, meta.video_name, meta.content_creator_wallet, meta.creator_share, meta.provider_share, meta.price))
+@app.head("/uploads/{upload_id}")
+def upload_session_offset(upload_id: str):
+    """현재 업로드 오프셋 조회 (tus 호환 헤더)"""
+    status = upload_sessions.status(upload_sessions.get(upload_id))
+    return Response(headers={
+        "Upload-Offset": str(status["offset"]),
+        "Upload-Length": str(status["length"]),
+        "Cache-Control": "no-store",
+    })
 
-        conn.commit()
-    except sqlite3.IntegrityError:
-        raise HTTPException(status_code=400, detail="CID already exists in the database.")
-    finally:
-        conn.close()
 
-    return {
-        "message": "File uploaded successfully to EthStorage.",
-        "web3_url": f"web3://{meta.cid}",  # Web3:// URL 반환
-        "meta": meta
-    }
-    
+@app.get("/uploads/{upload_id}")
+def get_upload_session(upload_id: str):
+    """업로드 세션 상태 및 수신 완료 구간 조회"""
+    return upload_sessions.status(upload_sessions.get(upload_id))
+
+
+@app.delete("/uploads/{upload_id}")
+def abort_upload_session(upload_id: str):
+    """업로드 세션 취소"""
+    upload_sessions.abort(upload_id)
+    return {"message": "Upload session aborted.", "upload_id": upload_id}
+
+
+@app.post("/uploads/{upload_id}/finalize", status_code=202)
+async def finalize_upload_session(upload_id: str, response: Response):
+    """조립된 파일을 IPFS/EthStorage에 저장하고 메타데이터 기록"""
+    session = upload_sessions.get(upload_id)
+    meta = ContentMeta(**session["meta"])
+
+    stored = await upload_sessions.finalize(upload_id, UPLOAD_PATH)
+
+    duplicate = await reuse_existing_upload(stored.sha256, stored.path, meta, session["storage"])
+    if duplicate:
+        response.status_code = 200
+        return duplicate
+
+    job = submit_ingest_job(stored, meta, session["storage"])
+
+    return job_accepted("Upload assembled, ingestion queued.", job, meta=meta)
+
 
 #
 # curl -X DELETE "http://localhost:8000/delete-content_web3/QmX1hb49by46TeJZfhn2Va9UTNPfrSyGgPcPTCrvQkMfhA"
 
-@app.delete("/delete-content_web3/{cid}")
+@app.delete("/delete-content_web3/{cid}", status_code=202)
 async def delete_content_web3(cid: str):
     """EthStorage에 업로드된 파일 및 SQLite의 메타데이터 삭제"""
 
     # 1️⃣ SQLite에서 CID가 존재하는지 확인하고 파일명 가져오기
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT video_name FROM content_metadata WHERE cid = ?", (cid,))
-    result = cursor.fetchone()
+    result = await anyio.to_thread.run_sync(db.fetchone, "SELECT video_name FROM content_metadata WHERE cid = ?", (cid,))
 
     if not result:
-        conn.close()
         raise HTTPException(status_code=404, detail="CID가 존재하지 않습니다.")
 
     video_name = result[0]  # 조회된 파일명
 
-    cmd = f"ethfs-cli remove -c {cid} -f {video_name} -a {PRIVATEKEY} -r {ETH_RPC_URL}"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    async def delete(job: Job):
+        # 2️⃣ EthStorage 파일 삭제
+        job.set_stage("ethfs_remove")
+        if ":" in cid:
+            # 공유 FlatDirectory 에서 해당 파일만 삭제
+            address, filename = cid.split(":", 1)
+            await run_command(ETHFS_BIN + ["remove", "-a", address, "-f", filename, "-p", PRIVATEKEY, "-c", "11155111", "-r", ETH_RPC_URL])
+        else:
+            await run_command(ETHFS_BIN + ["remove", "-c", cid, "-f", video_name, "-a", PRIVATEKEY, "-r", ETH_RPC_URL])
+        job.complete("ethfs")
+
+        # 3️⃣ SQLite에서 메타데이터 삭제
+        job.set_stage("metadata")
+        try:
+            await anyio.to_thread.run_sync(db.execute, "DELETE FROM content_metadata WHERE cid = ?", (cid,))
+        except sqlite3.DatabaseError as e:
+            raise HTTPException(status_code=500, detail=f"SQLite 삭제 오류: {str(e)}")
+        await metadata_cache.invalidate(cid)
+        await anyio.to_thread.run_sync(content_hashes.forget_cid, cid)
+        job.complete("metadata")
 
-    if result.returncode != 0:
-        raise HTTPException(status_code=500, detail=f"EthStorage 파일 삭제 실패: {result.stderr}")
+        return {"cid": cid, "file_name": video_name}
 
-    # 3️⃣ SQLite에서 메타데이터 삭제
+    job = ingest_queue.submit("delete:ethstorage", delete, steps=("ethfs", "metadata"))
+
+    return job_accepted("파일 및 메타데이터 삭제 작업이 등록되었습니다.", job, cid=cid, file_name=video_name)
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus 수집용 메트릭 (라우트별 요청 수 / 처리 시간 / 처리 중 요청, 의존성 호출 시간, 업로드 바이트)"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/dedup/stats")
+def get_dedup_stats():
+    """중복 업로드 색인 적중률"""
+    return content_hashes.stats()
+
+
+@app.get("/flat-directories/stats")
+def get_flat_directory_stats():
+    """FlatDirectory 풀 상태"""
+    return flat_directories.stats()
+
+
+def transcode_source(cid: str) -> str:
+    """변환할 원본 위치 (로컬 업로드 파일 우선, 없으면 IPFS 게이트웨이)"""
+    local = content_hashes.find_by_cid(cid)
+    if local and local["file_path"] and os.path.exists(local["file_path"]):
+        return local["file_path"]
+    if ":" in cid:
+        raise HTTPException(status_code=404, detail="EthStorage 콘텐츠의 원본 파일을 찾을 수 없습니다.")
+    return IPFS_GATEWAY + cid
+
+
+async def is_known_cid(cid: str) -> bool:
+    """메타데이터/해시 색인에 있거나 /register 로 등록된 CID 인지 (모르는 CID 로 변환 작업과 외부 요청을 만들지 않도록)"""
+    if await anyio.to_thread.run_sync(content_id_exists, cid):
+        return True
     try:
-        cursor.execute("DELETE FROM content_metadata WHERE cid = ?", (cid,))
-        conn.commit()
-    except sqlite3.DatabaseError as e:
-        raise HTTPException(status_code=500, detail=f"SQLite 삭제 오류: {str(e)}")
-    finally:
-        conn.close()
+        return bool(await stream_registry.servers_by_cid(cid))
+    except RedisError as e:
+        logger.warning("stream registry lookup failed for %s: %s", cid, e)
+        return False
 
-    return {
-        "message": "파일 및 메타데이터가 성공적으로 삭제되었습니다.",
-        "cid": cid,
-        "file_name": video_name
-    }
 
+async def start_transcode(cid: str) -> Optional[Job]:
+    """알려진 CID 만 변환 요청 (모르는 CID 는 404)"""
+    if not await is_known_cid(cid):
+        raise HTTPException(status_code=404, detail="CID not found")
+    return transcoder.request(cid, await anyio.to_thread.run_sync(transcode_source, cid))
 
-@app.post("/register")
-def register_server(server: StreamServer):
 
-    # redis_client.set(server.cid, server.stream_url)
+def transcode_status(cid: str) -> dict:
+    if transcoder.is_ready(cid):
+        return {"cid": cid, "status": "ready", "master_playlist": f"/stream/{cid}/master.m3u8"}
+    job = transcoder.active.get(cid)
+    if job is None:
+        return {"cid": cid, "status": "not_started"}
+    return {"cid": cid, **job.to_dict()}
+
+
+@app.post("/transcode/{cid}")
+async def request_transcode(cid: str, response: Response):
+    """CID 를 HLS 렌디션으로 변환 요청 (이미 변환됐거나 진행 중이면 기존 결과/작업 반환)"""
+    job = await start_transcode(cid)
+    if job is not None:
+        response.status_code = 202
+    return transcode_status(cid)
+
+
+@app.get("/transcode/{cid}")
+def get_transcode_status(cid: str):
+    """변환 진행률 조회 (모든 렌디션을 한 ffmpeg 실행으로 만들므로 진행률은 하나)"""
+    return transcode_status(cid)
+
+
+def resolve_under(base: str, path: str) -> Optional[str]:
+    """base 디렉토리 밖을 가리키는 경로는 거부"""
+    base = os.path.realpath(base)
+    file_path = os.path.realpath(os.path.join(base, path))
+    return file_path if file_path.startswith(base + os.sep) else None
+
+
+# curl -H "Range: bytes=0-1023" "http://localhost:8000/stream/{cid}/720p/seg_00000.ts"
+
+@app.api_route("/stream/{cid}/{path:path}", methods=["GET", "HEAD"])
+async def stream_file(cid: str, path: str, request: Request):
+    """HLS 세그먼트 또는 업로드 원본 제공 (Range/If-Range, 내용 해시 ETag, zero-copy 전송)"""
+    sha256 = None
+
+    # 1️⃣ 변환된 HLS 파일 (LRU 디스크 캐시)
+    file_path = resolve_under(segment_cache.path(cid), path)
+    stat_result = await stat_file(file_path) if file_path else None
+    if stat_result is not None and segment_cache.touch(cid):
+        internal_path = f"stream/{cid}/{path}"
+    else:
+        # 2️⃣ 업로드 원본 파일 (프로그레시브 다운로드, Range 로 탐색)
+        stat_result = None
+        local = await anyio.to_thread.run_sync(content_hashes.find_by_cid, cid)
+        stored_name = os.path.basename(local["file_path"] or "") if local else ""
+        if stored_name and path in (stored_name, original_filename(stored_name)):
+            file_path, sha256 = local["file_path"], local["sha256"]
+            stat_result = await stat_file(file_path)
+            internal_path = f"uploads/{stored_name}"
+
+    if stat_result is None:
+        if transcoder.is_ready(cid):
+            raise HTTPException(status_code=404, detail="File not found")
+
+        # 아직 변환되지 않았거나 캐시에서 제거된 경우 변환을 시작하고 202 반환 (모르는 CID 는 404)
+        await start_transcode(cid)
+        return Response(
+            content=json.dumps(transcode_status(cid)),
+            status_code=202,
+            media_type="application/json",
+            headers={"Retry-After": "10"},
+        )
+
+    # 3️⃣ 조건부 요청 처리
+    etag = await anyio.to_thread.run_sync(etag_cache.get, file_path, stat_result, sha256)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # 4️⃣ 앞단 프록시(nginx X-Accel-Redirect 등)가 sendfile 로 직접 전송
+    if STREAM_SENDFILE_HEADER:
+        return Response(headers={**headers, STREAM_SENDFILE_HEADER: STREAM_SENDFILE_PREFIX + internal_path})
+
+    return StreamFileResponse(file_path, stat_result=stat_result, headers=headers)
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """백그라운드 수집 작업 상태 조회"""
+    return ingest_queue.get(job_id).to_dict()
+
+
+@app.get("/jobs")
+def get_job_stats():
+    """작업 큐 상태 요약"""
+    return {"queue_size": ingest_queue.queue.qsize(), "workers": ingest_queue.workers, "jobs": ingest_queue.stats()}
+
+
+@app.post("/register")
+async def register_server(server: StreamServer):
+    # 스트리밍 노드 URL 검사 (프로브가 내부 주소로 요청하지 않도록 루프백/사설/링크 로컬 주소는 거부)
+    try:
+        await server_selector.check_url(server.stream_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     server_info = {
         "cid": server.cid,
@@ -297,219 +749,182 @@ def register_server(server: StreamServer):
         "creator_share": server.creator_share,
         "provider_share": server.provider_share,
         "price": server.price,
-        "stream_url": server.stream_url
+        "stream_url": server.stream_url,
+        "region": server.region,
     }
 
-    # 3️⃣ CID 기반 색인 (여러 개 관리 가능)
-    redis_client.sadd(f"{STREAMING_SERVERS_BY_CID}:{server.cid}", str(server_info))
+    # 3️⃣ 서버별 해시 저장 + CID / 지갑+CID 색인에 서버 ID 추가 (같은 URL 재등록 시 갱신)
+    server_info, lease = await stream_registry.register(server_info)
 
-    # 4️⃣ 서버 URL 기반 색인 (여러 개 관리 가능)
-    # parsed_url = urlparse(stream_url)
+    # 4️⃣ 등록 자체를 첫 하트비트로 취급 (이후 HEALTH_TTL 안에 하트비트/프로브가 없으면 선택 대상에서 제외)
+    await server_selector.heartbeat(server.stream_url, region=server.region)
 
-    # 호스트 + 포트만 추출
-    # base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-
-    redis_client.sadd(f"{STREAMING_SERVERS_BY_ADDRESS}:{server.content_distributor_wallet}:{server.cid}", str(server_info))
-
-    return {"message": "서버 등록 및 변환 완료", "server": server_info}
+    # 5️⃣ HLS 변환 요청 (이미 변환된 CID 는 재변환하지 않음)
+    try:
+        transcoder.request(server.cid, await anyio.to_thread.run_sync(transcode_source, server.cid))
+    except HTTPException:
+        pass  # 원본을 찾을 수 없는 콘텐츠는 등록만 수행
+    transcode = transcode_status(server.cid)
+
+    if transcode["status"] == "ready":
+        message = "서버 등록 및 변환 완료"
+    elif transcode["status"] in ("queued", "running"):
+        message = "서버 등록 완료 (변환 진행 중)"
+    else:
+        message = "서버 등록 완료"
+    return {"message": message, "server": server_info, "lease": lease, "transcode": transcode}
 
 
 @app.post("/deregister")
-def deregister_server(request: DeregisterRequest):
+async def deregister_server(request: DeregisterRequest):
     """ DePIN 스트리밍 서버 제거 (소유자 검증 포함) """
-    
-    cid_key = f"{STREAMING_SERVERS_BY_CID}:{request.cid}"
-    wallet_key = f"{STREAMING_SERVERS_BY_ADDRESS}:{request.content_distributor_wallet}:{request.cid}"
-
-    # 1️⃣ Retrieve all servers linked to the CID
-    servers_by_cid = redis_client.smembers(cid_key)
-    if not servers_by_cid:
-        raise HTTPException(status_code=404, detail="해당 CID에 대한 스트리밍 서버를 찾을 수 없습니다.")
-
-    # 2️⃣ Find the matching server by stream URL
-    server_to_remove = None
-    servers_by_wallet = redis_client.smembers(wallet_key)
-    if not servers_by_wallet:
-        raise HTTPException(status_code=404, detail="해당 WALLET에 대한 스트리밍 서버를 찾을 수 없습니다.")
-    else:
-        for server_str in servers_by_wallet:
-            server_data = ast.literal_eval(server_str)
-            if server_data["content_distributor_wallet"] != request.content_distributor_wallet:
-                raise HTTPException(status_code=403, detail="해당 스트리밍 서버를 제거할 권한이 없습니다.")
-            server_to_remove = server_str
-            break
-
-    if not server_to_remove:
-        raise HTTPException(status_code=404, detail="해당 CID에 대한 특정 스트리밍 서버를 찾을 수 없습니다.")
 
-    # 4️⃣ Remove the server from CID-based index
-    redis_client.srem(cid_key, server_to_remove)
-
-    # 5️⃣ Remove the server from URL-based index
-    redis_client.srem(wallet_key, server_to_remove)
+    # 1️⃣ 지갑+CID 색인에 있는 서버만 제거 가능 (확인 + 제거 + 색인 정리를 Lua 스크립트 한 번으로)
+    removed = await stream_registry.remove(request.cid, request.content_distributor_wallet, request.stream_url)
+    if not removed:
+        raise HTTPException(status_code=404, detail="해당 WALLET/CID에 대한 스트리밍 서버를 찾을 수 없습니다.")
 
     return {
         "message": "서버 제거 완료",
         "cid": request.cid,
-        "content_distributor_wallet": request.content_distributor_wallet
-
-
-
+        "content_distributor_wallet": request.content_distributor_wallet,
+        "removed": removed,
     }
 
 @app.get("/get_stream_by_cid/{cid}")
-def get_stream_by_cid(cid: str):
-    """CID 기반으로 등록된 단일 스트리밍 서버 정보 반환"""
-    cid_key = f"{STREAMING_SERVERS_BY_CID}:{cid}"
-    servers = redis_client.smembers(cid_key)
+async def get_stream_by_cid(cid: str, region: Optional[str] = Query(None, description="시청자 지역 (같은 지역 노드 우선)")):
+    """CID 기반으로 등록된 서버 중 정상 상태이고 부하가 적은 서버 하나 반환"""
+    servers = await stream_registry.servers_by_cid(cid)
 
     if not servers:
         raise HTTPException(status_code=404, detail="해당 CID에 대한 스트리밍 서버가 없습니다.")
 
-    # 첫 번째 값만 선택 (집합에서 하나의 값 가져오기)
-    first_server = next(iter(servers))  # set에서 첫 번째 요소 가져오기
-    server_data = ast.literal_eval(first_server)  # 문자열을 딕셔너리로 변환
+    selected = await server_selector.select(servers, region)
+    if selected is None:
+        raise HTTPException(status_code=503, detail="해당 CID에 대해 응답하는 스트리밍 서버가 없습니다.")
 
-    return {"cid": cid, "server": server_data}
+    server, health = selected
+    return {"cid": cid, "server": server, "health": health}
 
-@app.get("/get_all_streams_by_cid")
-def search_streams_by_partial_cid():
-    """일부 CID 값이 포함된 스트리밍 서버 정보 반환"""
-    
-    # 패턴을 활용하여 CID 키 검색
-    pattern = f"{STREAMING_SERVERS_BY_CID}*"
-    matching_keys = list(redis_client.scan_iter(pattern))
 
-    if not matching_keys:
-        raise HTTPException(status_code=404, detail="해당 패턴과 일치하는 CID가 없습니다.")
+@app.post("/heartbeat")
+async def heartbeat(request: HeartbeatRequest):
+    """등록 임대 일괄 연장 + 스트리밍 노드 상태 보고 (HEALTH_TTL 연장 + 부하/용량 갱신)"""
+    if len(request.leases) > HEARTBEAT_MAX_LEASES:
+        raise HTTPException(status_code=400, detail=f"한 번에 최대 {HEARTBEAT_MAX_LEASES}개의 임대만 갱신할 수 있습니다.")
 
-    result = {}
+    if request.stream_url:
+        try:
+            await server_selector.check_url(request.stream_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    for key in matching_keys:
-        servers = redis_client.smembers(key)
-        if servers:
-            # 문자열 데이터를 딕셔너리로 변환
-            server_list = [ast.literal_eval(server) for server in servers]
-            result[key] = server_list
+    # 1️⃣ 임대 연장 (만료된 임대는 expired 로 반환 → 제공자가 /register 로 다시 등록)
+    renewed, expired = await stream_registry.renew(request.leases)
 
-    return {"matching_cids": result}
+    # 2️⃣ 노드 상태 갱신
+    nid = None
+    if request.stream_url:
+        nid = await server_selector.heartbeat(request.stream_url, request.load, request.capacity, request.region)
 
-@app.get("/get_all_streams_by_uid")
-def search_streams_by_partial_cid():
-    """일부 CID 값이 포함된 스트리밍 서버 정보 반환"""
-    
-    # 패턴을 활용하여 CID 키 검색
-    pattern = f"{STREAMING_SERVERS_BY_ADDRESS}*"
-    matching_keys = list(redis_client.scan_iter(pattern))
+    return {
+        "renewed": renewed,
+        "expired": expired,
+        "lease_ttl": stream_registry.lease_ttl,
+        "node_id": nid,
+        "health_ttl": server_selector.ttl,
+    }
 
-    if not matching_keys:
-        raise HTTPException(status_code=404, detail="해당 패턴과 일치하는 CID가 없습니다.")
+async def registry_page(list_page, *args, cursor: Optional[str], limit: int):
+    """레지스트리 목록 한 페이지 조회 (잘못된 커서는 400)"""
+    try:
+        return await list_page(*args, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    result = {}
 
-    for key in matching_keys:
-        servers = redis_client.smembers(key)
-        if servers:
-            # 문자열 데이터를 딕셔너리로 변환
-            server_list = [ast.literal_eval(server) for server in servers]
-            result[key] = server_list
+@app.get("/get_all_streams_by_cid")
+async def search_streams_by_partial_cid(
+    cursor: Optional[str] = Query(None, description="이전 응답의 next_cursor"),
+    limit: int = Query(REGISTRY_PAGE_SIZE, ge=1, le=REGISTRY_MAX_PAGE_SIZE),
+):
+    """CID 별 스트리밍 서버 정보 반환 (CID 색인 기반 페이지네이션)"""
+    result, next_cursor = await registry_page(stream_registry.list_cids, cursor=cursor, limit=limit)
 
-    return {"matching_cids": result}
+    if not result and not cursor:
+        raise HTTPException(status_code=404, detail="등록된 CID가 없습니다.")
 
+    return {"matching_cids": result, "next_cursor": next_cursor}
 
-@app.get("/get_list_stream_by_wallet/{walletid}")
-def get_list_stream_by_cid(walletid: str):
-    """WALLET 기반으로 등록된 모든 스트리밍 서버 정보 반환"""
-    pattern = f"{STREAMING_SERVERS_BY_ADDRESS}:{walletid}"
-    matching_keys = list(redis_client.scan_iter(pattern))
+@app.get("/get_all_streams_by_uid")
+async def search_streams_by_partial_uid(
+    cursor: Optional[str] = Query(None, description="이전 응답의 next_cursor"),
+    limit: int = Query(REGISTRY_PAGE_SIZE, ge=1, le=REGISTRY_MAX_PAGE_SIZE),
+):
+    """지갑:CID 별 스트리밍 서버 정보 반환 (지갑+CID 색인 기반 페이지네이션)"""
+    result, next_cursor = await registry_page(stream_registry.list_wallet_cids, cursor=cursor, limit=limit)
 
-    if not matching_keys:
-        raise HTTPException(status_code=404, detail="해당 WALLET에 대한 스트리밍 서버가 없습니다.")
+    if not result and not cursor:
+        raise HTTPException(status_code=404, detail="등록된 WALLET/CID가 없습니다.")
+
+    return {"matching_cids": result, "next_cursor": next_cursor}
 
-    result = {}
 
-    for key in matching_keys:
-        servers = redis_client.smembers(key)
-        if servers:
-            # 문자열 데이터를 딕셔너리로 변환
-            server_list = [ast.literal_eval(server) for server in servers]
-            result[key] = server_list
+@app.get("/get_list_stream_by_wallet/{walletid}")
+async def get_list_stream_by_wallet(
+    walletid: str,
+    cursor: Optional[str] = Query(None, description="이전 응답의 next_cursor"),
+    limit: int = Query(REGISTRY_PAGE_SIZE, ge=1, le=REGISTRY_MAX_PAGE_SIZE),
+):
+    """WALLET 기반으로 등록된 모든 스트리밍 서버 정보 반환 (CID 별)"""
+    result, next_cursor = await registry_page(stream_registry.list_wallet, walletid, cursor=cursor, limit=limit)
+
+    if not result and not cursor:
+        raise HTTPException(status_code=404, detail="해당 WALLET에 대한 스트리밍 서버가 없습니다.")
 
-    return {"results": result}    
+    return {"wallet": walletid, "results": result, "next_cursor": next_cursor}
 
 
 @app.get("/get_stream_by_wallet_cid/{walletid}/{cid}")
-def get_list_stream_by_cid(walletid: str, cid: str):
+async def get_list_stream_by_cid(walletid: str, cid: str):
     """WALLET 기반으로 등록된 모든 스트리밍 서버 정보 반환"""
-    wallet_key = f"{STREAMING_SERVERS_BY_ADDRESS}:{walletid}:{cid}"
-    servers = redis_client.smembers(wallet_key)
+    server_list = await stream_registry.servers_by_wallet_cid(walletid, cid)
 
-    if not servers:
+    if not server_list:
         raise HTTPException(status_code=404, detail="해당 WALLET/CID에 대한 스트리밍 서버가 없습니다.")
 
-    # 문자열을 딕셔너리로 변환
-    server_list = [ast.literal_eval(server) for server in servers]
-
     return {"wallet": walletid, "servers": server_list}
 
 
 @app.get("/get_list_stream_by_cid/{cid}")
-def get_list_stream_by_cid(cid: str):
+async def get_list_stream_by_cid(cid: str):
     """CID 기반으로 등록된 모든 스트리밍 서버 정보 반환"""
-    cid_key = f"{STREAMING_SERVERS_BY_CID}:{cid}"
-    servers = redis_client.smembers(cid_key)
+    server_list = await stream_registry.servers_by_cid(cid)
 
-    if not servers:
+    if not server_list:
         raise HTTPException(status_code=404, detail="해당 CID에 대한 스트리밍 서버가 없습니다.")
 
-    # 문자열을 딕셔너리로 변환
-    server_list = [ast.literal_eval(server) for server in servers]
-
     return {"cid": cid, "servers": server_list}
 
 
-@app.get("/meta/get_metadata/{cid}")
-def get_metadata(cid: str):
-    """CID 기반으로 메타데이터 조회"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT video_name, content_creator_wallet, creator_share, provider_share, price
-        FROM content_metadata WHERE cid = ?
-    """, (cid,))
-    
-    data = cursor.fetchone()
-    conn.close()
-
-    if not data:
-        raise HTTPException(status_code=404, detail="CID에 대한 메타데이터를 찾을 수 없습니다.")
+def cached_json_response(request: Request, entry) -> Response:
+    """캐시된 (ETag, 본문) 응답 (If-None-Match 가 일치하면 본문 없이 304)"""
+    etag, body = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}  # 매번 재검증, 바뀌지 않았으면 304
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        metadata_cache.count_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
-    return {
-        "cid": cid,
-        "video_name": data[0],
-        "content_creator_wallet": data[1],
-        "creator_share": data[2],
-        "provider_share": data[3],
-        "price": data[4]
-    }
 
-@app.get("/meta/get_all_metadata")
-def get_all_metadata():
-    """전체 메타데이터 조회"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
+def load_all_metadata() -> Optional[dict]:
+    data = db.fetchall("""
         SELECT cid, video_name, content_creator_wallet, creator_share, provider_share, price
         FROM content_metadata
     """)
-    
-    data = cursor.fetchall()
-    conn.close()
 
     if not data:
-        raise HTTPException(status_code=404, detail="메타데이터가 존재하지 않습니다.")
+        return None
 
     metadata_list = [
         {
@@ -526,118 +941,163 @@ def get_all_metadata():
     return {"metadata": metadata_list}
 
 
-@app.post("/api/record-view")
-def record_view(req: RecordViewRequest):
-    """ 스트리밍 접속 기록 저장 """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+@app.get("/meta/get_metadata/{cid}")
+async def get_metadata(cid: str, request: Request):
+    """CID 기반으로 메타데이터 조회 (캐시, ETag)"""
+    entry = await metadata_cache.get(metadata_key(cid), lambda: fetch_content_metadata(cid))
+
+    if entry is None:
+        raise HTTPException(status_code=404, detail="CID에 대한 메타데이터를 찾을 수 없습니다.")
+
+    return cached_json_response(request, entry)
+
+@app.get("/meta/get_all_metadata")
+async def get_all_metadata(request: Request):
+    """전체 메타데이터 조회 (캐시, ETag)"""
+    entry = await metadata_cache.get(ALL_METADATA, load_all_metadata)
+
+    if entry is None:
+        raise HTTPException(status_code=404, detail="메타데이터가 존재하지 않습니다.")
+
+    return cached_json_response(request, entry)
 
+@app.get("/meta/search")
+def search_metadata(
+    q: Optional[str] = Query(None, description="video_name 검색어 (단어별 접두어 일치)"),
+    creator_wallet: Optional[str] = Query(None),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    cursor: Optional[str] = Query(None, description="이전 응답의 next_cursor"),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+):
+    """ 메타데이터 검색 (최신순, 커서 페이지네이션) """
     try:
-        cursor.execute("""
-            INSERT INTO streaming_access_logs (cid, blockchain_address, provider_wallet, creator_wallet, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (req.cid, req.blockchain_address, req.provider_wallet, req.creator_wallet, req.price, req.timestamp))
+        result, next_cursor = content_search.search(q, creator_wallet, min_price, max_price, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"DB 조회 오류: {str(e)}")
+
+    return {"metadata": result, "next_cursor": next_cursor}
+
+@app.get("/meta/get_metadata_batch")
+def get_metadata_batch(cids: List[str] = Query(..., description="조회할 cid (여러 번 지정)")):
+    """ 여러 cid 의 메타데이터를 한 번에 조회 (요청 순서대로, 없는 cid 는 missing) """
+    try:
+        result, missing = content_search.by_cids(cids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"metadata": result, "missing": missing}
+
+@app.get("/meta/cache/stats")
+def metadata_cache_stats():
+    """ 메타데이터 캐시 적중/미스/304/무효화 횟수 """
+    return metadata_cache.stats()
+
 
-        conn.commit()
+async def submit_views(rows: List[tuple]) -> int:
+    """중복 제거를 통과한 기록을 버퍼에 추가 (버퍼가 가득 차 503 이면 재시도할 수 있도록 중복 표시 해제)"""
+    try:
+        return view_log.submit(rows)
+    except HTTPException:
+        await view_dedup.forget(rows)
+        raise
+
+
+@app.post("/api/record-view", status_code=202)
+async def record_view(req: RecordViewRequest):
+    """ 스트리밍 접속 기록 저장 (버퍼에 추가, VIEW_FLUSH_INTERVAL_MS 안에 일괄 저장, 창 안의 중복은 버림) """
+    rows = await view_dedup.filter([req.row()])
+    await submit_views(rows)
+
+    return {"message": "접속 기록 저장 요청 완료", "cid": req.cid, "creator_wallet": req.creator_wallet, "duplicate": not rows}
+
+
+@app.post("/api/record-views", status_code=202)
+async def record_views(views: List[RecordViewRequest]):
+    """ 여러 접속 기록을 한 번에 저장 요청 """
+    if len(views) > VIEW_BULK_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"한 번에 최대 {VIEW_BULK_MAX_ROWS}건까지 저장할 수 있습니다.")
+    rows = await view_dedup.filter([view.row() for view in views])
+    accepted = await submit_views(rows)
+
+    return {"message": "접속 기록 저장 요청 완료", "accepted": accepted, "duplicates": len(views) - len(rows)}
+
+
+@app.get("/api/record-views/stats")
+def record_views_stats():
+    """ 접속 기록 버퍼 상태 (대기 건수, 저장 건수, 마지막 저장 소요 시간) + 중복 제거 상태 (버린 건수, 메모리) + 결제 검증 상태 """
+    payments = payment_verifier.stats() if payment_verifier is not None else None
+    return {**view_log.stats(), "dedup": view_dedup.stats(), "payments": payments}
+
+
+def records_response(query: AccessLogQuery, cursor: Optional[str], limit: int, format: str):
+    """기간 조회 결과 한 페이지(JSON) 또는 커서부터 끝까지 NDJSON 스트림"""
+    try:
+        if format == "ndjson":
+            records = query.iter_records(cursor, min(limit, RECORDS_STREAM_BATCH))
+            first = next(records, None)  # 응답 시작 전에 빈 결과 / 잘못된 커서 확인
+            if first is None and not cursor:
+                raise HTTPException(status_code=404, detail="No records found.")
+            lines = (json.dumps(record) + "\n" for record in itertools.chain([first] if first is not None else [], records))
+            return StreamingResponse(lines, media_type="application/x-ndjson")
+
+        result, next_cursor = query.page(cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except sqlite3.Error as e:
-        raise HTTPException(status_code=500, detail=f"DB 저장 오류: {str(e)}")
-    finally:
-        conn.close()
+        raise HTTPException(status_code=500, detail=f"DB 조회 오류: {str(e)}")
 
-    return {"message": "접속 기록 저장 완료", "cid": req.cid, "creator_wallet": req.creator_wallet}
+    if not result and not cursor:
+        raise HTTPException(status_code=404, detail="No records found.")
 
+    return {"records": result, "next_cursor": next_cursor}
 
-@app.get("/api/get-records/cid/{cid}")
-def get_records_cid(
-    cid: str,
-    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
-):
-    """ 특정 cid 및 blockchain_address에 대한 접속 기록을 기간 단위로 조회 """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
+@app.get("/api/earnings")
+def get_earnings(
+    cid: Optional[str] = Query(None),
+    provider_wallet: Optional[str] = Query(None),
+    creator_wallet: Optional[str] = Query(None),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD, UTC)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD, UTC)"),
+    group_by: List[str] = Query([], description=f"묶음 기준 (여러 번 지정 가능): {', '.join(EARNINGS_DIMENSIONS)}"),
+):
+    """ 일별 집계 테이블에서 조회 수 / 총액 / 크리에이터 몫 / 제공자 몫 합계 조회 (원본 접속 기록을 읽지 않음) """
+    filters = {"cid": cid, "provider_wallet": provider_wallet, "creator_wallet": creator_wallet}
     try:
-        query = """
-            SELECT cid, blockchain_address, provider_wallet, creator_wallet, price, timestamp
-            FROM streaming_access_logs
-            WHERE cid = ?
-        """
-        params = [cid]
-
-        # 기간 필터링 추가
-        if start_date:
-            query += " AND timestamp >= ?"
-            params.append(start_date + " 00:00:00")  # 날짜 기준 00:00:00부터
-        if end_date:
-            query += " AND timestamp <= ?"
-            params.append(end_date + " 23:59:59")  # 날짜 기준 23:59:59까지
-
-        query += " ORDER BY timestamp DESC"  # 최신 데이터부터 정렬
-
-        cursor.execute(query, tuple(params))
-        records = cursor.fetchall()
-
-        if not records:
-            raise HTTPException(status_code=404, detail="No records found.")
-
-        # 데이터 형식 변환 (리스트 형태로 반환)
-        result = [
-            {"cid": r[0], "blockchain_address": r[1], "provider_wallet": r[2], "creator_wallet": r[3], "price": r[4], "timestamp": r[5]}
-            for r in records
-        ]
+        rows = earnings.query(filters, start_date, end_date, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"DB 조회 오류: {str(e)}")
-    finally:
-        conn.close()
 
-    return {"records": result}
+    return {"earnings": rows}
 
 
+@app.get("/api/get-records/cid/{cid}")
+def get_records_cid(
+    cid: str,
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    cursor: Optional[str] = Query(None, description="이전 응답의 next_cursor"),
+    limit: int = Query(RECORDS_PAGE_SIZE, ge=1, le=RECORDS_MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson: 커서부터 끝까지 한 줄에 한 건씩 스트리밍"),
+):
+    """ 특정 cid 에 대한 접속 기록을 기간 단위로 조회 (최신순, 커서 페이지네이션) """
+    return records_response(AccessLogQuery(db, "cid", cid, start_date, end_date), cursor, limit, format)
+
 
 @app.get("/api/get-records/provider/{provider_wallet}")
 def get_records_provider(
     provider_wallet: str,
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    cursor: Optional[str] = Query(None, description="이전 응답의 next_cursor"),
+    limit: int = Query(RECORDS_PAGE_SIZE, ge=1, le=RECORDS_MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson: 커서부터 끝까지 한 줄에 한 건씩 스트리밍"),
 ):
-    """ 특정 cid 및 blockchain_address에 대한 접속 기록을 기간 단위로 조회 """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    try:
-        query = """
-            SELECT cid, blockchain_address, provider_wallet, creator_wallet, price, timestamp
-            FROM streaming_access_logs
-            WHERE provider_wallet = ?
-        """
-        params = [provider_wallet]
-
-        # 기간 필터링 추가
-        if start_date:
-            query += " AND timestamp >= ?"
-            params.append(start_date + " 00:00:00")  # 날짜 기준 00:00:00부터
-        if end_date:
-            query += " AND timestamp <= ?"
-            params.append(end_date + " 23:59:59")  # 날짜 기준 23:59:59까지
-
-        query += " ORDER BY timestamp DESC"  # 최신 데이터부터 정렬
-
-        cursor.execute(query, tuple(params))
-        records = cursor.fetchall()
-
-        if not records:
-            raise HTTPException(status_code=404, detail="No records found.")
-
-        # 데이터 형식 변환 (리스트 형태로 반환)
-        result = [
-            {"cid": r[0], "blockchain_address": r[1], "provider_wallet": r[2], "creator_wallet": r[3], "price": r[4], "timestamp": r[5]}
-            for r in records
-        ]
-    except sqlite3.Error as e:
-        raise HTTPException(status_code=500, detail=f"DB 조회 오류: {str(e)}")
-    finally:
-        conn.close()
-
-    return {"records": result}
+    """ 특정 provider_wallet 에 대한 접속 기록을 기간 단위로 조회 (최신순, 커서 페이지네이션) """
+    return records_response(AccessLogQuery(db, "provider_wallet", provider_wallet, start_date, end_date), cursor, limit, format)
 
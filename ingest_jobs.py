@@ -0,0 +1,209 @@
+import os
+import time
+import uuid
+import shlex
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from fastapi import HTTPException
+
+from metrics import observe
+
+# 외부 CLI 경로 (테스트에서는 fake_cli.py 로 대체 가능)
+IPFS_BIN = shlex.split(os.getenv("IPFS_BIN", "ipfs"))
+ETHFS_BIN = shlex.split(os.getenv("ETHFS_BIN", "ethfs-cli"))
+
+# 작업 큐 설정
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))  # 동시에 실행할 CLI 작업 수
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100"))  # 대기열 최대 길이
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "2"))  # CLI 실패 시 재시도 횟수
+INGEST_RETRY_BACKOFF = float(os.getenv("INGEST_RETRY_BACKOFF", "2.0"))  # 재시도 대기 (지수 백오프 기준, 초)
+INGEST_COMMAND_TIMEOUT = float(os.getenv("INGEST_COMMAND_TIMEOUT", "3600"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "1000"))  # 보관할 완료 작업 수
+
+
+class CommandError(Exception):
+    """외부 CLI 실행 실패 (재시도 대상)"""
+
+    def __init__(self, args: List[str], returncode: Optional[int], stdout: str = "", stderr: str = ""):
+        super().__init__(f"{args[0]} exited with {returncode}: {stderr.strip()}")
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+def command_label(args: List[str]) -> str:
+    """CLI 호출 → 메트릭 라벨 (예: "ipfs add", "ethfs-cli upload"), 인자 값 (파일 경로, 키) 은 제외"""
+    for binary in (IPFS_BIN, ETHFS_BIN):
+        if args[:len(binary)] == binary and len(args) > len(binary):
+            return f"{os.path.basename(binary[-1])} {args[len(binary)]}"
+    return os.path.basename(args[0])
+
+
+async def run_command(args: List[str], timeout: float = INGEST_COMMAND_TIMEOUT) -> str:
+    """이벤트 루프를 막지 않고 CLI 실행 후 stdout 반환"""
+    with observe("subprocess", command_label(args)):
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise CommandError(args, None, stderr="timed out")
+
+        if process.returncode != 0:
+            raise CommandError(args, process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace"))
+    return stdout.decode()
+
+
+class Job:
+    """백그라운드 수집 작업 상태"""
+
+    def __init__(self, kind: str, handler: Callable[["Job"], Awaitable[Any]], steps: Sequence[str] = ()):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.handler = handler
+        self.status = "queued"  # queued → running → succeeded / failed
+        self.stage = "queued"
+        self.attempts = 0
+        self.progress = {step: 0.0 for step in steps}  # 단계별 진행률 (0.0 ~ 1.0)
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+        self.updated_at = time.time()
+
+    def complete(self, step: str):
+        """단계 완료 (진행률 1.0)"""
+        self.progress[step] = 1.0
+        self.updated_at = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "attempts": self.attempts,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobQueue:
+    """크기 제한 대기열 + 고정 수의 워커로 CLI 작업을 비동기 실행"""
+
+    def __init__(
+        self,
+        workers: int = INGEST_WORKERS,
+        maxsize: int = INGEST_QUEUE_SIZE,
+        max_retries: int = INGEST_MAX_RETRIES,
+        retry_backoff: float = INGEST_RETRY_BACKOFF,
+        history: int = INGEST_JOB_HISTORY,
+    ):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.history = history
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        return self._queue
+
+    def submit(self, kind: str, handler: Callable[[Job], Awaitable[Any]], steps: Sequence[str] = ()) -> Job:
+        """작업 등록 (대기열이 가득 차면 503, steps: progress 에 표시할 단계 순서)"""
+        job = Job(kind, handler, steps)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="Ingestion queue is full, retry later.")
+        self.jobs[job.job_id] = job
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """작업 조회"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        counts = {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    def _prune(self):
+        # 완료된 작업만 오래된 순으로 정리
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ("succeeded", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    async def start(self):
+        if not self._tasks:
+            # 현재 이벤트 루프에서 새 큐를 만들고 시작 전에 등록된 작업은 옮겨 담음
+            pending = []
+            while self._queue is not None and not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            for job in pending:
+                self._queue.put_nowait(job)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self):
+        await self.queue.join()
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        while True:
+            job.attempts += 1
+            try:
+                job.result = await job.handler(job)
+                job.status = "succeeded"
+                job.set_stage("done")
+                return
+            except CommandError as e:
+                # CLI 실패는 지수 백오프로 재시도
+                if job.attempts > self.max_retries:
+                    job.error = str(e)
+                    break
+                job.set_stage(f"retrying ({job.stage})")
+                await asyncio.sleep(self.retry_backoff * 2 ** (job.attempts - 1))
+            except HTTPException as e:
+                job.error = e.detail
+                break
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+                break
+        job.status = "failed"
+        job.set_stage("failed")
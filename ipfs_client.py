@@ -0,0 +1,128 @@
+import os
+import json
+import uuid
+from typing import AsyncIterator, List, Optional
+
+import httpx
+
+from metrics import UPLOAD_BYTES, observe
+
+# Kubo(go-ipfs) HTTP API 설정 (IPFS_API_URL 이 없으면 CLI 사용)
+IPFS_API_URL = os.getenv("IPFS_API_URL", "")  # 예: http://127.0.0.1:5001
+IPFS_CHUNKER = os.getenv("IPFS_CHUNKER", "size-262144")  # 예: size-1048576, rabin-262144-524288-1048576
+IPFS_RAW_LEAVES = os.getenv("IPFS_RAW_LEAVES", "true").lower() == "true"
+IPFS_CID_VERSION = os.getenv("IPFS_CID_VERSION", "")  # 비워두면 데몬 기본값
+IPFS_MAX_CONNECTIONS = int(os.getenv("IPFS_MAX_CONNECTIONS", "10"))
+IPFS_TIMEOUT = float(os.getenv("IPFS_TIMEOUT", "3600"))
+
+# 한 번에 읽어 보낼 크기
+IPFS_STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class IPFSError(Exception):
+    """IPFS HTTP API 오류"""
+
+
+def ipfs_add_args(chunker: str = IPFS_CHUNKER, raw_leaves: bool = IPFS_RAW_LEAVES, cid_version: str = IPFS_CID_VERSION) -> List[str]:
+    """CLI 대체 경로의 `ipfs add` 옵션 (HTTP API 와 같은 chunker / raw-leaves / cid-version 으로 같은 CID 생성)"""
+    args = [f"--chunker={chunker}", f"--raw-leaves={str(raw_leaves).lower()}"]
+    if cid_version:
+        args.append(f"--cid-version={cid_version}")
+    return args
+
+
+async def iter_file(path: str, chunk_size: int = IPFS_STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield chunk
+
+
+class IPFSClient:
+    """커넥션 풀을 공유하는 Kubo `/api/v0/add` 비동기 클라이언트"""
+
+    def __init__(
+        self,
+        base_url: str = IPFS_API_URL,
+        chunker: str = IPFS_CHUNKER,
+        raw_leaves: bool = IPFS_RAW_LEAVES,
+        cid_version: str = IPFS_CID_VERSION,
+        max_connections: int = IPFS_MAX_CONNECTIONS,
+        timeout: float = IPFS_TIMEOUT,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.chunker = chunker
+        self.raw_leaves = raw_leaves
+        self.cid_version = cid_version
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # 이벤트 루프 안에서 처음 사용할 때 생성
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _params(self) -> dict:
+        params = {
+            "chunker": self.chunker,
+            "raw-leaves": str(self.raw_leaves).lower(),
+            "pin": "true",
+            "progress": "false",
+        }
+        if self.cid_version:
+            params["cid-version"] = self.cid_version
+        return params
+
+    async def add_stream(self, chunks: AsyncIterator[bytes], filename: str) -> dict:
+        """바이트 스트림을 multipart 본문으로 그대로 전송하고 추가된 루트 항목({Name, Hash, Size}) 반환"""
+        boundary = uuid.uuid4().hex
+        quoted_name = filename.replace('"', "%22")
+        uploaded = UPLOAD_BYTES.labels("ipfs")
+
+        async def body():
+            yield (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="file"; filename="{quoted_name}"\r\n'
+                "Content-Type: application/octet-stream\r\n\r\n"
+            ).encode()
+            async for chunk in chunks:
+                uploaded.inc(len(chunk))
+                yield chunk
+            yield f"\r\n--{boundary}--\r\n".encode()
+
+        with observe("ipfs_http", "add"):
+            response = await self.client.post(
+                "/api/v0/add",
+                params=self._params(),
+                content=body(),
+                headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            )
+        if response.status_code != 200:
+            try:
+                message = response.json().get("Message", response.text)
+            except ValueError:
+                message = response.text
+            raise IPFSError(f"ipfs add failed ({response.status_code}): {message}")
+
+        # 응답은 항목별 NDJSON, 마지막 줄이 루트
+        entries = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+        entries = [entry for entry in entries if "Hash" in entry]
+        if not entries:
+            raise IPFSError("ipfs add returned no CID")
+        return entries[-1]
+
+    async def add_file(self, path: str) -> str:
+        """로컬 파일을 추가하고 CID 반환"""
+        entry = await self.add_stream(iter_file(path), os.path.basename(path))
+        return entry["Hash"]
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import anyio
+import redis.asyncio as redis
+
+logger = logging.getLogger("gateway")
+
+# 1차: 프로세스 내 LRU (짧은 TTL, 다른 워커의 변경은 Redis pub/sub 로 즉시 무효화), 2차: Redis (워커 간 공유)
+METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", "10000"))
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", "30"))
+METADATA_REDIS_TTL = int(os.getenv("METADATA_REDIS_TTL", "300"))
+
+METADATA_CACHE_PREFIX = "content_metadata_cache"
+METADATA_INVALIDATE_CHANNEL = "content_metadata_invalidate"
+ALL_METADATA = "all"
+
+# (ETag, 직렬화된 JSON 본문) - 응답마다 다시 직렬화하지 않음
+Entry = Tuple[str, str]
+
+
+def metadata_key(cid: str) -> str:
+    return f"cid:{cid}"
+
+
+def redis_key(key: str) -> str:
+    return f"{METADATA_CACHE_PREFIX}:{key}"
+
+
+def generation_key(key: str) -> str:
+    """무효화마다 증가하는 키별 공유 세대 (워커 간 비교용)"""
+    return f"{METADATA_CACHE_PREFIX}:generation:{key}"
+
+
+def make_entry(value: Any) -> Entry:
+    body = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return f'"{hashlib.sha1(body.encode()).hexdigest()[:20]}"', body
+
+
+class LocalTTLCache:
+    """TTL 이 있는 LRU (스레드 안전)"""
+
+    def __init__(self, max_entries: int = METADATA_CACHE_SIZE, ttl: float = METADATA_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Entry]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Entry):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MetadataCache:
+    """content_metadata read-through 캐시 (로컬 LRU → Redis → DB), 쓰기 시 invalidate() 로 모든 워커에서 제거"""
+
+    def __init__(self, client: redis.Redis, local: Optional[LocalTTLCache] = None, redis_ttl: int = METADATA_REDIS_TTL):
+        self.client = client
+        self.local = local or LocalTTLCache()
+        self.redis_ttl = redis_ttl
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self.redis_errors = 0
+        self.stale_writes = 0
+        self._generation = 0  # 로드 중에 무효화되면 결과를 캐시에 넣지 않음
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    async def _from_redis(self, key: str) -> Optional[Entry]:
+        try:
+            fields = await self.client.hgetall(redis_key(key))
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("metadata cache redis read failed: %s", e)
+            return None
+        if not fields:
+            return None
+        return fields["etag"], fields["body"]
+
+    async def _shared_generation(self, key: str) -> Optional[str]:
+        try:
+            return await self.client.get(generation_key(key)) or "0"
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("metadata cache redis read failed: %s", e)
+            return None
+
+    async def _to_redis(self, key: str, entry: Entry, generation: Optional[str]) -> bool:
+        """로드 시작 시점의 공유 세대가 그대로일 때만 기록 (WATCH), 그 사이 다른 워커가 무효화했으면 False
+        (Redis 오류 시에는 로컬 캐시만 사용)"""
+        if generation is None:
+            return True
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                await pipe.watch(generation_key(key))
+                if (await pipe.get(generation_key(key)) or "0") != generation:
+                    raise redis.WatchError(generation_key(key))
+                pipe.multi()
+                pipe.hset(redis_key(key), mapping={"etag": entry[0], "body": entry[1]})
+                pipe.expire(redis_key(key), self.redis_ttl)
+                await pipe.execute()
+        except redis.WatchError:
+            self.stale_writes += 1
+            return False
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("metadata cache redis write failed: %s", e)
+        return True
+
+    async def _load(self, key: str, loader: Callable[[], Any]) -> Optional[Entry]:
+        entry = await self._from_redis(key)
+        if entry is not None:
+            self.redis_hits += 1
+            self.local.set(key, entry)
+            return entry
+
+        self.misses += 1
+        generation = self._generation
+        shared_generation = await self._shared_generation(key)
+        value = await anyio.to_thread.run_sync(loader)
+        if value is None:
+            return None
+        entry = make_entry(value)
+        # pub/sub 메시지보다 Redis 의 공유 세대가 먼저 바뀌므로 두 가지 모두 확인
+        stored = generation == self._generation and await self._to_redis(key, entry, shared_generation)
+        if stored and generation == self._generation:  # 기록하는 사이 로컬 무효화가 들어왔을 수도 있음
+            self.local.set(key, entry)
+        return entry
+
+    async def get(self, key: str, loader: Callable[[], Any]) -> Optional[Entry]:
+        """(ETag, JSON 본문) 조회, 없으면 loader(동기, 스레드에서 실행) 결과를 캐시 (None 이면 캐시하지 않음)"""
+        entry = self.local.get(key)
+        if entry is not None:
+            self.local_hits += 1
+            return entry
+
+        # 같은 키를 동시에 요청하면 한 번만 로드
+        loading = self._loading.get(key)
+        if loading is not None:
+            return await asyncio.shield(loading)
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            entry = await self._load(key, loader)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 기다리는 요청이 없어도 경고가 남지 않도록
+            raise
+        finally:
+            del self._loading[key]
+
+    def count_not_modified(self):
+        self.not_modified += 1
+
+    async def invalidate(self, cid: str):
+        """cid 메타데이터와 전체 목록 무효화 (로컬 + Redis + 다른 워커)"""
+        keys = (metadata_key(cid), ALL_METADATA)
+        self._generation += 1
+        self.invalidations += 1
+        self.local.delete(*keys)
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.delete(*(redis_key(key) for key in keys))
+                for key in keys:
+                    # 진행 중인 다른 워커의 로드가 오래된 값을 기록하지 못하도록 (항목보다 오래 유지)
+                    pipe.incr(generation_key(key))
+                    pipe.expire(generation_key(key), self.redis_ttl * 2)
+                pipe.publish(METADATA_INVALIDATE_CHANNEL, cid)
+                await pipe.execute()
+        except redis.RedisError as e:
+            # Redis 항목은 METADATA_REDIS_TTL 이 지나면 만료
+            self.redis_errors += 1
+            logger.warning("metadata cache invalidation failed for %s: %s", cid, e)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    await pubsub.subscribe(METADATA_INVALIDATE_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._generation += 1
+                            self.local.delete(metadata_key(message["data"]), ALL_METADATA)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("metadata invalidation listener failed: %s", e)
+                await asyncio.sleep(1)
+
+    def start(self):
+        """다른 워커의 무효화 메시지 구독"""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None and not self._listener.done():
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        self._listener = None
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "redis_errors": self.redis_errors,
+            "stale_writes": self.stale_writes,
+            "local_entries": len(self.local),
+        }
@@ -0,0 +1,85 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from starlette.routing import Match
+
+# uvicorn 워커가 여러 개면 PROMETHEUS_MULTIPROC_DIR (빈 디렉토리) 를 지정 → /metrics 가 모든 워커 값을 합산
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+
+# Redis / SQLite 는 ms 이하, CLI (ipfs add, ethfs-cli, ffmpeg) 는 수 분까지
+DEPENDENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+HTTP_REQUESTS = Counter("gateway_http_requests_total", "HTTP 요청 수", ["method", "route", "status"])
+HTTP_LATENCY = Histogram("gateway_http_request_duration_seconds", "HTTP 요청 처리 시간 (응답 본문 전송 완료까지)", ["method", "route"])
+HTTP_IN_PROGRESS = Gauge("gateway_http_requests_in_progress", "처리 중인 HTTP 요청 수", ["method", "route"], multiprocess_mode="livesum")
+DEPENDENCY_LATENCY = Histogram(
+    "gateway_dependency_duration_seconds", "의존성 호출 시간 (redis / sqlite / subprocess / ipfs_http)",
+    ["dependency", "operation"], buckets=DEPENDENCY_BUCKETS,
+)
+DEPENDENCY_ERRORS = Counter("gateway_dependency_errors_total", "실패한 의존성 호출 수", ["dependency", "operation"])
+UPLOAD_BYTES = Counter("gateway_upload_bytes_total", "업로드 바이트 (upload / resumable: 클라이언트에서 받음, ipfs / ethfs: 저장소로 보냄)", ["kind"])
+
+
+@contextmanager
+def observe(dependency: str, operation: str):
+    """with 블록 실행 시간을 의존성 호출 시간으로 기록 (예외면 실패 수도 증가, 동기 / 비동기 코드 모두 사용 가능)"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DEPENDENCY_ERRORS.labels(dependency, operation).inc()
+        raise
+    finally:
+        DEPENDENCY_LATENCY.labels(dependency, operation).observe(time.perf_counter() - start)
+
+
+def route_label(scope: dict) -> str:
+    """요청 경로 → 라우트 경로 템플릿 (예: /meta/get_metadata/{cid}), 없는 경로는 모두 unmatched (라벨 수 제한)"""
+    router = getattr(scope.get("app"), "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """라우트별 요청 수 / 처리 시간 / 처리 중 요청 수 (ASGI 미들웨어, 스트리밍 응답은 본문 전송이 끝날 때까지 측정)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope["method"], route_label(scope)
+        status = 500  # 응답을 시작하기 전에 예외로 끝나면 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+
+
+def render_metrics() -> bytes:
+    """Prometheus text 형식 (CONTENT_TYPE_LATEST)"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
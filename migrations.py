@@ -0,0 +1,203 @@
+import sqlite3
+import logging
+from typing import Callable, List
+
+from db import Database, to_epoch
+
+logger = logging.getLogger("gateway")
+
+
+def create_base_tables(conn: sqlite3.Connection):
+    """1: 접속 기록 / 콘텐츠 메타데이터 테이블 (기존 DB 에 빠져 있던 provider_wallet, price 컬럼 추가)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS streaming_access_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cid TEXT,
+            blockchain_address TEXT,
+            provider_wallet TEXT,
+            creator_wallet TEXT,
+            price REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(streaming_access_logs)")}
+    for column, column_type in (("provider_wallet", "TEXT"), ("price", "REAL")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE streaming_access_logs ADD COLUMN {column} {column_type}")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS content_metadata (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cid TEXT UNIQUE,
+            video_name TEXT,
+            content_creator_wallet TEXT,
+            creator_share INTEGER,
+            provider_share INTEGER,
+            price REAL
+        )
+    """)
+
+
+def access_log_epoch_timestamps(conn: sqlite3.Connection):
+    """2: 접속 기록 timestamp 를 문자열 → 정수 epoch(UTC 초) 로 변환 (테이블 재생성, 해석할 수 없는 값은 원래 값 그대로 유지)"""
+    def convert(value):
+        epoch = to_epoch(value)
+        return value if epoch is None else epoch
+
+    conn.create_function("to_epoch", 1, convert, deterministic=True)
+    conn.execute("""
+        CREATE TABLE streaming_access_logs_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cid TEXT,
+            blockchain_address TEXT,
+            provider_wallet TEXT,
+            creator_wallet TEXT,
+            price REAL,
+            timestamp INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        )
+    """)
+    conn.execute("""
+        INSERT INTO streaming_access_logs_new (id, cid, blockchain_address, provider_wallet, creator_wallet, price, timestamp)
+        SELECT id, cid, blockchain_address, provider_wallet, creator_wallet, CAST(price AS REAL), to_epoch(timestamp)
+        FROM streaming_access_logs
+    """)
+    conn.execute("DROP TABLE streaming_access_logs")
+    conn.execute("ALTER TABLE streaming_access_logs_new RENAME TO streaming_access_logs")
+    unconverted = conn.execute(
+        "SELECT COUNT(*) FROM streaming_access_logs WHERE typeof(timestamp) NOT IN ('integer', 'null')"
+    ).fetchone()[0]
+    if unconverted:
+        logger.warning("%d access log timestamps could not be parsed and were kept as-is", unconverted)
+
+
+def access_log_range_indexes(conn: sqlite3.Connection):
+    """3: cid / provider_wallet + 기간 조회용 복합 인덱스"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_cid_timestamp ON streaming_access_logs (cid, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_provider_timestamp ON streaming_access_logs (provider_wallet, timestamp)")
+
+
+def earnings_rollup_tables(conn: sqlite3.Connection):
+    """4: cid / 제공자 / 크리에이터 / 일(UTC) 단위 수익 집계 + 집계 진행 위치(high-water mark)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS earnings_daily (
+            cid TEXT NOT NULL,
+            day TEXT NOT NULL,
+            provider_wallet TEXT NOT NULL DEFAULT '',
+            creator_wallet TEXT NOT NULL DEFAULT '',
+            views INTEGER NOT NULL DEFAULT 0,
+            gross REAL NOT NULL DEFAULT 0,
+            creator_amount REAL NOT NULL DEFAULT 0,
+            provider_amount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (cid, day, provider_wallet, creator_wallet)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_earnings_provider_day ON earnings_daily (provider_wallet, day)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_earnings_creator_day ON earnings_daily (creator_wallet, day)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def content_metadata_search(conn: sqlite3.Connection):
+    """5: video_name 전문 검색(FTS5, content_metadata 를 원본으로 쓰는 external content 테이블) + 크리에이터별 조회 인덱스"""
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS content_metadata_fts USING fts5(
+            video_name,
+            content='content_metadata',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    # content_metadata 변경 시 색인 동기화
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS content_metadata_fts_insert AFTER INSERT ON content_metadata BEGIN
+            INSERT INTO content_metadata_fts (rowid, video_name) VALUES (new.id, new.video_name);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS content_metadata_fts_delete AFTER DELETE ON content_metadata BEGIN
+            INSERT INTO content_metadata_fts (content_metadata_fts, rowid, video_name) VALUES ('delete', old.id, old.video_name);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS content_metadata_fts_update AFTER UPDATE OF video_name ON content_metadata BEGIN
+            INSERT INTO content_metadata_fts (content_metadata_fts, rowid, video_name) VALUES ('delete', old.id, old.video_name);
+            INSERT INTO content_metadata_fts (rowid, video_name) VALUES (new.id, new.video_name);
+        END
+    """)
+    conn.execute("INSERT INTO content_metadata_fts (content_metadata_fts) VALUES ('rebuild')")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_content_metadata_creator ON content_metadata (content_creator_wallet, id)")
+
+
+def access_log_payment_verification(conn: sqlite3.Connection):
+    """6: 시청 결제 트랜잭션 해시 + 검증 결과 (verified: NULL 미검증, 1 확인, 0 거부) + 검증 대기 / 트랜잭션별 조회 인덱스"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(streaming_access_logs)")}
+    for column, column_type in (("tx_hash", "TEXT"), ("verified", "INTEGER"), ("verified_at", "INTEGER"), ("verify_error", "TEXT")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE streaming_access_logs ADD COLUMN {column} {column_type}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_tx_hash ON streaming_access_logs (tx_hash) WHERE tx_hash IS NOT NULL")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_access_logs_unverified ON streaming_access_logs (id) "
+        "WHERE tx_hash IS NOT NULL AND verified IS NULL"
+    )
+
+
+def earnings_integer_wei(conn: sqlite3.Connection):
+    """7: earnings_daily 금액 REAL(이더) → wei 정수 문자열 (float 합계 오차 제거, 기존 값은 그대로 wei 로 변환)"""
+    conn.execute("""
+        CREATE TABLE earnings_daily_new (
+            cid TEXT NOT NULL,
+            day TEXT NOT NULL,
+            provider_wallet TEXT NOT NULL DEFAULT '',
+            creator_wallet TEXT NOT NULL DEFAULT '',
+            views INTEGER NOT NULL DEFAULT 0,
+            gross_wei TEXT NOT NULL DEFAULT '0',
+            creator_wei TEXT NOT NULL DEFAULT '0',
+            provider_wei TEXT NOT NULL DEFAULT '0',
+            PRIMARY KEY (cid, day, provider_wallet, creator_wallet)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO earnings_daily_new (cid, day, provider_wallet, creator_wallet, views, gross_wei, creator_wei, provider_wei)
+        SELECT cid, day, provider_wallet, creator_wallet, views, to_wei(gross), to_wei(creator_amount), to_wei(provider_amount)
+        FROM earnings_daily
+    """)
+    conn.execute("DROP TABLE earnings_daily")
+    conn.execute("ALTER TABLE earnings_daily_new RENAME TO earnings_daily")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_earnings_provider_day ON earnings_daily (provider_wallet, day)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_earnings_creator_day ON earnings_daily (creator_wallet, day)")
+
+
+# 순서대로 적용, 적용된 개수를 PRAGMA user_version 에 기록 (항목 추가만 가능, 기존 항목 수정/삭제 금지)
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    create_base_tables,
+    access_log_epoch_timestamps,
+    access_log_range_indexes,
+    earnings_rollup_tables,
+    content_metadata_search,
+    access_log_payment_verification,
+    earnings_integer_wei,
+]
+
+
+def schema_version(db: Database) -> int:
+    return db.fetchone("PRAGMA user_version")[0]
+
+
+def migrate(db: Database) -> int:
+    """적용되지 않은 마이그레이션을 하나씩 별도 트랜잭션으로 적용 (최종 버전 반환)"""
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        def apply(conn: sqlite3.Connection) -> bool:
+            # 다른 프로세스가 먼저 적용했을 수 있으므로 쓰기 잠금을 잡은 뒤 다시 확인
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                return False
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            return True
+
+        if db.write(apply):
+            logger.info("applied migration %d: %s", version, migration.__name__)
+    return schema_version(db)
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from web3 import Web3
+
+from db import Database, price_to_wei
+
+logger = logging.getLogger("gateway")
+
+# 시청 결제 검증: 검증 대기 기록을 모아 트랜잭션 / receipt 를 JSON-RPC batch 요청 한 번으로 조회
+PAYMENT_RECEIVER_ADDRESS = os.getenv("PAYMENT_RECEIVER_ADDRESS", "")  # 시청 결제를 받는 지갑 (비어 있으면 검증하지 않음)
+PAYMENT_VERIFY_BATCH = int(os.getenv("PAYMENT_VERIFY_BATCH", "200"))  # 한 번에 검증하는 기록 수 (RPC 호출 ≤ 트랜잭션 수 × 2 + 1)
+PAYMENT_VERIFY_INTERVAL = float(os.getenv("PAYMENT_VERIFY_INTERVAL", "5"))
+PAYMENT_MIN_CONFIRMATIONS = int(os.getenv("PAYMENT_MIN_CONFIRMATIONS", "3"))
+PAYMENT_VERIFY_MAX_AGE = int(os.getenv("PAYMENT_VERIFY_MAX_AGE", "86400"))  # 이 시간(초)이 지나도 트랜잭션이 블록에 없으면 거부
+PAYMENT_CACHE_SIZE = int(os.getenv("PAYMENT_CACHE_SIZE", "100000"))
+
+
+@dataclass
+class Payment:
+    sender: str
+    to: str
+    value: int
+    block_number: int
+    success: bool
+
+
+def quantity(value: Any) -> Optional[int]:
+    """JSON-RPC 수량 (16진 문자열) → int (이미 int 로 바꿔 주는 provider 도 허용)"""
+    if value is None:
+        return None
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def rpc_batch(web3: Web3, calls: Sequence[Tuple[str, list]]) -> List[Any]:
+    """여러 JSON-RPC 호출을 요청 하나로 보내고 결과를 호출 순서대로 반환 (개별 오류는 None)
+
+    web3 의 batch_requests() 는 결과가 null 인 항목 (아직 없는 트랜잭션) 이 하나라도 있으면 전체가 예외가 되므로
+    provider 의 make_batch_request 를 직접 사용, batch 를 지원하지 않는 provider 는 하나씩 호출
+    """
+    provider = web3.provider
+    if hasattr(provider, "make_batch_request"):
+        responses = provider.make_batch_request(list(calls))
+        if not isinstance(responses, list):
+            raise RuntimeError(f"JSON-RPC batch rejected: {responses.get('error')}")
+    else:
+        responses = [provider.make_request(method, params) for method, params in calls]
+
+    results = []
+    for (method, params), response in zip(calls, responses):
+        if "error" in response:
+            logger.warning("JSON-RPC %s%s failed: %s", method, params, response["error"])
+            results.append(None)
+        else:
+            results.append(response.get("result"))
+    return results
+
+
+class PaymentVerifier:
+    """접속 기록의 결제 트랜잭션 검증 (백그라운드 스레드)
+
+    tx_hash 가 있고 아직 검증되지 않은 기록을 batch_size 개씩 모아 트랜잭션 / receipt 를 한 번의 RPC 왕복으로 조회,
+    보낸 지갑 = blockchain_address, 받는 지갑 = receiver, 성공, min_confirmations 이상이고 금액이 충분하면 verified = 1.
+    한 트랜잭션을 여러 기록에 쓰면 기록 금액의 합이 송금액을 넘지 않는 기록까지만 인정.
+    확인된 기록은 같은 트랜잭션에서 after_verify (예: 수익 집계에 더하기) 실행
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        web3: Web3,
+        receiver: str,
+        batch_size: int = PAYMENT_VERIFY_BATCH,
+        interval: float = PAYMENT_VERIFY_INTERVAL,
+        min_confirmations: int = PAYMENT_MIN_CONFIRMATIONS,
+        max_age: int = PAYMENT_VERIFY_MAX_AGE,
+        cache_size: int = PAYMENT_CACHE_SIZE,
+        after_verify: Optional[Callable[[sqlite3.Connection, List[int]], Any]] = None,
+    ):
+        self.db = db
+        self.web3 = web3
+        self.receiver = receiver.lower()
+        self.batch_size = batch_size
+        self.interval = interval
+        self.min_confirmations = min_confirmations
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self.after_verify = after_verify
+        self.verified = 0
+        self.rejected = 0
+        self.round_trips = 0
+        self.rpc_calls = 0
+        self.cache_hits = 0
+        self.failures = 0
+        # 확정된 (min_confirmations 이상) 트랜잭션만 캐시 - 같은 트랜잭션을 쓰는 다음 기록은 RPC 없이 판단
+        self._cache: "OrderedDict[str, Payment]" = OrderedDict()
+        self._latest = 0
+        self._after = 0  # 마지막으로 본 id (판단을 미룬 기록이 앞을 막지 않도록 끝까지 간 뒤 처음부터 다시)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _pending(self) -> List[tuple]:
+        rows = self.db.fetchall(
+            """
+            SELECT id, blockchain_address, price, timestamp, tx_hash FROM streaming_access_logs
+            WHERE tx_hash IS NOT NULL AND verified IS NULL AND id > ?
+            ORDER BY id LIMIT ?
+            """,
+            (self._after, self.batch_size),
+        )
+        self._after = rows[-1][0] if len(rows) == self.batch_size else 0
+        return rows
+
+    def _confirmed(self, payment: Payment, latest: int) -> bool:
+        return latest - payment.block_number + 1 >= self.min_confirmations
+
+    def _fetch(self, tx_hashes: List[str]) -> Tuple[int, Dict[str, Optional[Payment]]]:
+        """(최신 블록 번호, 트랜잭션 해시 → 결제 (아직 블록에 없으면 None)) - 캐시에 없는 트랜잭션만 batch 한 번으로 조회"""
+        payments: Dict[str, Optional[Payment]] = {}
+        missing = []
+        for tx_hash in tx_hashes:
+            if tx_hash in self._cache:
+                self._cache.move_to_end(tx_hash)
+                payments[tx_hash] = self._cache[tx_hash]
+                self.cache_hits += 1
+            else:
+                missing.append(tx_hash)
+
+        if not missing:
+            # 캐시된 트랜잭션은 이미 확정 (블록 번호는 줄지 않으므로 마지막으로 본 값 사용)
+            return self._latest, payments
+
+        calls = [("eth_blockNumber", [])]
+        for tx_hash in missing:
+            calls.append(("eth_getTransactionByHash", [tx_hash]))
+            calls.append(("eth_getTransactionReceipt", [tx_hash]))
+        results = rpc_batch(self.web3, calls)
+        self.round_trips += 1
+        self.rpc_calls += len(calls)
+
+        latest = self._latest = max(self._latest, quantity(results[0]) or 0)
+        for index, tx_hash in enumerate(missing):
+            tx, receipt = results[1 + 2 * index], results[2 + 2 * index]
+            if not tx or not receipt or receipt.get("blockNumber") is None:
+                payments[tx_hash] = None
+                continue
+            payment = Payment(
+                sender=tx["from"].lower(),
+                to=(tx.get("to") or "").lower(),
+                value=quantity(tx["value"]),
+                block_number=quantity(receipt["blockNumber"]),
+                success=quantity(receipt["status"]) == 1,
+            )
+            payments[tx_hash] = payment
+            if self._confirmed(payment, latest):
+                self._cache[tx_hash] = payment
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return latest, payments
+
+    def _judge(self, conn: sqlite3.Connection, rows: List[tuple], latest: int, payments: Dict[str, Optional[Payment]]) -> int:
+        """확인 / 거부 표시 (쓰기 트랜잭션 안에서 실행, 아직 판단할 수 없는 기록은 그대로 둠), 판단한 기록 수 반환"""
+        # 다른 워커가 먼저 판단한 기록은 제외
+        ids = json.dumps([row[0] for row in rows])
+        pending = {row[0] for row in conn.execute(
+            "SELECT id FROM streaming_access_logs WHERE id IN (SELECT value FROM json_each(?)) AND verified IS NULL", (ids,)
+        )}
+        claims: Dict[str, List[tuple]] = {}
+        for row in rows:
+            if row[0] in pending:
+                claims.setdefault(row[4], []).append(row)
+
+        now = int(time.time())
+        verified: List[int] = []
+        rejected: List[Tuple[str, int]] = []
+        for tx_hash, tx_rows in claims.items():
+            payment = payments.get(tx_hash)
+            if payment is None:
+                rejected.extend(("transaction not found", row[0]) for row in tx_rows if now - (row[3] or 0) > self.max_age)
+                continue
+            if not self._confirmed(payment, latest):
+                continue
+            if not payment.success:
+                rejected.extend(("transaction failed", row[0]) for row in tx_rows)
+                continue
+            if payment.to != self.receiver:
+                rejected.extend(("wrong recipient", row[0]) for row in tx_rows)
+                continue
+
+            # 같은 트랜잭션으로 이미 확인된 기록의 금액까지 포함해 송금액 안에서만 인정
+            spent = sum(price_to_wei(price) for (price,) in conn.execute(
+                "SELECT price FROM streaming_access_logs WHERE tx_hash = ? AND verified = 1", (tx_hash,)
+            ))
+            for row in tx_rows:
+                price = price_to_wei(row[2])
+                if (row[1] or "").lower() != payment.sender:
+                    rejected.append(("sender mismatch", row[0]))
+                elif spent + price > payment.value:
+                    rejected.append(("insufficient payment", row[0]))
+                else:
+                    spent += price
+                    verified.append(row[0])
+
+        conn.executemany(
+            "UPDATE streaming_access_logs SET verified = 1, verified_at = ?, verify_error = NULL WHERE id = ?",
+            [(now, row_id) for row_id in verified],
+        )
+        conn.executemany(
+            "UPDATE streaming_access_logs SET verified = 0, verified_at = ?, verify_error = ? WHERE id = ?",
+            [(now, reason, row_id) for reason, row_id in rejected],
+        )
+        if verified and self.after_verify is not None:
+            self.after_verify(conn, verified)
+        self.verified += len(verified)
+        self.rejected += len(rejected)
+        return len(verified) + len(rejected)
+
+    def verify_pending(self) -> int:
+        """검증 대기 기록 한 묶음 처리 (RPC 왕복 한 번), 판단한 기록 수 반환"""
+        rows = self._pending()
+        if not rows:
+            return 0
+        latest, payments = self._fetch(list(dict.fromkeys(row[4] for row in rows)))
+        return self.db.write(lambda conn: self._judge(conn, rows, latest, payments))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.verify_pending()
+            except Exception as e:
+                # RPC / DB 오류: 기록은 그대로 두고 다음 주기에 재시도
+                self.failures += 1
+                self._after = 0
+                logger.warning("payment verification failed: %s", e)
+            if not self._after:
+                self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="payment-verifier", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        pending = self.db.fetchone(
+            "SELECT COUNT(*) FROM streaming_access_logs WHERE tx_hash IS NOT NULL AND verified IS NULL"
+        )[0]
+        return {
+            "pending": pending,
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "round_trips": self.round_trips,
+            "rpc_calls": self.rpc_calls,
+            "cache_hits": self.cache_hits,
+            "cached": len(self._cache),
+            "failures": self.failures,
+        }
@@ -0,0 +1,339 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from db import Database
+
+logger = logging.getLogger("gateway")
+
+# 정산 진행 상황 (실행별 지갑 → 상태 / nonce / 서명된 트랜잭션) - 재실행 시 이어서 진행
+PAYOUT_LEDGER_PATH = os.getenv("PAYOUT_LEDGER_PATH", "./payouts.db")
+PAYOUT_GAS_LIMIT = int(os.getenv("PAYOUT_GAS_LIMIT", "21000"))
+# EIP-1559: maxFeePerGas = baseFee * 배수 + 우선순위 수수료 (상한을 지정하면 그 이하로 제한)
+PAYOUT_BASE_FEE_MULTIPLIER = float(os.getenv("PAYOUT_BASE_FEE_MULTIPLIER", "2"))
+PAYOUT_PRIORITY_FEE_GWEI = float(os.getenv("PAYOUT_PRIORITY_FEE_GWEI", "0"))  # 0: 노드 추정값 사용
+PAYOUT_MAX_FEE_GWEI = float(os.getenv("PAYOUT_MAX_FEE_GWEI", "0"))  # 0: 상한 없음
+PAYOUT_RECEIPT_CONCURRENCY = int(os.getenv("PAYOUT_RECEIPT_CONCURRENCY", "16"))
+PAYOUT_RECEIPT_TIMEOUT = float(os.getenv("PAYOUT_RECEIPT_TIMEOUT", "300"))
+PAYOUT_RECEIPT_POLL_INTERVAL = float(os.getenv("PAYOUT_RECEIPT_POLL_INTERVAL", "1"))
+# 서명 후 이 시간(초)이 지나도 mempool 에 남아 있으면 (수수료가 낮아 채굴되지 않는 경우) 같은 nonce 로 수수료를 올려 교체
+PAYOUT_REPLACE_AFTER = float(os.getenv("PAYOUT_REPLACE_AFTER", "600"))
+PAYOUT_FEE_BUMP = float(os.getenv("PAYOUT_FEE_BUMP", "1.125"))  # 교체 시 이전 수수료 대비 배수 (노드 대부분 10% 이상 인상 요구)
+
+DEFAULT_PRIORITY_FEE_WEI = Web3.to_wei(1.5, "gwei")
+
+# pending → signed (nonce / raw tx 저장) → submitted → confirmed | failed (receipt status 0)
+PENDING, SIGNED, SUBMITTED, CONFIRMED, FAILED = "pending", "signed", "submitted", "confirmed", "failed"
+
+
+def is_nonce_too_low(error: Exception) -> bool:
+    message = str(error).lower()
+    return "nonce too low" in message or "nonce is too low" in message
+
+
+def is_already_known(error: Exception) -> bool:
+    message = str(error).lower()
+    return "already known" in message or "already imported" in message or "known transaction" in message
+
+
+class NonceManager:
+    """계정 nonce 를 로컬에서 할당 (트랜잭션마다 get_transaction_count 를 호출하지 않음)
+
+    서명한 트랜잭션은 받았는지 알 수 없어도 같은 raw tx 로 재전송하므로 nonce 를 돌려받지 않음,
+    다른 곳에서 같은 계정을 사용해 어긋나면 resync() 로 체인의 pending nonce 에 다시 맞춤
+    """
+
+    def __init__(self, web3: Web3, address: str):
+        self.web3 = web3
+        self.address = address
+        self._next: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _chain_nonce(self) -> int:
+        return self.web3.eth.get_transaction_count(self.address, "pending")
+
+    def next(self) -> int:
+        with self._lock:
+            if self._next is None:
+                self._next = self._chain_nonce()
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def resync(self):
+        """체인의 pending nonce 기준으로 다시 시작"""
+        with self._lock:
+            self._next = self._chain_nonce()
+
+
+def estimate_fees(web3: Web3) -> dict:
+    """EIP-1559 수수료 필드 (baseFee 가 없는 체인이면 gasPrice)"""
+    base_fee = web3.eth.get_block("latest").get("baseFeePerGas")
+    if base_fee is None:
+        return {"gasPrice": web3.eth.gas_price}
+
+    if PAYOUT_PRIORITY_FEE_GWEI > 0:
+        priority_fee = Web3.to_wei(PAYOUT_PRIORITY_FEE_GWEI, "gwei")
+    else:
+        try:
+            priority_fee = web3.eth.max_priority_fee
+        except Exception:
+            # eth_maxPriorityFeePerGas 미지원 노드: 최근 블록 우선순위 수수료의 중앙값
+            rewards = [reward[0] for reward in web3.eth.fee_history(10, "latest", [50]).get("reward", []) if reward]
+            priority_fee = sorted(rewards)[len(rewards) // 2] if rewards else DEFAULT_PRIORITY_FEE_WEI
+
+    max_fee = int(base_fee * PAYOUT_BASE_FEE_MULTIPLIER) + priority_fee
+    if PAYOUT_MAX_FEE_GWEI > 0:
+        max_fee = min(max_fee, Web3.to_wei(PAYOUT_MAX_FEE_GWEI, "gwei"))
+        priority_fee = min(priority_fee, max_fee)
+    return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": priority_fee, "type": 2}
+
+
+def bump_fees(previous, current: dict, factor: float = PAYOUT_FEE_BUMP) -> Optional[dict]:
+    """대기 중인 트랜잭션을 교체할 수수료 (이전 수수료 × factor 와 현재 추정값 중 큰 값, PAYOUT_MAX_FEE_GWEI 를 넘으면 None)"""
+    cap = Web3.to_wei(PAYOUT_MAX_FEE_GWEI, "gwei") if PAYOUT_MAX_FEE_GWEI > 0 else None
+    if previous.get("maxFeePerGas") is not None:
+        priority_fee = max(math.ceil(previous["maxPriorityFeePerGas"] * factor), current.get("maxPriorityFeePerGas", 0))
+        max_fee = max(math.ceil(previous["maxFeePerGas"] * factor), current.get("maxFeePerGas", 0), priority_fee)
+        if cap is not None and max_fee > cap:
+            return None
+        return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": priority_fee, "type": 2}
+
+    gas_price = max(math.ceil(previous["gasPrice"] * factor), current.get("gasPrice", 0))
+    if cap is not None and gas_price > cap:
+        return None
+    return {"gasPrice": gas_price}
+
+
+class PayoutLedger:
+    """정산 실행(run_id)별 지갑 지급 기록 (SQLite) - 같은 실행을 다시 돌려도 이미 보낸 지급은 다시 보내지 않음"""
+
+    def __init__(self, path: str = PAYOUT_LEDGER_PATH):
+        self.db = Database(path)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS payouts (
+                run_id TEXT NOT NULL,
+                wallet TEXT NOT NULL,
+                amount_wei TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                nonce INTEGER,
+                tx_hash TEXT,
+                raw_tx TEXT,
+                replaced TEXT,
+                signed_at INTEGER,
+                error TEXT,
+                updated_at INTEGER,
+                PRIMARY KEY (run_id, wallet)
+            )
+        """)
+        # 수수료 교체 이전에 만든 원장: 교체된 해시 목록 (JSON) / 현재 raw tx 서명 시각 컬럼 추가
+        columns = {row[1] for row in self.db.fetchall("PRAGMA table_info(payouts)")}
+        for column, column_type in (("replaced", "TEXT"), ("signed_at", "INTEGER")):
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE payouts ADD COLUMN {column} {column_type}")
+
+    def plan(self, run_id: str, payouts: Dict[str, int]):
+        """지급 목록 저장 (이미 있는 실행이면 금액이 같은지만 확인)"""
+        def insert(conn):
+            existing = dict(conn.execute("SELECT wallet, amount_wei FROM payouts WHERE run_id = ?", (run_id,)).fetchall())
+            changed = [wallet for wallet, amount in payouts.items() if wallet in existing and int(existing[wallet]) != amount]
+            if changed:
+                raise ValueError(f"payout run {run_id} already planned with different amounts: {', '.join(changed)}")
+            conn.executemany(
+                "INSERT OR IGNORE INTO payouts (run_id, wallet, amount_wei, updated_at) VALUES (?, ?, ?, ?)",
+                [(run_id, wallet, str(amount), int(time.time())) for wallet, amount in payouts.items() if amount > 0],
+            )
+
+        self.db.write(insert)
+
+    def update(self, run_id: str, wallet: str, status: str, **fields):
+        fields = {**fields, "status": status, "updated_at": int(time.time())}
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self.db.execute(f"UPDATE payouts SET {assignments} WHERE run_id = ? AND wallet = ?", (*fields.values(), run_id, wallet))
+
+    def rows(self, run_id: str, statuses: Optional[List[str]] = None) -> List[dict]:
+        query = """
+            SELECT wallet, amount_wei, status, nonce, tx_hash, raw_tx, replaced, COALESCE(signed_at, updated_at)
+            FROM payouts WHERE run_id = ?
+        """
+        params: list = [run_id]
+        if statuses:
+            query += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        columns = ("wallet", "amount_wei", "status", "nonce", "tx_hash", "raw_tx", "replaced", "signed_at")
+        return [
+            {**dict(zip(columns, row)), "amount_wei": int(row[1]), "replaced": json.loads(row[6] or "[]")}
+            for row in self.db.fetchall(query + " ORDER BY CAST(amount_wei AS REAL) DESC", params)
+        ]
+
+    def summary(self, run_id: str) -> Dict[str, int]:
+        return dict(self.db.fetchall("SELECT status, COUNT(*) FROM payouts WHERE run_id = ? GROUP BY status", (run_id,)))
+
+
+class PayoutRunner:
+    """지갑별 지급을 서명 → 연속 전송하고 receipt 는 동시에 기다림 (블록당 트랜잭션 하나로 제한되지 않음)"""
+
+    def __init__(
+        self,
+        web3: Web3,
+        account,
+        ledger: PayoutLedger,
+        receipt_concurrency: int = PAYOUT_RECEIPT_CONCURRENCY,
+        receipt_timeout: float = PAYOUT_RECEIPT_TIMEOUT,
+        replace_after: float = PAYOUT_REPLACE_AFTER,
+    ):
+        self.web3 = web3
+        self.account = account
+        self.ledger = ledger
+        self.nonces = NonceManager(web3, account.address)
+        self.receipt_concurrency = receipt_concurrency
+        self.receipt_timeout = receipt_timeout
+        self.replace_after = replace_after
+        self.chain_id: Optional[int] = None
+
+    def _sign(self, nonce: int, wallet: str, amount_wei: int, fees: dict) -> tuple:
+        tx = {
+            "nonce": nonce,
+            "to": Web3.to_checksum_address(wallet),
+            "value": amount_wei,
+            "gas": PAYOUT_GAS_LIMIT,
+            "chainId": self.chain_id,
+            **fees,
+        }
+        signed = self.account.sign_transaction(tx)
+        return signed.hash.to_0x_hex(), signed.raw_transaction.to_0x_hex()
+
+    def _wait(self, run_id: str, wallet: str, hashes: List[str]):
+        """같은 nonce 의 트랜잭션 (현재 + 수수료 교체 전) 중 채굴된 것의 receipt 로 상태 기록"""
+        deadline = time.monotonic() + self.receipt_timeout
+        while True:
+            for tx_hash in hashes:
+                try:
+                    receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    continue
+                status = CONFIRMED if receipt["status"] == 1 else FAILED
+                self.ledger.update(run_id, wallet, status, tx_hash=tx_hash)
+                logger.info("payout %s to %s %s", tx_hash, wallet, status)
+                return
+            if time.monotonic() >= deadline:
+                logger.warning("payout %s to %s not mined yet, will be checked on the next run", hashes[0], wallet)
+                return
+            time.sleep(PAYOUT_RECEIPT_POLL_INTERVAL)
+
+    def _lookup(self, tx_hash: str) -> Optional[dict]:
+        try:
+            return self.web3.eth.get_transaction(tx_hash)
+        except TransactionNotFound:
+            return None
+
+    def _on_chain(self, tx_hash: str) -> bool:
+        """노드가 알고 있는 트랜잭션인지 (블록에 포함 또는 mempool 대기)"""
+        return self._lookup(tx_hash) is not None
+
+    def _broadcast(self, tx_hash: str, raw_tx: str, replaced: List[str] = ()) -> tuple:
+        """서명된 raw tx 전송 → (다음 상태, 오류)
+
+        같은 nonce 의 같은 트랜잭션이므로 여러 번 보내도 한 번만 실행됨.
+        SUBMITTED: 노드가 받음 (오류가 나도 이 트랜잭션이나 교체 전 트랜잭션이 체인 / mempool 에 있으면 받은 것),
+        PENDING: nonce 가 다른 트랜잭션에 쓰였고 이 지급의 트랜잭션은 하나도 체인에 없음 (확실히 거부 → 새 nonce 로 다시 서명),
+        SIGNED: 노드가 받았는지 알 수 없음 (타임아웃, 연결 끊김 등) → raw tx 를 유지하고 다음 실행에서 해시로 확인
+        """
+        try:
+            self.web3.eth.send_raw_transaction(raw_tx)
+            return SUBMITTED, None
+        except Exception as e:
+            if is_already_known(e):
+                return SUBMITTED, None
+            try:
+                if any(self._on_chain(h) for h in (tx_hash, *replaced)):
+                    return SUBMITTED, None
+            except Exception:
+                return SIGNED, str(e)
+            return (PENDING if is_nonce_too_low(e) else SIGNED), str(e)
+
+    def _record(self, run_id: str, wallet: str, hashes: List[str], state: str, error: Optional[str], executor: ThreadPoolExecutor, waits: list):
+        """hashes: 현재 트랜잭션 해시 + 수수료 교체 전 해시 (모두 같은 nonce)"""
+        if state == SUBMITTED:
+            self.ledger.update(run_id, wallet, SUBMITTED, error=None)
+            waits.append(executor.submit(self._wait, run_id, wallet, hashes))
+        elif state == PENDING:
+            logger.warning("payout %s to %s was rejected, will be signed again: %s", hashes[0], wallet, error)
+            self.ledger.update(run_id, wallet, PENDING, nonce=None, tx_hash=None, raw_tx=None, replaced=None, signed_at=None, error=error)
+            self.nonces.resync()
+        else:
+            logger.warning("payout %s to %s may not have been submitted, will be checked on the next run: %s", hashes[0], wallet, error)
+            self.ledger.update(run_id, wallet, SIGNED, error=error)
+
+    def _replace(self, run_id: str, row: dict, pending: dict) -> tuple:
+        """mempool 에 오래 남은 지급을 같은 nonce, 더 높은 수수료로 다시 서명해 교체 → (해시 목록, 상태, 오류)
+
+        같은 nonce 이므로 교체 전 / 후 중 하나만 채굴됨, 교체 전 해시도 원장에 남겨 어느 쪽이 채굴돼도 확인
+        """
+        hashes = [row["tx_hash"], *row["replaced"]]
+        fees = bump_fees(pending, estimate_fees(self.web3))
+        if fees is None:
+            logger.warning("payout %s to %s is stuck in the mempool but PAYOUT_MAX_FEE_GWEI prevents a fee bump", hashes[0], row["wallet"])
+            return hashes, SUBMITTED, None
+
+        tx_hash, raw_tx = self._sign(row["nonce"], row["wallet"], row["amount_wei"], fees)
+        hashes.insert(0, tx_hash)
+        self.ledger.update(
+            run_id, row["wallet"], SIGNED,
+            tx_hash=tx_hash, raw_tx=raw_tx, replaced=json.dumps(hashes[1:]), signed_at=int(time.time()), error=None,
+        )
+        logger.info("replacing payout %s to %s with %s (nonce %d)", hashes[1], row["wallet"], tx_hash, row["nonce"])
+        state, error = self._broadcast(tx_hash, raw_tx, hashes[1:])
+        return hashes, state, error
+
+    def _reconcile(self, run_id: str, executor: ThreadPoolExecutor) -> list:
+        """이전 실행에서 서명/전송까지 된 지급 확인 (같은 nonce 의 raw tx 만 재전송 / 교체 → 이중 지급 없음)"""
+        waits = []
+        for row in self.ledger.rows(run_id, [SIGNED, SUBMITTED]):
+            hashes = [row["tx_hash"], *row["replaced"]]
+            known = [tx for tx in map(self._lookup, hashes) if tx is not None]
+            mined = any(tx["blockNumber"] is not None for tx in known)
+            stale = time.time() - row["signed_at"] >= self.replace_after
+            if known and not mined and stale:
+                hashes, state, error = self._replace(run_id, row, known[0])
+            elif known:
+                state, error = SUBMITTED, None
+            else:
+                state, error = self._broadcast(row["tx_hash"], row["raw_tx"], row["replaced"])
+            self._record(run_id, row["wallet"], hashes, state, error, executor, waits)
+        return waits
+
+    def run(self, run_id: str, payouts: Dict[str, int]) -> Dict[str, int]:
+        """지급 실행 (중단 후 같은 run_id 로 다시 실행하면 남은 지급만 처리), 상태별 건수 반환"""
+        self.ledger.plan(run_id, payouts)
+        with ThreadPoolExecutor(max_workers=self.receipt_concurrency) as executor:
+            self.chain_id = self.web3.eth.chain_id
+            waits = self._reconcile(run_id, executor)
+            self.nonces.resync()
+            fees = estimate_fees(self.web3)
+
+            for row in self.ledger.rows(run_id, [PENDING, FAILED]):
+                nonce = self.nonces.next()
+                tx_hash, raw_tx = self._sign(nonce, row["wallet"], row["amount_wei"], fees)
+                # 전송 전에 기록 → 전송 직후 중단되어도 다음 실행이 같은 트랜잭션을 확인/재전송
+                self.ledger.update(
+                    run_id, row["wallet"], SIGNED,
+                    nonce=nonce, tx_hash=tx_hash, raw_tx=raw_tx, replaced=None, signed_at=int(time.time()), error=None,
+                )
+                state, error = self._broadcast(tx_hash, raw_tx)
+                if state == SIGNED:
+                    # 받았는지 알 수 없으면 같은 raw tx 를 한 번 더 보냄 (nonce 를 비워 두면 뒤 지급이 막힘)
+                    state, error = self._broadcast(tx_hash, raw_tx)
+                self._record(run_id, row["wallet"], [tx_hash], state, error, executor, waits)
+
+            for wait in waits:
+                wait.result()
+        return self.ledger.summary(run_id)
@@ -0,0 +1,101 @@
+import os
+import re
+import hmac
+import time
+import uuid
+import random
+import logging
+
+import anyio
+from pyinstrument import Profiler
+
+logger = logging.getLogger("gateway")
+
+# 요청 단위 샘플링 프로파일러 (기본 비활성): 헤더를 붙인 요청 또는 PROFILE_SAMPLE_RATE 비율의 요청을 pyinstrument 로 기록
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() == "true"
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile")
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")  # 헤더 값이 이 값과 같을 때만 프로파일링 (비워두면 헤더로는 프로파일링하지 않음)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 헤더 없이 프로파일링할 요청 비율 (0 ~ 1)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))  # 스택 샘플링 간격 (초)
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))  # PROFILE_DIR 에 남길 최대 파일 수 (오래된 것부터 삭제)
+
+
+def profile_filename(scope: dict) -> str:
+    """예: 20260101T120000-1a2b3c4d-GET-meta_search.html"""
+    path = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_")[:60] or "root"
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}-{scope['method']}-{path}.html"
+
+
+class ProfilingMiddleware:
+    """선택된 요청을 pyinstrument (async 모드: await 대기 시간 포함) 로 프로파일링해 PROFILE_DIR 에 HTML 로 저장,
+    파일 이름은 응답 헤더 X-Profile-File 로 반환"""
+
+    def __init__(
+        self,
+        app,
+        enabled: bool = PROFILE_ENABLED,
+        header: str = PROFILE_HEADER,
+        token: str = PROFILE_TOKEN,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        output_dir: str = PROFILE_DIR,
+        interval: float = PROFILE_INTERVAL,
+        max_files: int = PROFILE_MAX_FILES,
+    ):
+        self.app = app
+        self.enabled = enabled
+        self.header = header.lower().encode()
+        self.token = token
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_files = max_files
+        self.profiled = 0
+
+    def _selected(self, scope: dict) -> bool:
+        for name, value in scope["headers"]:
+            if name == self.header:
+                # 토큰이 없으면 누구나 프로파일링을 유발할 수 있으므로 헤더는 무시
+                return bool(self.token) and hmac.compare_digest(value, self.token.encode())
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _save(self, profiler: Profiler, filename: str):
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, filename), "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+        self._rotate()
+
+    def _rotate(self):
+        """max_files 를 넘는 오래된 프로파일 삭제 (수정 시각순)"""
+        paths = [entry for entry in os.scandir(self.output_dir) if entry.name.endswith(".html")]
+        paths.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in paths[:max(len(paths) - self.max_files, 0)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        filename = profile_filename(scope)
+
+        async def send_with_filename(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-file", filename.encode())]}
+            await send(message)
+
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_filename)
+        finally:
+            profiler.stop()
+            try:
+                # HTML 렌더링은 수십 ms 가 걸리므로 이벤트 루프 밖에서
+                await anyio.to_thread.run_sync(self._save, profiler, filename)
+                self.profiled += 1
+            except OSError as e:
+                logger.warning("failed to save profile %s: %s", filename, e)
@@ -0,0 +1,244 @@
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from typing import AsyncIterator, List, Optional
+
+from fastapi import HTTPException
+
+from metrics import UPLOAD_BYTES
+from upload_stream import StoredUpload, safe_filename, stored_filename, UPLOAD_CHUNK_SIZE, MAX_UPLOAD_SIZE
+
+logger = logging.getLogger("gateway")
+
+# 마지막 구간 수신 후 이 시간(초)이 지나도록 완료되지 않은 세션은 .part / 세션 파일 삭제
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", "86400"))
+UPLOAD_SESSION_SWEEP_INTERVAL = float(os.getenv("UPLOAD_SESSION_SWEEP_INTERVAL", "600"))
+
+content_range_pattern = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+
+def parse_content_range(header: str, length: int):
+    """`Content-Range: bytes start-end/total` 헤더를 (start, end_exclusive)로 변환"""
+    match = content_range_pattern.match((header or "").strip())
+    if not match:
+        raise HTTPException(status_code=400, detail="Invalid or missing Content-Range header")
+
+    start, last, total = int(match.group(1)), int(match.group(2)), match.group(3)
+    if last < start or last >= length or (total != "*" and int(total) != length):
+        raise HTTPException(status_code=416, detail="Content-Range does not match the upload length")
+    return start, last + 1
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """수신 완료 구간 목록에 [start, end) 구간을 병합"""
+    merged = []
+    for r_start, r_end in sorted(ranges + [[start, end]]):
+        if merged and r_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], r_end)
+        else:
+            merged.append([r_start, r_end])
+    return merged
+
+
+def contiguous_offset(ranges: List[List[int]]) -> int:
+    """0 바이트부터 끊김 없이 수신된 길이 (tus 의 Upload-Offset)"""
+    if ranges and ranges[0][0] == 0:
+        return ranges[0][1]
+    return 0
+
+
+class UploadSessionStore:
+    """재개 가능한 업로드 세션 관리 (세션 정보는 JSON, 데이터는 미리 할당한 .part 파일)"""
+
+    def __init__(self, session_dir: str, max_size: int = MAX_UPLOAD_SIZE, ttl: int = UPLOAD_SESSION_TTL):
+        self.session_dir = session_dir
+        self.max_size = max_size
+        self.ttl = ttl
+        self.expired = 0
+        self._locks = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        os.makedirs(session_dir, exist_ok=True)
+
+    def _info_path(self, upload_id: str) -> str:
+        return os.path.join(self.session_dir, f"{upload_id}.json")
+
+    def _data_path(self, upload_id: str) -> str:
+        return os.path.join(self.session_dir, f"{upload_id}.part")
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    def _save(self, session: dict):
+        session["updated_at"] = int(time.time())
+        tmp_path = self._info_path(session["upload_id"]) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(session, f)
+        os.replace(tmp_path, self._info_path(session["upload_id"]))
+
+    def create(self, filename: str, length: int, storage: str, meta: dict) -> dict:
+        """업로드 세션 생성 및 데이터 파일 미리 할당"""
+        if length <= 0:
+            raise HTTPException(status_code=400, detail="Upload length must be positive")
+        if length > self.max_size:
+            raise HTTPException(status_code=413, detail=f"File exceeds the maximum upload size ({self.max_size} bytes)")
+
+        session = {
+            "upload_id": uuid.uuid4().hex,
+            "filename": safe_filename(filename),
+            "length": length,
+            "storage": storage,
+            "meta": meta,
+            "ranges": [],
+            "created_at": int(time.time()),
+        }
+        with open(self._data_path(session["upload_id"]), "wb") as f:
+            f.truncate(length)  # sparse 파일로 할당
+        self._save(session)
+        return session
+
+    def get(self, upload_id: str) -> dict:
+        """업로드 세션 조회"""
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        try:
+            with open(self._info_path(upload_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+
+    async def write_range(self, upload_id: str, start: int, end: int, body: AsyncIterator[bytes]) -> dict:
+        """요청 본문을 [start, end) 위치에 기록 (여러 구간이 병렬로 들어와도 안전)"""
+        self.get(upload_id)
+        position = start
+        try:
+            fd = os.open(self._data_path(upload_id), os.O_WRONLY)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        try:
+            async for chunk in body:
+                if not chunk:
+                    continue
+                if position + len(chunk) > end:
+                    raise HTTPException(status_code=400, detail="Request body is longer than Content-Range")
+                os.pwrite(fd, chunk, position)
+                position += len(chunk)
+        finally:
+            os.close(fd)
+            UPLOAD_BYTES.labels("resumable").inc(position - start)
+            # 연결이 끊겨도 실제로 기록된 부분까지는 수신 완료로 남겨 재전송을 줄임
+            if position > start:
+                async with self._lock(upload_id):
+                    session = self.get(upload_id)
+                    session["ranges"] = merge_range(session["ranges"], start, position)
+                    self._save(session)
+
+        if position != end:
+            raise HTTPException(status_code=400, detail="Request body is shorter than Content-Range")
+        return self.get(upload_id)
+
+    def status(self, session: dict) -> dict:
+        """세션 진행 상태"""
+        received = sum(r_end - r_start for r_start, r_end in session["ranges"])
+        return {
+            "upload_id": session["upload_id"],
+            "filename": session["filename"],
+            "length": session["length"],
+            "offset": contiguous_offset(session["ranges"]),
+            "received": received,
+            "ranges": session["ranges"],
+            "complete": session["ranges"] == [[0, session["length"]]],
+        }
+
+    async def finalize(self, upload_id: str, dest_dir: str) -> StoredUpload:
+        """모든 구간 수신 확인 후 SHA-256 계산 및 업로드 디렉토리로 이동"""
+        async with self._lock(upload_id):
+            session = self.get(upload_id)
+            if session["ranges"] != [[0, session["length"]]]:
+                raise HTTPException(status_code=409, detail="Upload is incomplete")
+
+            # 구간이 순서 없이 도착하므로 해시는 조립이 끝난 뒤 별도 스레드에서 계산
+            data_path = self._data_path(upload_id)
+            sha256 = await asyncio.to_thread(_file_sha256, data_path)
+
+            # 같은 이름의 기존 업로드를 덮어쓰지 않도록 고유한 이름으로 저장
+            final_path = os.path.join(dest_dir, stored_filename(session["filename"], sha256))
+            os.replace(data_path, final_path)
+            os.remove(self._info_path(upload_id))
+        self._locks.pop(upload_id, None)
+        return StoredUpload(path=final_path, size=session["length"], sha256=sha256)
+
+    def abort(self, upload_id: str):
+        """업로드 세션 및 임시 데이터 삭제"""
+        self.get(upload_id)
+        for path in (self._data_path(upload_id), self._info_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        self._locks.pop(upload_id, None)
+
+    def sweep_expired(self, now: float = None) -> int:
+        """TTL 동안 진행이 없는 세션 삭제 (진행 중인 finalize 는 건너뜀), 삭제한 세션 수 반환"""
+        deadline = (now or time.time()) - self.ttl
+        removed = 0
+        for name in os.listdir(self.session_dir):
+            upload_id, ext = os.path.splitext(name)
+            if ext != ".json":
+                continue
+            lock = self._locks.get(upload_id)
+            if lock is not None and lock.locked():
+                continue
+            try:
+                with open(self._info_path(upload_id)) as f:
+                    session = json.load(f)
+                last_active = session.get("updated_at", session["created_at"])
+            except (OSError, ValueError, KeyError):
+                last_active = os.path.getmtime(self._info_path(upload_id))
+            if last_active > deadline:
+                continue
+            for path in (self._data_path(upload_id), self._info_path(upload_id), self._info_path(upload_id) + ".tmp"):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._locks.pop(upload_id, None)
+            removed += 1
+
+        # 세션 파일 없이 남은 데이터 파일 (생성 도중 중단 등)
+        for name in os.listdir(self.session_dir):
+            upload_id, ext = os.path.splitext(name)
+            path = os.path.join(self.session_dir, name)
+            if ext == ".part" and not os.path.exists(self._info_path(upload_id)) and os.path.getmtime(path) <= deadline:
+                os.remove(path)
+
+        self.expired += removed
+        return removed
+
+    async def _run_sweeper(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = await asyncio.to_thread(self.sweep_expired)
+                if removed:
+                    logger.info("expired %d abandoned upload sessions", removed)
+            except Exception as e:
+                logger.warning("upload session sweep failed: %s", e)
+
+    def start(self, interval: float = UPLOAD_SESSION_SWEEP_INTERVAL):
+        if interval > 0 and (self._sweeper is None or self._sweeper.done()):
+            self._sweeper = asyncio.create_task(self._run_sweeper(interval))
+
+    async def stop(self):
+        if self._sweeper is not None and not self._sweeper.done():
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+        self._sweeper = None
@@ -0,0 +1,102 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+# 변환 결과(HLS) 디스크 캐시 최대 크기
+STREAM_CACHE_MAX_BYTES = int(os.getenv("STREAM_CACHE_MAX_BYTES", str(50 * 1024 ** 3)))  # 50 GiB
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class SegmentCache:
+    """STREAM_PATH 아래 CID 별 HLS 디렉토리를 LRU 로 관리 (용량 초과 시 가장 오래 안 쓴 CID 부터 삭제)"""
+
+    def __init__(self, root: str, max_bytes: int = STREAM_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # cid → bytes (오래된 순)
+        self._lock = threading.Lock()
+
+    def load(self):
+        """재시작 시 디렉토리 mtime(마지막 사용 시각) 순으로 LRU 복원"""
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and not entry.name.startswith("."):
+                entries.append((entry.stat().st_mtime, entry.name, _dir_size(entry.path)))
+        with self._lock:
+            self._entries = OrderedDict((cid, size) for _, cid, size in sorted(entries))
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._entries.values())
+
+    def path(self, cid: str) -> str:
+        return os.path.join(self.root, cid)
+
+    def contains(self, cid: str) -> bool:
+        return cid in self._entries
+
+    def touch(self, cid: str) -> bool:
+        """세그먼트 제공 시 호출 (적중 여부 반환)"""
+        with self._lock:
+            if cid not in self._entries:
+                self.misses += 1
+                return False
+            self._entries.move_to_end(cid)
+            self.hits += 1
+        try:
+            os.utime(self.path(cid))
+        except OSError:
+            pass
+        return True
+
+    def add(self, cid: str, pinned: Iterable[str] = ()) -> Optional[int]:
+        """변환이 끝난 CID 등록 후 용량 초과분 정리"""
+        size = _dir_size(self.path(cid))
+        with self._lock:
+            self._entries[cid] = size
+            self._entries.move_to_end(cid)
+        self.evict(pinned=set(pinned) | {cid})
+        return size
+
+    def evict(self, pinned: Iterable[str] = ()):
+        pinned = set(pinned)
+        while True:
+            with self._lock:
+                if self.total_bytes <= self.max_bytes:
+                    return
+                victim = next((cid for cid in self._entries if cid not in pinned), None)
+                if victim is None:
+                    return
+                del self._entries[victim]
+                self.evictions += 1
+            shutil.rmtree(self.path(victim), ignore_errors=True)
+
+    def remove(self, cid: str):
+        with self._lock:
+            self._entries.pop(cid, None)
+        shutil.rmtree(self.path(cid), ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
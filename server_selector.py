@@ -0,0 +1,226 @@
+import os
+import time
+import random
+import socket
+import asyncio
+import hashlib
+import logging
+import ipaddress
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+import redis.asyncio as redis
+
+logger = logging.getLogger("gateway")
+
+# 이 시간(초) 동안 하트비트나 프로브 성공이 없으면 노드 상태 키가 만료되어 선택 대상에서 제외
+HEALTH_TTL = int(os.getenv("HEALTH_TTL", "90"))
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "30"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "3"))
+HEALTH_PROBE_CONCURRENCY = int(os.getenv("HEALTH_PROBE_CONCURRENCY", "32"))
+# 연속 프로브 실패 횟수가 이 값에 도달하면 TTL 을 기다리지 않고 바로 제외
+HEALTH_MAX_FAILURES = int(os.getenv("HEALTH_MAX_FAILURES", "3"))
+# 노드 origin + 이 경로만 프로브 (등록된 stream_url 의 경로는 사용하지 않음)
+HEALTH_PROBE_PATH = os.getenv("HEALTH_PROBE_PATH", "/health")
+# 루프백/사설/링크 로컬 주소의 노드 허용 여부 (로컬 개발용, 운영에서는 false)
+STREAM_ALLOW_PRIVATE_NODES = os.getenv("STREAM_ALLOW_PRIVATE_NODES", "false").lower() == "true"
+# p2c (power-of-two-choices) 또는 least_load
+SERVER_SELECTION = os.getenv("SERVER_SELECTION", "p2c")
+
+STREAM_NODES = "stream_nodes"  # 노드 ID → 노드 origin (해시)
+STREAM_NODE_HEALTH = "stream_node_health"  # 노드별 상태 해시 (TTL)
+
+# 상태 키가 남아 있을 때만 실패 횟수 증가, 한도에 도달하면 제거 / 이미 만료된 노드는 프로브 목록에서도 제거
+PROBE_FAILED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HDEL', KEYS[2], ARGV[2])
+    return -1
+end
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if failures >= tonumber(ARGV[1]) then
+    redis.call('DEL', KEYS[1])
+end
+return failures
+"""
+
+
+def node_origin(stream_url: str) -> str:
+    parsed = urlparse(stream_url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def node_id(stream_url: str) -> str:
+    """스트리밍 노드 ID (같은 호스트:포트의 stream_url 은 한 노드로 취급)"""
+    return hashlib.sha1(node_origin(stream_url).encode()).hexdigest()[:16]
+
+
+def health_key(nid: str) -> str:
+    return f"{STREAM_NODE_HEALTH}:{nid}"
+
+
+def probe_url(stream_url: str) -> str:
+    return node_origin(stream_url) + "/" + HEALTH_PROBE_PATH.lstrip("/")
+
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def check_node_url(stream_url: str, allow_private: bool = STREAM_ALLOW_PRIVATE_NODES):
+    """노드 URL 검사 (http(s) 만 허용, 루프백/사설/링크 로컬 주소로 해석되는 호스트는 ValueError)"""
+    try:
+        parsed = urlparse(stream_url)
+        host, port = parsed.hostname, parsed.port
+    except ValueError as e:
+        raise ValueError(f"invalid stream_url: {e}") from e
+    if parsed.scheme not in ("http", "https") or not host:
+        raise ValueError("stream_url must be an http(s) URL")
+    if allow_private:
+        return
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, port or (443 if parsed.scheme == "https" else 80), type=socket.SOCK_STREAM
+        )
+    except OSError as e:
+        raise ValueError(f"cannot resolve {host}: {e}") from e
+    for *_, sockaddr in infos:
+        if not is_public_address(sockaddr[0]):
+            raise ValueError(f"{host} resolves to a non-public address")
+
+
+def load_score(health: dict) -> float:
+    """용량 대비 부하 (낮을수록 여유)"""
+    load = float(health.get("load", 0))
+    capacity = max(float(health.get("capacity", 1)), 1.0)
+    return (load + 1) / capacity
+
+
+def choose(candidates: List[Tuple[dict, dict]], region: Optional[str] = None, strategy: str = SERVER_SELECTION) -> Optional[Tuple[dict, dict]]:
+    """살아 있는 (서버, 상태) 후보 중 하나 선택 (같은 지역 후보가 있으면 그 안에서)"""
+    if not candidates:
+        return None
+    if region:
+        local = [(server, health) for server, health in candidates if (server.get("region") or health.get("region")) == region]
+        candidates = local or candidates
+
+    def key(candidate):
+        return load_score(candidate[1]), float(candidate[1].get("latency_ms", 0))
+
+    if strategy == "least_load" or len(candidates) < 3:
+        return min(candidates, key=key)
+    # power-of-two-choices: 임의의 두 후보 중 덜 바쁜 쪽 (모든 요청이 같은 최소 부하 노드로 몰리지 않음)
+    return min(random.sample(candidates, 2), key=key)
+
+
+class ServerSelector:
+    """노드별 상태/부하를 Redis 에 유지하고 요청마다 정상 노드 중 하나를 선택"""
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        ttl: int = HEALTH_TTL,
+        strategy: str = SERVER_SELECTION,
+        allow_private: bool = STREAM_ALLOW_PRIVATE_NODES,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.strategy = strategy
+        self.allow_private = allow_private
+        self.probes = 0
+        self.probe_failures = 0
+        self._probe_failed = client.register_script(PROBE_FAILED_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+
+    async def heartbeat(self, stream_url: str, load: float = None, capacity: int = None, region: str = None) -> str:
+        """노드 상태 갱신 (등록/하트비트 시 호출, TTL 연장)"""
+        nid = node_id(stream_url)
+        fields = {"origin": node_origin(stream_url), "seen_at": int(time.time()), "failures": 0}
+        for name, value in (("load", load), ("capacity", capacity), ("region", region)):
+            if value is not None:
+                fields[name] = value
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(STREAM_NODES, nid, node_origin(stream_url))
+            pipe.hset(health_key(nid), mapping=fields)
+            pipe.expire(health_key(nid), self.ttl)
+            await pipe.execute()
+        return nid
+
+    async def health_of(self, stream_urls: Iterable[str]) -> Dict[str, dict]:
+        """노드 ID → 상태 (만료된 노드는 빠짐)"""
+        ids = list(dict.fromkeys(node_id(url) for url in stream_urls))
+        if not ids:
+            return {}
+        async with self.client.pipeline(transaction=False) as pipe:
+            for nid in ids:
+                pipe.hgetall(health_key(nid))
+            results = await pipe.execute()
+        return {nid: health for nid, health in zip(ids, results) if health}
+
+    async def select(self, servers: List[dict], region: Optional[str] = None) -> Optional[Tuple[dict, dict]]:
+        health = await self.health_of(server["stream_url"] for server in servers)
+        candidates = [
+            (server, health[node_id(server["stream_url"])])
+            for server in servers if node_id(server["stream_url"]) in health
+        ]
+        return choose(candidates, region, self.strategy)
+
+    async def check_url(self, stream_url: str):
+        """등록/하트비트로 받은 노드 URL 검사 (공개 주소가 아니면 ValueError)"""
+        await check_node_url(stream_url, self.allow_private)
+
+    async def _probe(self, http: httpx.AsyncClient, semaphore: asyncio.Semaphore, nid: str, url: str):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                # 등록 이후 DNS 가 내부 주소로 바뀌었을 수 있으므로 매번 다시 확인, 본문은 읽지 않고 상태 코드만 확인
+                await self.check_url(url)
+                async with http.stream("GET", url) as response:
+                    ok = response.status_code < 500
+            except (httpx.HTTPError, ValueError):
+                ok = False
+            latency_ms = (time.perf_counter() - start) * 1000
+
+        self.probes += 1
+        if ok:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.hset(health_key(nid), mapping={"latency_ms": round(latency_ms, 1), "probed_at": int(time.time()), "failures": 0})
+                pipe.expire(health_key(nid), self.ttl)
+                await pipe.execute()
+        else:
+            self.probe_failures += 1
+            await self._probe_failed(keys=[health_key(nid), STREAM_NODES], args=[HEALTH_MAX_FAILURES, nid])
+
+    async def probe_all(self):
+        """등록된 모든 노드를 동시에(최대 HEALTH_PROBE_CONCURRENCY) 프로브"""
+        nodes = await self.client.hgetall(STREAM_NODES)
+        if not nodes:
+            return
+        semaphore = asyncio.Semaphore(HEALTH_PROBE_CONCURRENCY)
+        # 리다이렉트는 따라가지 않음 (3xx 도 응답한 것으로 간주)
+        async with httpx.AsyncClient(timeout=HEALTH_PROBE_TIMEOUT, follow_redirects=False) as http:
+            await asyncio.gather(*(self._probe(http, semaphore, nid, probe_url(origin)) for nid, origin in nodes.items()))
+
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.warning("stream node probe failed: %s", e)
+
+    def start(self, interval: float = HEALTH_PROBE_INTERVAL):
+        if interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def stats(self) -> dict:
+        return {"strategy": self.strategy, "ttl": self.ttl, "probes": self.probes, "probe_failures": self.probe_failures}
@@ -0,0 +1,399 @@
+import os
+import ast
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import binascii
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+
+from metrics import observe
+
+logger = logging.getLogger("gateway")
+
+# Redis 연결 풀 설정 (핸들러는 풀에서 연결을 빌려 쓰고, 풀이 가득 차면 REDIS_POOL_TIMEOUT 동안 대기)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
+STREAMING_SERVERS_BY_CID = "streaming_servers_by_cid"  # CID 기반 색인 (서버 ID 집합)
+STREAMING_SERVERS_BY_ADDRESS = "streaming_servers_by_addr"  # 지갑+CID 기반 색인 (서버 ID 집합)
+STREAM_SERVER = "stream_server"  # 서버별 해시
+# 목록 조회용 색인 (score 0 인 ZSET → 사전순 커서 페이지네이션)
+STREAMING_CIDS = "streaming_cids"  # 서버가 하나 이상 등록된 CID
+STREAMING_WALLET_CIDS = "streaming_wallet_cids"  # "지갑:CID" 쌍
+STREAMING_CIDS_BY_WALLET = "streaming_cids_by_wallet"  # 지갑별 CID
+STREAM_SERVER_LEASES = "stream_server_leases"  # 서버 ID → 임대 만료 시각 (ZSET, 만료 순 정리)
+
+# 등록 임대 기간: 이 시간 안에 /heartbeat 로 갱신하지 않으면 정리 대상
+LEASE_TTL = int(os.getenv("LEASE_TTL", "120"))
+LEASE_SWEEP_INTERVAL = float(os.getenv("LEASE_SWEEP_INTERVAL", "5"))
+LEASE_SWEEP_BATCH = int(os.getenv("LEASE_SWEEP_BATCH", "500"))
+
+# 해시 필드 → 타입 변환
+INT_FIELDS = ("creator_share", "provider_share", "registered_at")
+FLOAT_FIELDS = ("price",)
+
+# 서버 제거 + 빈 색인 정리를 한 번에 (지갑+CID 집합에 있는 ID 만 제거 → 소유자 검증도 원자적으로)
+# KEYS: CID 집합, 지갑+CID 집합, 전체 CID 색인, 지갑:CID 색인, 지갑별 CID 색인, 임대 ZSET
+# ARGV: 서버 해시 접두사, cid, "지갑:cid", [서버 ID...] (없으면 지갑+CID 집합 전체)
+DEREGISTER_SCRIPT = """
+local ids = {}
+if #ARGV > 3 then
+    for i = 4, #ARGV do ids[#ids + 1] = ARGV[i] end
+else
+    ids = redis.call('SMEMBERS', KEYS[2])
+end
+local removed = {}
+for _, sid in ipairs(ids) do
+    if redis.call('SREM', KEYS[2], sid) == 1 then
+        redis.call('SREM', KEYS[1], sid)
+        redis.call('DEL', ARGV[1] .. sid)
+        redis.call('ZREM', KEYS[6], sid)
+        removed[#removed + 1] = sid
+    end
+end
+if redis.call('SCARD', KEYS[1]) == 0 then
+    redis.call('ZREM', KEYS[3], ARGV[2])
+end
+if redis.call('SCARD', KEYS[2]) == 0 then
+    redis.call('ZREM', KEYS[4], ARGV[3])
+    redis.call('ZREM', KEYS[5], ARGV[2])
+end
+return removed
+"""
+
+# 아직 만료되지 않은 임대만 연장 (만료/제거된 ID 는 돌려줘서 제공자가 다시 등록하도록)
+# KEYS: 임대 ZSET / ARGV: 현재 시각, 새 만료 시각, 서버 ID...
+RENEW_SCRIPT = """
+local renewed = 0
+local expired = {}
+for i = 3, #ARGV do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if score and tonumber(score) >= tonumber(ARGV[1]) then
+        redis.call('ZADD', KEYS[1], 'XX', ARGV[2], ARGV[i])
+        renewed = renewed + 1
+    else
+        expired[#expired + 1] = ARGV[i]
+    end
+end
+return {renewed, expired}
+"""
+
+# 만료된 임대를 최대 batch 개 정리 (해시, CID/지갑+CID 집합, 빈 목록 색인까지)
+# KEYS: 임대 ZSET, 전체 CID 색인, 지갑:CID 색인
+# ARGV: 현재 시각, batch, 서버 해시 접두사, CID 집합 접두사, 지갑+CID 집합 접두사, 지갑별 CID 색인 접두사
+SWEEP_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, sid in ipairs(ids) do
+    local fields = redis.call('HMGET', ARGV[3] .. sid, 'cid', 'content_distributor_wallet')
+    local cid, wallet = fields[1], fields[2]
+    redis.call('ZREM', KEYS[1], sid)
+    redis.call('DEL', ARGV[3] .. sid)
+    if cid and wallet then
+        local cid_set = ARGV[4] .. cid
+        local wallet_set = ARGV[5] .. wallet .. ':' .. cid
+        redis.call('SREM', cid_set, sid)
+        redis.call('SREM', wallet_set, sid)
+        if redis.call('SCARD', cid_set) == 0 then
+            redis.call('ZREM', KEYS[2], cid)
+        end
+        if redis.call('SCARD', wallet_set) == 0 then
+            redis.call('ZREM', KEYS[3], wallet .. ':' .. cid)
+            redis.call('ZREM', ARGV[6] .. wallet, cid)
+        end
+    end
+end
+return #ids
+"""
+
+
+class TimedPipeline(Pipeline):
+    """execute() 한 번 (명령 묶음 왕복 한 번) 을 redis / pipeline 호출 시간으로 기록"""
+
+    async def execute(self, raise_on_error: bool = True):
+        with observe("redis", "pipeline"):
+            return await super().execute(raise_on_error)
+
+
+class TimedRedis(redis.Redis):
+    """명령별 (GET, HSET, EVALSHA ...) 호출 시간을 기록하는 Redis 클라이언트"""
+
+    async def execute_command(self, *args, **options):
+        with observe("redis", str(args[0])):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> TimedPipeline:
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def create_redis_client(url: str = REDIS_URL) -> redis.Redis:
+    """공유 연결 풀을 쓰는 비동기 Redis 클라이언트 (명령 호출 시간 기록)"""
+    pool = redis.BlockingConnectionPool.from_url(
+        url,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        decode_responses=True,
+    )
+    return TimedRedis(connection_pool=pool)
+
+
+def server_id(cid: str, wallet: str, stream_url: str) -> str:
+    """(cid, 배포자 지갑, stream_url) 로 결정되는 서버 ID (재등록 시 같은 ID)"""
+    return hashlib.sha1(f"{cid}|{wallet}|{stream_url}".encode()).hexdigest()[:20]
+
+
+def cid_key(cid: str) -> str:
+    return f"{STREAMING_SERVERS_BY_CID}:{cid}"
+
+
+def wallet_cid_key(wallet: str, cid: str) -> str:
+    return f"{STREAMING_SERVERS_BY_ADDRESS}:{wallet}:{cid}"
+
+
+def server_key(sid: str) -> str:
+    return f"{STREAM_SERVER}:{sid}"
+
+
+def wallet_cids_key(wallet: str) -> str:
+    return f"{STREAMING_CIDS_BY_WALLET}:{wallet}"
+
+
+def encode_cursor(member: str) -> str:
+    return base64.urlsafe_b64encode(member.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """커서 토큰 → 마지막으로 반환한 색인 멤버 (잘못된 토큰이면 ValueError)"""
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+def encode_server(server_info: dict) -> dict:
+    return {key: str(value) for key, value in server_info.items() if value is not None}
+
+
+def decode_server(fields: dict) -> dict:
+    server = dict(fields)
+    for key in INT_FIELDS:
+        if key in server:
+            server[key] = int(server[key])
+    for key in FLOAT_FIELDS:
+        if key in server:
+            server[key] = float(server[key])
+    return server
+
+
+class StreamRegistry:
+    """스트리밍 서버 등록 정보 (서버별 Redis 해시 + ID 만 담는 색인 집합)"""
+
+    def __init__(self, client: redis.Redis, lease_ttl: int = LEASE_TTL):
+        self.client = client
+        self._deregister = client.register_script(DEREGISTER_SCRIPT)
+        self._renew = client.register_script(RENEW_SCRIPT)
+        self._sweep = client.register_script(SWEEP_SCRIPT)
+        self.lease_ttl = lease_ttl
+        self.swept = 0
+        self._sweeper: Optional[asyncio.Task] = None
+
+    async def register(self, server_info: dict) -> Tuple[dict, dict]:
+        """서버 등록 (같은 cid/지갑/URL 재등록 시 기존 해시를 갱신) → (서버 정보, 임대)"""
+        sid = server_id(server_info["cid"], server_info["content_distributor_wallet"], server_info["stream_url"])
+        now = int(time.time())
+        server = {**server_info, "server_id": sid, "registered_at": now}
+        lease = {"lease_id": sid, "ttl": self.lease_ttl, "expires_at": now + self.lease_ttl}
+
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(server_key(sid), mapping=encode_server(server))
+            pipe.zadd(STREAM_SERVER_LEASES, {sid: lease["expires_at"]})
+            pipe.sadd(cid_key(server["cid"]), sid)
+            pipe.sadd(wallet_cid_key(server["content_distributor_wallet"], server["cid"]), sid)
+            self._add_indexes(pipe, server["content_distributor_wallet"], server["cid"])
+            await pipe.execute()
+        return server, lease
+
+    async def renew(self, lease_ids: List[str]) -> Tuple[int, List[str]]:
+        """임대 일괄 연장 (스크립트 한 번) → (연장된 수, 이미 만료된 ID)"""
+        if not lease_ids:
+            return 0, []
+        now = int(time.time())
+        renewed, expired = await self._renew(keys=[STREAM_SERVER_LEASES], args=[now, now + self.lease_ttl, *lease_ids])
+        return renewed, expired
+
+    async def sweep_expired(self, batch: int = LEASE_SWEEP_BATCH) -> int:
+        """만료된 임대 정리 (한 번에 batch 개씩, 키스페이스 스캔 없음)"""
+        total = 0
+        while True:
+            removed = await self._sweep(
+                keys=[STREAM_SERVER_LEASES, STREAMING_CIDS, STREAMING_WALLET_CIDS],
+                args=[int(time.time()), batch, f"{STREAM_SERVER}:", f"{STREAMING_SERVERS_BY_CID}:",
+                      f"{STREAMING_SERVERS_BY_ADDRESS}:", f"{STREAMING_CIDS_BY_WALLET}:"],
+            )
+            total += removed
+            if removed < batch:
+                break
+        self.swept += total
+        return total
+
+    async def _run_sweeper(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep_expired()
+            except Exception as e:
+                logger.warning("lease sweep failed: %s", e)
+
+    def start(self, interval: float = LEASE_SWEEP_INTERVAL):
+        if interval > 0 and (self._sweeper is None or self._sweeper.done()):
+            self._sweeper = asyncio.create_task(self._run_sweeper(interval))
+
+    async def stop(self):
+        if self._sweeper is not None and not self._sweeper.done():
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+        self._sweeper = None
+
+    @staticmethod
+    def _add_indexes(pipe, wallet: str, cid: str):
+        pipe.zadd(STREAMING_CIDS, {cid: 0})
+        pipe.zadd(STREAMING_WALLET_CIDS, {f"{wallet}:{cid}": 0})
+        pipe.zadd(wallet_cids_key(wallet), {cid: 0})
+
+    async def fetch_map(self, ids: Iterable[str]) -> Dict[str, dict]:
+        """서버 ID → 서버 정보 (해시 + 임대 만료 시각을 파이프라인 한 번으로 조회, 정리 전 만료된 서버는 제외)"""
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        async with self.client.pipeline(transaction=False) as pipe:
+            for sid in ids:
+                pipe.hgetall(server_key(sid))
+                pipe.zscore(STREAM_SERVER_LEASES, sid)
+            results = await pipe.execute()
+        now = time.time()
+        return {
+            sid: decode_server(fields)
+            for sid, fields, expires_at in zip(ids, results[::2], results[1::2])
+            if fields and (expires_at is None or expires_at >= now)
+        }
+
+    async def fetch(self, ids: Iterable[str]) -> List[dict]:
+        return list((await self.fetch_map(ids)).values())
+
+    async def fetch_sets(self, keys: List[str]) -> Dict[str, List[dict]]:
+        """여러 색인 집합의 서버 목록 (SMEMBERS 파이프라인 + HGETALL 파이프라인, 왕복 2회)"""
+        if not keys:
+            return {}
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.smembers(key)
+            members = dict(zip(keys, await pipe.execute()))
+        servers = await self.fetch_map(sid for ids in members.values() for sid in ids)
+        result = {}
+        for key, ids in members.items():
+            server_list = [servers[sid] for sid in ids if sid in servers]
+            if server_list:
+                result[key] = server_list
+        return result
+
+    async def servers_by_cid(self, cid: str) -> List[dict]:
+        return await self.fetch(await self.client.smembers(cid_key(cid)))
+
+    async def servers_by_wallet_cid(self, wallet: str, cid: str) -> List[dict]:
+        return await self.fetch(await self.client.smembers(wallet_cid_key(wallet, cid)))
+
+    async def page(self, index_key: str, cursor: Optional[str], limit: int) -> Tuple[List[str], Optional[str]]:
+        """사전순 색인 한 페이지와 다음 커서 (마지막 페이지면 None)"""
+        start = f"({decode_cursor(cursor)}" if cursor else "-"
+        members = await self.client.zrangebylex(index_key, start, "+", start=0, num=limit + 1)
+        if len(members) > limit:
+            return members[:limit], encode_cursor(members[limit - 1])
+        return members, None
+
+    async def list_cids(self, cursor: Optional[str], limit: int) -> Tuple[Dict[str, List[dict]], Optional[str]]:
+        """CID 별 서버 목록 (CID 사전순 페이지)"""
+        cids, next_cursor = await self.page(STREAMING_CIDS, cursor, limit)
+        servers = await self.fetch_sets([cid_key(cid) for cid in cids])
+        return {cid: servers[cid_key(cid)] for cid in cids if cid_key(cid) in servers}, next_cursor
+
+    async def list_wallet_cids(self, cursor: Optional[str], limit: int) -> Tuple[Dict[str, List[dict]], Optional[str]]:
+        """지갑+CID 쌍별 서버 목록 (지갑, CID 사전순 페이지)"""
+        pairs, next_cursor = await self.page(STREAMING_WALLET_CIDS, cursor, limit)
+        keys = {pair: f"{STREAMING_SERVERS_BY_ADDRESS}:{pair}" for pair in pairs}
+        servers = await self.fetch_sets(list(keys.values()))
+        return {pair: servers[key] for pair, key in keys.items() if key in servers}, next_cursor
+
+    async def list_wallet(self, wallet: str, cursor: Optional[str], limit: int) -> Tuple[Dict[str, List[dict]], Optional[str]]:
+        """지갑이 등록한 CID 별 서버 목록"""
+        cids, next_cursor = await self.page(wallet_cids_key(wallet), cursor, limit)
+        servers = await self.fetch_sets([wallet_cid_key(wallet, cid) for cid in cids])
+        return {cid: servers[wallet_cid_key(wallet, cid)] for cid in cids if wallet_cid_key(wallet, cid) in servers}, next_cursor
+
+    async def remove(self, cid: str, wallet: str, stream_url: Optional[str] = None) -> List[str]:
+        """지갑이 등록한 서버 제거 (stream_url 이 없으면 해당 CID 의 모든 서버) - Lua 스크립트 한 번으로 원자적 처리"""
+        ids = [server_id(cid, wallet, stream_url)] if stream_url else []
+        return await self._deregister(
+            keys=[cid_key(cid), wallet_cid_key(wallet, cid), STREAMING_CIDS, STREAMING_WALLET_CIDS, wallet_cids_key(wallet), STREAM_SERVER_LEASES],
+            args=[f"{STREAM_SERVER}:", cid, f"{wallet}:{cid}", *ids],
+        )
+
+
+async def migrate_legacy(client: redis.Redis) -> int:
+    """`str(dict)` 를 멤버로 저장하던 기존 색인을 해시 + ID 색인으로 변환 → 새로 변환한 서버 수
+
+    다시 실행해도 안전: 이미 해시가 있는 서버 (CID / 지갑+CID 색인에 함께 있던 같은 서버, 새 형식으로 다시 등록된 서버) 는
+    등록하지 않고 기존 멤버만 제거 (최신 등록 정보 / 임대를 기존 값으로 덮어쓰지 않음)
+    """
+    registry = StreamRegistry(client)
+    migrated = 0
+    for pattern in (f"{STREAMING_SERVERS_BY_CID}:*", f"{STREAMING_SERVERS_BY_ADDRESS}:*"):
+        async for key in client.scan_iter(pattern):
+            for member in await client.smembers(key):
+                if not member.startswith("{"):
+                    continue  # 이미 ID 로 변환된 멤버
+                server_info = ast.literal_eval(member)
+                sid = server_id(server_info["cid"], server_info["content_distributor_wallet"], server_info["stream_url"])
+                if not await client.exists(server_key(sid)):
+                    await registry.register(server_info)
+                    migrated += 1
+                await client.srem(key, member)
+    return migrated
+
+
+async def rebuild_indexes(client: redis.Redis) -> int:
+    """서버 해시로부터 목록 색인과 임대를 다시 생성 (색인/임대 도입 이전에 등록된 서버용)"""
+    rebuilt = 0
+    expires_at = int(time.time()) + LEASE_TTL
+    async with client.pipeline(transaction=False) as pipe:
+        async for key in client.scan_iter(f"{STREAM_SERVER}:*"):
+            cid, wallet = await client.hmget(key, "cid", "content_distributor_wallet")
+            if cid and wallet:
+                StreamRegistry._add_indexes(pipe, wallet, cid)
+                pipe.zadd(STREAM_SERVER_LEASES, {key.split(":", 1)[1]: expires_at}, nx=True)
+                rebuilt += 1
+        await pipe.execute()
+    return rebuilt
+
+
+if __name__ == "__main__":
+    async def main():
+        client = create_redis_client()
+        try:
+            print(f"migrated {await migrate_legacy(client)} legacy registry members")
+            print(f"indexed {await rebuild_indexes(client)} registered servers")
+        finally:
+            await client.aclose()
+            await client.connection_pool.disconnect()
+
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import gateway
+from access_logs import AccessLogQuery, decode_record_cursor, encode_record_cursor
+from db import Database
+from migrations import migrate
+
+
+def make_db(tmp_path, rows):
+    db = Database(str(tmp_path / "records.db"))
+    migrate(db)
+    db.executemany("INSERT INTO streaming_access_logs (cid, provider_wallet, price, timestamp) VALUES (?, ?, ?, ?)", rows)
+    return db
+
+
+def test_cursor_round_trip():
+    assert decode_record_cursor(encode_record_cursor(1735689600, 42)) == (1735689600, 42)
+    with pytest.raises(ValueError):
+        decode_record_cursor("not-a-cursor")
+
+
+def test_pages_cover_range_without_gaps(tmp_path):
+    """같은 timestamp 가 여러 건이어도 (timestamp, id) 커서로 빠짐/중복 없이 이어짐"""
+    db = make_db(tmp_path, [("QmA", "0xp", 0.001, 1735689600 + i // 4) for i in range(103)])
+    query = AccessLogQuery(db, "cid", "QmA")
+
+    seen, cursor = [], None
+    while True:
+        records, cursor = query.page(cursor, 10)
+        seen.extend(records)
+        if cursor is None:
+            break
+        assert len(records) == 10
+
+    assert len(seen) == 103
+    timestamps = [record["timestamp"] for record in seen]
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert [record["timestamp"] for record in query.iter_records(batch=7)] == timestamps
+
+
+def test_date_range_is_inclusive(tmp_path):
+    db = make_db(tmp_path, [
+        ("QmA", "0xp", 0.001, 1735689599),  # 2024-12-31T23:59:59Z
+        ("QmA", "0xp", 0.001, 1735689600),  # 2025-01-01T00:00:00Z
+        ("QmA", "0xp", 0.001, 1735775999),  # 2025-01-01T23:59:59Z
+        ("QmA", "0xp", 0.001, 1735776000),  # 2025-01-02T00:00:00Z
+    ])
+    records, _ = AccessLogQuery(db, "cid", "QmA", "2025-01-01", "2025-01-01").page(None, 10)
+    assert [record["timestamp"] for record in records] == ["2025-01-01T23:59:59Z", "2025-01-01T00:00:00Z"]
+
+
+def test_next_page_seeks_index(tmp_path):
+    """다음 페이지도 인덱스 범위 검색 + 인덱스 순서 그대로 (임시 정렬 없음)"""
+    db = make_db(tmp_path, [("QmA", "0xp", 0.001, 1735689600 + i) for i in range(500)])
+    db.execute("ANALYZE")
+    sql, params = AccessLogQuery(db, "provider_wallet", "0xp", "2025-01-01", "2025-01-31").sql((1735689700, 100), 10)
+    plan = " | ".join(row[3] for row in db.fetchall("EXPLAIN QUERY PLAN " + sql, params))
+    assert "USING INDEX idx_access_logs_provider_timestamp" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_get_records_pagination_and_ndjson():
+    views = [
+        {"cid": "QmPaged", "blockchain_address": f"0x{i}", "provider_wallet": "0xpaged", "creator_wallet": "0xcreator", "price": 0.001, "timestamp": 1735689600 + i}
+        for i in range(25)
+    ]
+    with TestClient(gateway.app) as client:
+        assert client.post("/api/record-views", json=views).status_code == 202
+
+    with TestClient(gateway.app) as client:
+        first = client.get("/api/get-records/cid/QmPaged", params={"limit": 10}).json()
+        assert len(first["records"]) == 10
+        assert first["records"][0]["blockchain_address"] == "0x24"
+        second = client.get("/api/get-records/cid/QmPaged", params={"limit": 10, "cursor": first["next_cursor"]}).json()
+        assert second["records"][0]["blockchain_address"] == "0x14"
+
+        response = client.get("/api/get-records/provider/0xpaged", params={"format": "ndjson", "limit": 4})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["blockchain_address"] for line in lines] == [f"0x{i}" for i in range(24, -1, -1)]
+
+        assert client.get("/api/get-records/cid/QmPaged", params={"cursor": "bad"}).status_code == 400
+        assert client.get("/api/get-records/cid/QmPaged", params={"format": "ndjson", "cursor": "bad"}).status_code == 400
+        assert client.get("/api/get-records/cid/QmMissing", params={"format": "ndjson"}).status_code == 404
+        assert client.get("/api/get-records/cid/QmPaged", params={"start_date": "01/01/2025"}).status_code == 400
@@ -0,0 +1,120 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import gateway
+from content_search import ContentSearch, fts_query
+from db import Database
+from migrations import migrate
+
+INSERT_METADATA = """
+    INSERT INTO content_metadata (cid, video_name, content_creator_wallet, creator_share, provider_share, price)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+def make_db(tmp_path, count=0):
+    db = Database(str(tmp_path / "search.db"))
+    migrate(db)
+    db.executemany(INSERT_METADATA, [
+        (f"Qm{i}", f"{'lobster' if i % 10 == 0 else 'cat'} dance {i}", f"0xcreator{i % 5}", 70, 30, (i % 100) / 1000)
+        for i in range(count)
+    ])
+    return db
+
+
+def cids(records):
+    return [record["cid"] for record in records]
+
+
+def test_fts_query_escapes_syntax():
+    assert fts_query('lob "dan* OR') == '"lob"* "dan"* "OR"*'
+    assert fts_query(' " ') is None
+
+
+def test_triggers_keep_index_in_sync(tmp_path):
+    db = make_db(tmp_path)
+    search = ContentSearch(db)
+    db.execute(INSERT_METADATA, ("QmA", "Lobster Dance", "0xcreator", 70, 30, 0.001))
+    assert cids(search.search("lobster")[0]) == ["QmA"]
+
+    db.execute("UPDATE content_metadata SET video_name = 'Crab Walk' WHERE cid = 'QmA'")
+    assert search.search("lobster")[0] == []
+    assert cids(search.search("crab")[0]) == ["QmA"]
+
+    db.execute("INSERT OR REPLACE INTO content_metadata (cid, video_name) VALUES ('QmA', 'Shrimp Run')")
+    assert search.search("crab")[0] == []
+    assert cids(search.search("shrimp")[0]) == ["QmA"]
+
+    db.execute("DELETE FROM content_metadata WHERE cid = 'QmA'")
+    assert search.search("shrimp")[0] == []
+
+
+def test_existing_rows_are_indexed_by_migration(tmp_path):
+    db = Database(str(tmp_path / "legacy.db"))
+    db.execute("CREATE TABLE content_metadata (id INTEGER PRIMARY KEY AUTOINCREMENT, cid TEXT UNIQUE, video_name TEXT, content_creator_wallet TEXT, creator_share INTEGER, provider_share INTEGER, price REAL)")
+    db.execute(INSERT_METADATA, ("QmOld", "old lobster video", "0xcreator", 70, 30, 0.001))
+    migrate(db)
+    assert cids(ContentSearch(db).search("lobster")[0]) == ["QmOld"]
+
+
+def test_filters_and_pages(tmp_path):
+    search = ContentSearch(make_db(tmp_path, 200))
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = search.search("lob", min_price=0.02, cursor=cursor, limit=3)
+        seen.extend(page)
+        if cursor is None:
+            break
+    expected = [f"Qm{i}" for i in range(199, -1, -1) if i % 10 == 0 and (i % 100) / 1000 >= 0.02]
+    assert cids(seen) == expected
+
+    page, _ = search.search(creator_wallet="0xcreator3", max_price=0.01, limit=100)
+    assert cids(page) == ["Qm108", "Qm103", "Qm8", "Qm3"]
+
+    with pytest.raises(ValueError):
+        search.search(cursor="bad")
+
+
+def test_queries_use_indexes(tmp_path):
+    db = make_db(tmp_path, 500)
+    db.execute("ANALYZE")
+    search = ContentSearch(db)
+
+    def plan(**kwargs):
+        sql, params = search.sql(**kwargs)
+        return " | ".join(row[3] for row in db.fetchall("EXPLAIN QUERY PLAN " + sql, params))
+
+    text = plan(q="lobster", after=300)
+    assert "VIRTUAL TABLE INDEX" in text and "INTEGER PRIMARY KEY" in text
+    assert "USING INDEX idx_content_metadata_creator" in plan(creator_wallet="0xcreator1")
+    for text in (text, plan(creator_wallet="0xcreator1", after=300), plan(min_price=0.01)):
+        assert "TEMP B-TREE" not in text
+
+
+def test_batch_lookup(tmp_path):
+    search = ContentSearch(make_db(tmp_path, 10))
+    found, missing = search.by_cids(["Qm3", "QmNope", "Qm1", "Qm3"])
+    assert cids(found) == ["Qm3", "Qm1"]
+    assert missing == ["QmNope"]
+    with pytest.raises(ValueError):
+        search.by_cids([f"Qm{i}" for i in range(1000)])
+
+
+def test_search_endpoints():
+    gateway.db.executemany(INSERT_METADATA.replace("INSERT", "INSERT OR IGNORE"), [
+        ("QmSearch1", "운영 테스트 walrus", "0xsearch", 70, 30, 0.001),
+        ("QmSearch2", "walrus parade", "0xsearch", 70, 30, 0.005),
+    ])
+    with TestClient(gateway.app) as client:
+        body = client.get("/meta/search", params={"q": "walrus", "limit": 1}).json()
+        assert cids(body["metadata"]) == ["QmSearch2"]
+        body = client.get("/meta/search", params={"q": "walrus", "limit": 1, "cursor": body["next_cursor"]}).json()
+        assert cids(body["metadata"]) == ["QmSearch1"]
+        assert body["next_cursor"] is None
+        assert cids(client.get("/meta/search", params={"q": "운영", "creator_wallet": "0xsearch"}).json()["metadata"]) == ["QmSearch1"]
+        assert client.get("/meta/search", params={"cursor": "bad"}).status_code == 400
+
+        body = client.get("/meta/get_metadata_batch", params={"cids": ["QmSearch2", "QmGone"]}).json()
+        assert cids(body["metadata"]) == ["QmSearch2"]
+        assert body["missing"] == ["QmGone"]
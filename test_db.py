@@ -0,0 +1,105 @@
+import sqlite3
+import asyncio
+import threading
+
+import pytest
+
+import gateway
+from db import Database, get_database
+
+
+def test_connection_pragmas(tmp_path):
+    db = Database(str(tmp_path / "test.db"))
+    conn = db.connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA cache_size").fetchone()[0] < 0
+    # 같은 스레드는 같은 연결 재사용, 경로별 Database 는 공유
+    assert db.connection() is conn
+    assert get_database(str(tmp_path / "shared.db")) is get_database(str(tmp_path / "shared.db"))
+    db.close()
+
+
+def test_readers_not_blocked_by_open_write(tmp_path):
+    """쓰기 트랜잭션이 열려 있어도 다른 스레드의 읽기는 마지막 커밋 상태를 바로 읽음"""
+    db = Database(str(tmp_path / "test.db"), busy_timeout_ms=100, retries=0)
+    db.execute("CREATE TABLE t (v INTEGER)")
+    db.execute("INSERT INTO t VALUES (1)")
+
+    writing, done = threading.Event(), threading.Event()
+
+    def writer(conn):
+        conn.execute("INSERT INTO t VALUES (2)")
+        writing.set()
+        done.wait(5)
+
+    thread = threading.Thread(target=db.write, args=(writer,))
+    thread.start()
+    writing.wait(5)
+    try:
+        assert db.fetchall("SELECT v FROM t") == [(1,)]
+    finally:
+        done.set()
+        thread.join()
+    assert db.fetchall("SELECT v FROM t ORDER BY v") == [(1,), (2,)]
+    db.close()
+
+
+def test_write_retries_while_locked(tmp_path):
+    """busy_timeout 이 지나도 잠겨 있으면 백오프 후 재시도"""
+    path = str(tmp_path / "test.db")
+    db = Database(path, busy_timeout_ms=0, retries=20, backoff=0.01)
+    db.execute("CREATE TABLE t (v INTEGER)")
+
+    other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    timer = threading.Timer(0.2, lambda: other.execute("COMMIT"))
+    timer.start()
+
+    db.execute("INSERT INTO t VALUES (1)")
+    timer.join()
+    other.close()
+    assert db.lock_retries > 0
+    assert db.fetchone("SELECT COUNT(*) FROM t")[0] == 1
+    db.close()
+
+
+def test_write_gives_up_after_retries(tmp_path):
+    path = str(tmp_path / "test.db")
+    db = Database(path, busy_timeout_ms=0, retries=1, backoff=0.01)
+    db.execute("CREATE TABLE t (v INTEGER)")
+
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            db.execute("INSERT INTO t VALUES (1)")
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    db.close()
+
+
+def test_gateway_writes_do_not_block_event_loop():
+    """잠금을 기다리는 메타데이터 쓰기 중에도 이벤트 루프는 다른 작업을 계속 처리"""
+
+    other = sqlite3.connect(gateway.db.path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, lambda: other.execute("COMMIT")).start()
+
+    async def scenario():
+        ticks = 0
+        meta = gateway.ContentMeta(video_name="locked", content_creator_wallet="0x1", creator_share=70,
+                                   provider_share=30, price=0.001, cid="QmLockedInsert")
+        insert = asyncio.create_task(gateway.insert_content_metadata(meta))
+        while not insert.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        await insert
+        return ticks
+
+    try:
+        assert asyncio.run(scenario()) >= 10
+    finally:
+        other.close()
+        gateway.db.execute("DELETE FROM content_metadata WHERE cid = ?", ("QmLockedInsert",))
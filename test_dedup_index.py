@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import gateway
+from test_ingest_jobs import FAKE_CLI, wait_for_job
+
+test_meta = {
+    "video_name": "original",
+    "content_creator_wallet": "0x1234",
+    "creator_share": 70,
+    "provider_share": 30,
+    "price": 0.001
+}
+
+
+def test_reupload_reuses_existing_cid(monkeypatch, tmp_path):
+    """같은 파일을 다른 이름으로 다시 올리면 CLI 호출 없이 기존 CID 반환"""
+    monkeypatch.setattr(gateway, "IPFS_BIN", FAKE_CLI + ["ipfs"])
+    data = os.urandom(8192)
+    before = gateway.content_hashes.stats()
+
+    with TestClient(gateway.app) as client:
+        response = client.post("/upload-content", files={"file": ("first.mov", data)},
+                               data={"json_data": json.dumps(test_meta)})
+        job = wait_for_job(client, response.json()["job_id"])
+        assert job["status"] == "succeeded", job
+        cid = job["result"]["meta"]["cid"]
+
+        # 두 번째 업로드에서 CLI 가 실행되면 실패하도록 설정
+        monkeypatch.setattr(gateway, "IPFS_BIN", [sys.executable, "-c", "raise SystemExit(1)"])
+        response = client.post("/upload-content", files={"file": ("second.mov", data)},
+                               data={"json_data": json.dumps({**test_meta, "video_name": "renamed"})})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["deduplicated"] is True
+        assert body["meta"]["cid"] == cid
+        assert body["meta"]["video_name"] == "original"
+        assert not [name for name in os.listdir(gateway.UPLOAD_PATH) if name.endswith("-second.mov")]
+
+        stats = client.get("/dedup/stats").json()
+        assert stats["hits"] == before["hits"] + 1
+        assert stats["misses"] == before["misses"] + 1
+
+
+def test_referenced_file_is_not_removed(tmp_path):
+    """중복 정리 시 다른 저장소 색인이 가리키는 파일은 지우지 않음"""
+    sha256 = "ab" * 32
+    shared, existing = tmp_path / "shared.mov", tmp_path / "existing.mov"
+    shared.write_bytes(b"x")
+    existing.write_bytes(b"x")
+    gateway.content_hashes.record(sha256, "ipfs", "QmShared", file_path=str(shared), size=1)
+    gateway.content_hashes.record(sha256, "ethstorage", "0xdir:existing.mov", "0xdir", str(existing), 1)
+    gateway.db.execute(
+        "INSERT OR IGNORE INTO content_metadata (cid, video_name, content_creator_wallet, creator_share, provider_share, price) VALUES (?, ?, ?, ?, ?, ?)",
+        ("0xdir:existing.mov", "existing", "0x1234", 70, 30, 0.001),
+    )
+
+    meta = gateway.ContentMeta(**test_meta)
+    response = asyncio.run(gateway.reuse_existing_upload(sha256, str(shared), meta, "ethstorage"))
+    assert response["deduplicated"] is True
+    assert shared.exists()
@@ -0,0 +1,58 @@
+import pytest
+
+import distribute_script
+from distribute_script import ether_to_wei, net_records, net_totals, settle
+
+CREATOR = "0x" + "c" * 40
+PROVIDER_A = "0x" + "a" * 40
+PROVIDER_B = "0x" + "b" * 40
+
+
+def test_records_are_netted_per_wallet_with_content_shares():
+    """같은 지갑은 cid / 대소문자와 무관하게 한 금액으로 합산, 분배 비율은 콘텐츠별 설정"""
+    shares = {"QmA": (80, 20), "QmB": (50, 50)}
+    records = [
+        {"cid": "QmA", "creator_wallet": CREATOR, "provider_wallet": PROVIDER_A, "price": 0.001},
+        {"cid": "QmA", "creator_wallet": CREATOR.upper().replace("0X", "0x"), "provider_wallet": PROVIDER_B, "price": 0.001},
+        {"cid": "QmB", "creator_wallet": CREATOR, "provider_wallet": PROVIDER_A, "price": "0.002"},
+    ] * 100
+
+    payouts = net_records(records, shares.get)
+
+    assert payouts == {
+        CREATOR: 100 * (ether_to_wei(0.0008) * 2 + ether_to_wei(0.001)),
+        PROVIDER_A: 100 * (ether_to_wei(0.0002) + ether_to_wei(0.001)),
+        PROVIDER_B: 100 * ether_to_wei(0.0002),
+    }
+
+
+def test_rollup_totals_are_netted_per_wallet():
+    totals = [
+        {"provider_wallet": PROVIDER_A, "creator_wallet": CREATOR, "creator_wei": str(ether_to_wei("0.7")), "provider_wei": str(ether_to_wei("0.3"))},
+        {"provider_wallet": PROVIDER_B, "creator_wallet": CREATOR, "creator_wei": str(ether_to_wei("0.35")), "provider_wei": str(ether_to_wei("0.15"))},
+        {"provider_wallet": "", "creator_wallet": CREATOR, "creator_wei": str(ether_to_wei("0.1")), "provider_wei": "0"},
+    ]
+    assert net_totals(totals) == {
+        CREATOR: ether_to_wei("1.15"),
+        PROVIDER_A: ether_to_wei("0.3"),
+        PROVIDER_B: ether_to_wei("0.15"),
+    }
+
+
+def test_settle_sends_one_transfer_per_wallet(monkeypatch, tmp_path):
+    pytest.importorskip("eth_tester")
+    from eth_account import Account
+    from web3 import EthereumTesterProvider, Web3
+
+    provider = EthereumTesterProvider()
+    web3 = Web3(provider)
+    monkeypatch.setattr(distribute_script, "web3", web3)
+    monkeypatch.setattr(distribute_script, "_account", Account.from_key(provider.ethereum_tester.backend.account_keys[0]))
+    monkeypatch.setattr(distribute_script, "PAYOUT_LEDGER_PATH", str(tmp_path / "payouts.db"))
+    records = [{"cid": "QmA", "creator_wallet": CREATOR, "provider_wallet": PROVIDER_A, "price": 0.001}] * 1000
+
+    assert settle(net_records(records, lambda cid: (70, 30)), "2025-01") == {"confirmed": 2}
+
+    assert web3.eth.get_transaction_count(distribute_script.get_account().address) == 2
+    assert web3.eth.get_balance(Web3.to_checksum_address(CREATOR)) == ether_to_wei("0.7")
+    assert web3.eth.get_balance(Web3.to_checksum_address(PROVIDER_A)) == ether_to_wei("0.3")
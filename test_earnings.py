@@ -0,0 +1,106 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import gateway
+from db import Database
+from earnings import EarningsRollup
+from migrations import migrate
+from view_log import ViewLogWriter
+
+DAY1 = 1735689600  # 2025-01-01T00:00:00Z
+DAY2 = DAY1 + 86400
+
+
+def make_db(tmp_path):
+    db = Database(str(tmp_path / "earnings.db"))
+    migrate(db)
+    db.execute(
+        "INSERT INTO content_metadata (cid, video_name, content_creator_wallet, creator_share, provider_share, price) VALUES (?, ?, ?, ?, ?, ?)",
+        ("QmShared", "video", "0xcreator", 80, 20, 1.0),
+    )
+    return db
+
+
+def view(cid, provider, timestamp, price=1.0, tx_hash=None):
+    return (cid, "0xviewer", provider, "0xcreator", price, timestamp, tx_hash)
+
+
+def test_flush_updates_rollup_in_same_transaction(tmp_path):
+    db = make_db(tmp_path)
+    rollup = EarningsRollup(db)
+    writer = ViewLogWriter(db, after_insert=rollup.roll_up)
+    writer.submit([view("QmShared", "0xp1", DAY1), view("QmShared", "0xp1", DAY1 + 60), view("QmShared", "0xp2", DAY2)])
+    writer.submit([view("QmPlain", "0xp1", DAY1, price=2.0)])
+    writer.flush()
+
+    assert rollup.last_id() == 4
+    rows = rollup.query({"cid": "QmShared"}, group_by=["day", "provider_wallet"])
+    assert rows == [
+        {"day": "2025-01-01", "provider_wallet": "0xp1", "views": 2, "gross_wei": str(2 * 10 ** 18), "creator_wei": str(16 * 10 ** 17), "provider_wei": str(4 * 10 ** 17)},
+        {"day": "2025-01-02", "provider_wallet": "0xp2", "views": 1, "gross_wei": str(10 ** 18), "creator_wei": str(8 * 10 ** 17), "provider_wei": str(2 * 10 ** 17)},
+    ]
+    # content_metadata 가 없으면 기본 비율 70 / 30
+    (plain,) = rollup.query({"cid": "QmPlain"})
+    assert plain["creator_wei"] == str(14 * 10 ** 17)
+    assert plain["provider_wei"] == str(6 * 10 ** 17)
+
+
+def test_catch_up_resumes_from_high_water_mark(tmp_path):
+    """직접 저장된 기록도 batch 단위로 한 번씩만 집계"""
+    db = make_db(tmp_path)
+    db.executemany(
+        "INSERT INTO streaming_access_logs (cid, blockchain_address, provider_wallet, creator_wallet, price, timestamp, tx_hash) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [view("QmShared", f"0xp{i % 3}", DAY1 + i, price=0.5) for i in range(250)],
+    )
+    rollup = EarningsRollup(db, batch_rows=100)
+    assert rollup.catch_up() == 250
+    assert rollup.catch_up() == 250
+
+    (total,) = rollup.query({}, "2025-01-01", "2025-01-01")
+    assert total["views"] == 250
+    assert total["gross_wei"] == str(125 * 10 ** 18)
+    assert [row["provider_wallet"] for row in rollup.query({"cid": "QmShared"}, group_by=["provider_wallet"])] == ["0xp0", "0xp1", "0xp2"]
+
+
+def test_query_rejects_unknown_fields(tmp_path):
+    rollup = EarningsRollup(make_db(tmp_path))
+    with pytest.raises(ValueError):
+        rollup.query({}, group_by=["price"])
+    assert rollup.query({"cid": "QmNone"}) == [{"views": 0, "gross_wei": "0", "creator_wei": "0", "provider_wei": "0"}]
+
+
+def test_small_prices_sum_without_drift(tmp_path):
+    """0.1 같은 가격을 많이 더해도 wei 정수로 정확히 합산 (float SUM 은 오차, 64비트 정수 범위도 넘음)"""
+    db = make_db(tmp_path)
+    db.executemany(
+        "INSERT INTO streaming_access_logs (cid, blockchain_address, provider_wallet, creator_wallet, price, timestamp, tx_hash) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [view("QmShared", "0xp1", DAY1 + i, price=0.1) for i in range(1000)],
+    )
+    rollup = EarningsRollup(db, batch_rows=300)
+    rollup.catch_up()
+
+    (total,) = rollup.query({"cid": "QmShared"})
+    assert total["gross_wei"] == str(100 * 10 ** 18)
+    assert total["creator_wei"] == str(80 * 10 ** 18)
+    assert total["provider_wei"] == str(20 * 10 ** 18)
+
+
+def test_earnings_endpoint():
+    views = [
+        {"cid": "QmEarn", "blockchain_address": f"0x{i}", "provider_wallet": f"0xearn{i % 2}", "creator_wallet": "0xearncreator", "price": 0.5, "timestamp": DAY1 + i}
+        for i in range(10)
+    ]
+    with TestClient(gateway.app) as client:
+        assert client.post("/api/record-views", json=views).status_code == 202
+
+    with TestClient(gateway.app) as client:
+        response = client.get("/api/earnings", params={"cid": "QmEarn", "group_by": ["provider_wallet"], "start_date": "2025-01-01", "end_date": "2025-01-31"})
+        assert response.status_code == 200
+        rows = response.json()["earnings"]
+        assert [(row["provider_wallet"], row["views"], row["gross_wei"]) for row in rows] == [
+            ("0xearn0", 5, str(25 * 10 ** 17)),
+            ("0xearn1", 5, str(25 * 10 ** 17)),
+        ]
+
+        assert client.get("/api/earnings", params={"group_by": "price"}).status_code == 400
+        assert client.get("/api/earnings", params={"start_date": "2025/01/01"}).status_code == 400
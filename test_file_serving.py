@@ -0,0 +1,79 @@
+import os
+import asyncio
+import hashlib
+
+from fastapi.testclient import TestClient
+
+import gateway
+from file_serving import StreamFileResponse
+from upload_stream import stored_filename
+
+
+def make_segment(cid, data):
+    directory = os.path.join(gateway.STREAM_PATH, cid, "720p")
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "seg_00000.ts"), "wb") as f:
+        f.write(data)
+    gateway.segment_cache.add(cid)
+
+
+def test_range_and_conditional_requests():
+    """Range 요청은 해당 구간만, ETag 일치 시 304"""
+    data = os.urandom(200_000)
+    make_segment("QmRange", data)
+    client = TestClient(gateway.app)
+
+    response = client.get("/stream/QmRange/720p/seg_00000.ts", headers={"Range": "bytes=1000-1999"})
+    assert response.status_code == 206
+    assert response.content == data[1000:2000]
+    assert response.headers["content-range"] == f"bytes 1000-1999/{len(data)}"
+    etag = response.headers["etag"]
+    assert etag == f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+    response = client.get("/stream/QmRange/720p/seg_00000.ts", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # If-Range 가 현재 ETag 와 다르면 전체 응답
+    response = client.get("/stream/QmRange/720p/seg_00000.ts", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == data
+
+
+def test_serves_original_upload(tmp_path):
+    """변환 결과가 없으면 업로드 원본을 CID 로 제공"""
+    data = os.urandom(5000)
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = os.path.join(gateway.UPLOAD_PATH, stored_filename("original.mov", sha256))
+    with open(path, "wb") as f:
+        f.write(data)
+    gateway.content_hashes.record(sha256, "ipfs", "QmOriginal", file_path=path, size=len(data))
+
+    client = TestClient(gateway.app)
+    for name in ("original.mov", os.path.basename(path)):
+        response = client.get(f"/stream/QmOriginal/{name}", headers={"Range": "bytes=-100"})
+        assert response.status_code == 206
+        assert response.content == data[-100:]
+
+
+def test_zerocopy_extension_hands_off_file_descriptor(tmp_path):
+    """서버가 zerocopy 확장을 지원하면 본문 대신 파일 디스크립터/오프셋 전달"""
+    path = tmp_path / "seg.ts"
+    path.write_bytes(b"0123456789")
+    messages = []
+
+    async def send(message):
+        if message["type"] == "http.response.zerocopy":
+            os.lseek(message["file"], message["offset"], os.SEEK_SET)
+            message = {**message, "data": os.read(message["file"], message["count"])}
+        messages.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "extensions": {"http.response.zerocopy": {}},
+        "headers": [(b"range", b"bytes=2-5")],
+    }
+    asyncio.run(StreamFileResponse(str(path))(scope, None, send))
+
+    assert messages[0]["status"] == 206
+    assert messages[1]["type"] == "http.response.zerocopy"
+    assert messages[1]["data"] == b"2345"
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import gateway
+from flat_directory_pool import FlatDirectoryPool
+from upload_stream import original_filename
+from test_ingest_jobs import FAKE_CLI, wait_for_job
+
+SEED = "0x" + "1" * 40
+
+test_meta = {
+    "video_name": "web3 upload",
+    "content_creator_wallet": "0xCreatorA",
+    "creator_share": 70,
+    "provider_share": 30,
+    "price": 0.001
+}
+
+
+def test_pool_assigns_per_wallet_and_refills(tmp_path):
+    """지갑별로 디렉토리를 재사용하고 풀이 부족하면 백그라운드로 보충"""
+    created = []
+
+    async def create_directory():
+        created.append("0x" + f"{len(created) + 2:040x}")
+        return created[-1]
+
+    async def scenario():
+        pool = FlatDirectoryPool(str(tmp_path / "pool.db"), create_directory, min_free=1, target_free=2)
+        pool.init(SEED)
+
+        first = await pool.acquire("0xA")
+        again = await pool.acquire("0xA")
+        await pool._refill_task
+        stats_after_refill = pool.stats()
+        second = await pool.acquire("0xB")
+        await pool.stop()
+        return first, again, second, stats_after_refill
+
+    first, again, second, stats = asyncio.run(scenario())
+    assert first == again == SEED
+    assert second == created[0]  # 미리 만들어 둔 디렉토리를 꺼냄
+    assert stats == {"total": 3, "free": 2, "assigned": 1, "min_free": 1, "target_free": 2}
+
+
+def test_acquire_waits_for_lock_off_event_loop(tmp_path):
+    """다른 연결이 쓰기 잠금을 잡고 있어도 acquire 대기 중에 이벤트 루프는 계속 동작"""
+    path = str(tmp_path / "pool.db")
+
+    async def create_directory():
+        return "0x" + "2" * 40
+
+    pool = FlatDirectoryPool(path, create_directory, min_free=0)
+    pool.init(SEED)
+    other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, lambda: other.execute("COMMIT")).start()
+
+    async def scenario():
+        ticks = 0
+        acquire = asyncio.create_task(pool.acquire("0xLocked"))
+        while not acquire.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return await acquire, ticks
+
+    try:
+        address, ticks = asyncio.run(scenario())
+    finally:
+        other.close()
+    assert address == SEED
+    assert ticks >= 10
+
+
+def test_web3_uploads_reuse_creator_directory(monkeypatch):
+    """같은 크리에이터의 두 번째 업로드는 FlatDirectory 를 새로 만들지 않음"""
+    monkeypatch.setattr(gateway, "ETHFS_BIN", FAKE_CLI + ["ethfs"])
+    monkeypatch.setattr(gateway.flat_directories, "min_free", 0)
+
+    with TestClient(gateway.app) as client:
+        cids = []
+        for name in ("a.mov", "b.mov"):
+            response = client.post("/upload-content-web3", files={"file": (name, os.urandom(2048))},
+                                   data={"json_data": json.dumps({**test_meta, "video_name": name})})
+            assert response.status_code == 202
+            job = wait_for_job(client, response.json()["job_id"])
+            assert job["status"] == "succeeded", job
+            cids.append(job["result"]["meta"]["cid"])
+
+    directory_a, name_a = cids[0].split(":")
+    directory_b, name_b = cids[1].split(":")
+    assert directory_a == directory_b
+    assert (original_filename(name_a), original_filename(name_b)) == ("a.mov", "b.mov")
+    assert job["result"]["web3_url"] == f"web3://{directory_b}/{name_b}"
+
+
+def test_web3_upload_refuses_existing_name(monkeypatch, tmp_path):
+    """같은 FlatDirectory 에 같은 이름이 이미 있으면 ethfs upload 전에 실패 (기존 파일을 덮어쓰지 않음)"""
+    monkeypatch.setattr(gateway, "ETHFS_BIN", [sys.executable, "-c", "raise SystemExit('ethfs upload must not run')"])
+    path = tmp_path / "clash.mov"
+    path.write_bytes(b"new content")
+    gateway.content_hashes.record("cd" * 32, "ethstorage", "0xclash:clash.mov", "0xclash", None, 3)
+
+    job = gateway.Job("upload:ethstorage", None)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(gateway.store_to_ethstorage(str(path), "0xcreator", job, {"flat_directory": "0xclash"}))
+    assert error.value.status_code == 409
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import gateway
+from ingest_jobs import JobQueue, run_command
+
+FAKE_CLI = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_cli.py")]
+
+test_meta = {
+    "video_name": "lobster dance",
+    "content_creator_wallet": "0x1234",
+    "creator_share": 70,
+    "provider_share": 30,
+    "price": 0.001
+}
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_queue_retries_failed_command(tmp_path, monkeypatch):
+    """CLI 실패 시 백오프 후 재시도"""
+    fail_file = tmp_path / "fail"
+    fail_file.write_text("2")
+    monkeypatch.setenv("FAKE_CLI_FAIL_FILE", str(fail_file))
+    source = tmp_path / "clip.mov"
+    source.write_bytes(b"video")
+
+    async def scenario():
+        queue = JobQueue(workers=1, max_retries=2, retry_backoff=0.01)
+        await queue.start()
+        job = queue.submit("test", lambda job: run_command(FAKE_CLI + ["ipfs", "add", "-r", "--quieter", str(source)]))
+        await queue.join()
+        await queue.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == "succeeded"
+    assert job.attempts == 3
+    assert job.result.startswith("Qm")
+
+
+def test_job_queue_limits_concurrency():
+    """워커 수 이상으로 동시에 실행되지 않음"""
+    running = {"now": 0, "max": 0}
+
+    async def handler(job):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+
+    async def scenario():
+        queue = JobQueue(workers=2)
+        await queue.start()
+        jobs = [queue.submit("test", handler) for _ in range(10)]
+        await queue.join()
+        await queue.stop()
+        return jobs
+
+    jobs = asyncio.run(scenario())
+    assert all(job.status == "succeeded" for job in jobs)
+    assert running["max"] == 2
+
+
+def test_upload_content_returns_job(monkeypatch):
+    """업로드 요청은 즉시 job_id 를 반환하고 백그라운드에서 IPFS 저장 및 메타데이터 기록"""
+    monkeypatch.setattr(gateway, "IPFS_BIN", FAKE_CLI + ["ipfs"])
+
+    with TestClient(gateway.app) as client:
+        response = client.post(
+            "/upload-content",
+            files={"file": ("ingest.mov", os.urandom(4096))},
+            data={"json_data": json.dumps(test_meta)},
+        )
+        assert response.status_code == 202
+        assert client.get(f"/jobs/{response.json()['job_id']}").json()["progress"]["upload"] == 1.0
+
+        job = wait_for_job(client, response.json()["job_id"])
+        assert job["status"] == "succeeded", job
+        assert job["progress"] == {"upload": 1.0, "ipfs": 1.0, "metadata": 1.0}
+        cid = job["result"]["meta"]["cid"]
+
+        response = client.get(f"/meta/get_metadata/{cid}")
+        assert response.status_code == 200
+        assert response.json()["video_name"] == "lobster dance"
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import asyncio
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+from fastapi.testclient import TestClient
+
+import gateway
+from test_ingest_jobs import wait_for_job
+from ipfs_client import IPFSClient, IPFSError, ipfs_add_args
+
+FAKE_CLI = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_cli.py")]
+
+test_meta = {
+    "video_name": "ipfs api upload",
+    "content_creator_wallet": "0x1234",
+    "creator_share": 70,
+    "provider_share": 30,
+    "price": 0.001
+}
+
+
+class StubIPFSHandler(BaseHTTPRequestHandler):
+    """Kubo /api/v0/add 를 흉내내는 로컬 스텁"""
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self._read_body()
+        boundary = self.headers["Content-Type"].split("boundary=")[1].encode()
+        content = body.split(b"\r\n\r\n", 1)[1].rsplit(b"\r\n--" + boundary + b"--", 1)[0]
+        StubIPFSHandler.requests.append({"path": url.path, "params": parse_qs(url.query), "content": content})
+
+        if url.path != "/api/v0/add":
+            self.send_response(404)
+            self.end_headers()
+            return
+        payload = json.dumps({"Name": "file", "Hash": "Qm" + hashlib.sha256(content).hexdigest()[:44], "Size": str(len(content))})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(payload.encode() + b"\n")
+
+
+@pytest.fixture
+def ipfs_stub():
+    StubIPFSHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubIPFSHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_add_file_streams_with_options(ipfs_stub, tmp_path):
+    """청커/raw-leaves 옵션 전달 및 응답에서 CID 추출"""
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    source = tmp_path / "clip.mov"
+    source.write_bytes(data)
+
+    async def scenario():
+        client = IPFSClient(ipfs_stub, chunker="size-1048576", raw_leaves=True)
+        try:
+            return await client.add_file(str(source))
+        finally:
+            await client.aclose()
+
+    cid = asyncio.run(scenario())
+    assert cid == "Qm" + hashlib.sha256(data).hexdigest()[:44]
+    request = StubIPFSHandler.requests[-1]
+    assert request["content"] == data
+    assert request["params"]["chunker"] == ["size-1048576"]
+    assert request["params"]["raw-leaves"] == ["true"]
+
+
+def test_add_file_raises_on_error(ipfs_stub, tmp_path):
+    """API 오류는 IPFSError 로 변환"""
+    source = tmp_path / "clip.mov"
+    source.write_bytes(b"x")
+
+    async def scenario():
+        client = IPFSClient(ipfs_stub + "/missing")
+        try:
+            await client.add_file(str(source))
+        finally:
+            await client.aclose()
+
+    with pytest.raises(IPFSError):
+        asyncio.run(scenario())
+
+
+def test_upload_content_streams_to_ipfs_api(ipfs_stub, monkeypatch):
+    """HTTP API 가 설정되면 업로드를 바로 전송하고 CID 반환"""
+    monkeypatch.setattr(gateway, "ipfs_client", IPFSClient(ipfs_stub))
+    data = os.urandom(2 * 1024 * 1024)
+
+    with TestClient(gateway.app) as client:
+        response = client.post(
+            "/upload-content",
+            files={"file": ("api.mov", data)},
+            data={"json_data": json.dumps(test_meta)},
+        )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["meta"]["cid"] == "Qm" + hashlib.sha256(data).hexdigest()[:44]
+    assert body["sha256"] == hashlib.sha256(data).hexdigest()
+    assert not os.path.exists(os.path.join(gateway.UPLOAD_PATH, "api.mov"))
+
+
+def test_upload_content_falls_back_to_cli(monkeypatch):
+    """HTTP API 에 연결할 수 없으면 CLI 작업으로 대체"""
+    monkeypatch.setattr(gateway, "ipfs_client", IPFSClient("http://127.0.0.1:1"))
+    monkeypatch.setattr(gateway, "IPFS_BIN", FAKE_CLI + ["ipfs"])
+
+    with TestClient(gateway.app) as client:
+        response = client.post(
+            "/upload-content",
+            files={"file": ("fallback.mov", os.urandom(1024))},
+            data={"json_data": json.dumps({**test_meta, "video_name": "fallback"})},
+        )
+        assert response.status_code == 202
+        job = wait_for_job(client, response.json()["job_id"])
+
+    assert job["status"] == "succeeded", job
+
+
+def test_cli_fallback_uses_same_add_options(monkeypatch, tmp_path):
+    """CLI 대체 경로도 HTTP API 와 같은 chunker / raw-leaves / cid-version 으로 추가"""
+    assert ipfs_add_args("size-1048576", False, "1") == ["--chunker=size-1048576", "--raw-leaves=false", "--cid-version=1"]
+    assert ipfs_add_args("size-262144", True, "") == ["--chunker=size-262144", "--raw-leaves=true"]
+
+    calls = []
+
+    async def fake_run_command(args):
+        calls.append(args)
+        return "QmFallback\n"
+
+    source = tmp_path / "a.mov"
+    source.write_bytes(b"x")
+    monkeypatch.setattr(gateway, "ipfs_client", None)
+    monkeypatch.setattr(gateway, "run_command", fake_run_command)
+    assert asyncio.run(gateway.store_to_ipfs(str(source))) == "QmFallback"
+    assert calls[0][-1] == str(source)
+    assert all(option in calls[0] for option in ipfs_add_args())
@@ -0,0 +1,134 @@
+import time
+import asyncio
+import threading
+
+import redis.asyncio as aioredis
+from fastapi.testclient import TestClient
+
+import gateway
+from metadata_cache import LocalTTLCache, MetadataCache, make_entry, metadata_key, redis_key
+from test_stream_registry import REDIS_TEST_URL, redis_db  # noqa: F401
+
+
+def test_local_cache_evicts_lru_and_expires():
+    cache = LocalTTLCache(max_entries=2, ttl=0.05)
+    cache.set("a", make_entry({"v": 1}))
+    cache.set("b", make_entry({"v": 2}))
+    assert cache.get("a") is not None  # a 를 최근 사용으로
+    cache.set("c", make_entry({"v": 3}))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_redis_tier_is_shared_and_invalidated(redis_db):
+    """다른 워커(인스턴스)는 Redis 에서 읽고, 무효화는 모든 워커의 로컬 캐시에서 제거"""
+    async def scenario():
+        clients = [aioredis.Redis.from_url(REDIS_TEST_URL, decode_responses=True) for _ in range(2)]
+        first, second = (MetadataCache(client) for client in clients)
+        second.start()
+        await asyncio.sleep(0.1)  # 구독 시작 대기
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return {"cid": "QmCached", "price": 0.001 * len(loads)}
+
+        try:
+            entry = await first.get(metadata_key("QmCached"), loader)
+            assert await first.get(metadata_key("QmCached"), loader) == entry
+            assert await second.get(metadata_key("QmCached"), loader) == entry
+            assert len(loads) == 1
+            assert (first.local_hits, first.misses, second.redis_hits) == (1, 1, 1)
+
+            await first.invalidate("QmCached")
+            await asyncio.sleep(0.1)
+            assert second.local.get(metadata_key("QmCached")) is None
+            updated = await second.get(metadata_key("QmCached"), loader)
+            assert updated[0] != entry[0]
+            assert len(loads) == 2
+        finally:
+            await second.stop()
+            for client in clients:
+                await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_stale_load_is_not_written_back(redis_db):
+    """로드 도중 다른 워커가 무효화하면 (pub/sub 도착 전이라도) 오래된 값을 Redis 에 다시 올리지 않음"""
+    async def scenario():
+        clients = [aioredis.Redis.from_url(REDIS_TEST_URL, decode_responses=True) for _ in range(2)]
+        reader, writer = (MetadataCache(client) for client in clients)
+        started, release = threading.Event(), threading.Event()
+
+        def stale_loader():
+            started.set()
+            release.wait(5)
+            return {"cid": "QmRace", "price": 1}
+
+        try:
+            loading = asyncio.create_task(reader.get(metadata_key("QmRace"), stale_loader))
+            await asyncio.to_thread(started.wait, 5)
+            await writer.invalidate("QmRace")  # reader 는 구독하지 않으므로 메시지를 받지 못함
+            release.set()
+            await loading
+
+            assert await clients[0].exists(redis_key(metadata_key("QmRace"))) == 0
+            assert reader.local.get(metadata_key("QmRace")) is None
+            assert reader.stats()["stale_writes"] == 1
+
+            fresh = await reader.get(metadata_key("QmRace"), lambda: {"cid": "QmRace", "price": 2})
+            assert await writer.get(metadata_key("QmRace"), stale_loader) == fresh
+        finally:
+            release.set()
+            for client in clients:
+                await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_misses_load_once():
+    async def scenario():
+        client = aioredis.Redis.from_url("redis://127.0.0.1:1/0", decode_responses=True)
+        cache = MetadataCache(client)
+        loads = []
+
+        def loader():
+            loads.append(1)
+            time.sleep(0.05)
+            return {"cid": "QmBusy"}
+
+        try:
+            entries = await asyncio.gather(*(cache.get(metadata_key("QmBusy"), loader) for _ in range(10)))
+        finally:
+            await client.aclose()
+        assert len(set(entries)) == 1
+        assert len(loads) == 1
+        assert cache.redis_errors > 0  # Redis 가 없어도 DB 로 응답
+
+    asyncio.run(scenario())
+
+
+def test_metadata_etag_not_modified():
+    gateway.db.execute(
+        "INSERT OR REPLACE INTO content_metadata (cid, video_name, content_creator_wallet, creator_share, provider_share, price) VALUES (?, ?, ?, ?, ?, ?)",
+        ("QmEtag", "etag video", "0xcreator", 60, 40, 0.002),
+    )
+    with TestClient(gateway.app) as client:
+        response = client.get("/meta/get_metadata/QmEtag")
+        assert response.status_code == 200
+        assert response.json()["creator_share"] == 60
+        etag = response.headers["etag"]
+
+        response = client.get("/meta/get_metadata/QmEtag", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+        assert client.get("/meta/get_metadata/QmMissingMeta").status_code == 404
+        assert any(row["cid"] == "QmEtag" for row in client.get("/meta/get_all_metadata").json()["metadata"])
+        stats = client.get("/meta/cache/stats").json()
+        assert stats["not_modified"] >= 1
+        assert stats["local_hits"] >= 1
@@ -0,0 +1,95 @@
+import sys
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import gateway
+from db import Database
+from ingest_jobs import IPFS_BIN, command_label, run_command
+from metrics import observe
+from profiling import ProfilingMiddleware
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_route_template_labels():
+    """경로 매개변수 대신 라우트 템플릿으로 집계, 없는 경로는 unmatched 하나로"""
+    route = "/meta/get_metadata/{cid}"
+    before = sample("gateway_http_request_duration_seconds_count", method="GET", route=route)
+    with TestClient(gateway.app) as client:
+        for cid in ("QmMetricsA", "QmMetricsB"):
+            client.get(f"/meta/get_metadata/{cid}")
+        client.get("/no/such/path")
+        body = client.get("/metrics").text
+
+    assert sample("gateway_http_request_duration_seconds_count", method="GET", route=route) == before + 2
+    assert sample("gateway_http_requests_total", method="GET", route="unmatched", status="404") >= 1
+    assert 'gateway_http_requests_in_progress{method="GET",route="/metrics"} 1.0' in body
+    assert "QmMetricsA" not in body
+
+
+def test_observe_counts_errors():
+    with observe("test", "ok"):
+        pass
+    with pytest.raises(ValueError):
+        with observe("test", "fail"):
+            raise ValueError("boom")
+
+    assert sample("gateway_dependency_duration_seconds_count", dependency="test", operation="ok") == 1
+    assert sample("gateway_dependency_errors_total", dependency="test", operation="fail") == 1
+    assert sample("gateway_dependency_errors_total", dependency="test", operation="ok") == 0
+
+
+def test_sqlite_and_subprocess_timings(tmp_path):
+    before = {
+        operation: sample("gateway_dependency_duration_seconds_count", dependency="sqlite", operation=operation)
+        for operation in ("read", "write")
+    }
+    db = Database(str(tmp_path / "metrics.db"))
+    db.execute("CREATE TABLE t (x INTEGER)")
+    db.fetchall("SELECT x FROM t")
+    db.close()
+    for operation in ("read", "write"):
+        assert sample("gateway_dependency_duration_seconds_count", dependency="sqlite", operation=operation) == before[operation] + 1
+
+    asyncio.run(run_command([sys.executable, "-c", "print('ok')"]))
+    label = command_label([sys.executable])
+    assert sample("gateway_dependency_duration_seconds_count", dependency="subprocess", operation=label) >= 1
+
+
+def test_command_label_hides_arguments():
+    assert command_label(IPFS_BIN + ["add", "-r", "--quieter", "/secret/path.mp4"]) == "ipfs add"
+    assert command_label(["/usr/bin/ffmpeg", "-i", "x"]) == "ffmpeg"
+
+
+def test_profiling_header(tmp_path):
+    app = ProfilingMiddleware(gateway.app, enabled=True, token="secret", output_dir=str(tmp_path))
+    with TestClient(app) as client:
+        assert "x-profile-file" not in client.get("/dedup/stats").headers
+        assert "x-profile-file" not in client.get("/dedup/stats", headers={"X-Profile": "wrong"}).headers
+        response = client.get("/dedup/stats", headers={"X-Profile": "secret"})
+
+    filename = response.headers["x-profile-file"]
+    assert filename.endswith("-GET-dedup_stats.html")
+    assert (tmp_path / filename).read_text().startswith("<!DOCTYPE html>")
+    assert app.profiled == 1
+
+
+def test_profiling_requires_token_and_rotates(tmp_path):
+    """토큰이 없으면 헤더로 프로파일링하지 않고, 저장 파일 수는 max_files 로 제한"""
+    app = ProfilingMiddleware(gateway.app, enabled=True, token="", output_dir=str(tmp_path))
+    with TestClient(app) as client:
+        assert "x-profile-file" not in client.get("/dedup/stats", headers={"X-Profile": "1"}).headers
+    assert app.profiled == 0
+
+    app = ProfilingMiddleware(gateway.app, enabled=True, token="secret", output_dir=str(tmp_path), max_files=2)
+    with TestClient(app) as client:
+        filenames = [client.get("/dedup/stats", headers={"X-Profile": "secret"}).headers["x-profile-file"] for _ in range(4)]
+
+    assert app.profiled == 4
+    assert len(list(tmp_path.iterdir())) == 2
+    assert (tmp_path / filenames[-1]).exists()
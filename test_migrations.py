@@ -0,0 +1,103 @@
+from db import Database, to_epoch, to_iso
+from migrations import MIGRATIONS, migrate, schema_version
+
+
+def query_plan(db: Database, sql: str, params=()) -> str:
+    return " | ".join(row[3] for row in db.fetchall("EXPLAIN QUERY PLAN " + sql, params))
+
+
+def test_fresh_database_reaches_latest_version(tmp_path):
+    db = Database(str(tmp_path / "fresh.db"))
+    assert migrate(db) == len(MIGRATIONS)
+    # 다시 실행해도 아무것도 바뀌지 않음
+    assert migrate(db) == len(MIGRATIONS)
+
+    indexes = {row[1] for row in db.fetchall("PRAGMA index_list(streaming_access_logs)")}
+    assert {"idx_access_logs_cid_timestamp", "idx_access_logs_provider_timestamp"} <= indexes
+
+    db.execute("INSERT INTO streaming_access_logs (cid) VALUES ('QmNow')")
+    assert db.fetchone("SELECT typeof(timestamp) FROM streaming_access_logs")[0] == "integer"
+
+
+def test_legacy_string_timestamps_are_converted(tmp_path):
+    """기존 DB (user_version 0, provider_wallet/price 없음, 문자열 timestamp) 변환"""
+    db = Database(str(tmp_path / "legacy.db"))
+    db.execute("""
+        CREATE TABLE streaming_access_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, cid TEXT, blockchain_address TEXT,
+            creator_wallet TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    db.executemany(
+        "INSERT INTO streaming_access_logs (cid, blockchain_address, creator_wallet, timestamp) VALUES (?, ?, ?, ?)",
+        [
+            ("QmA", "0xviewer", "0xcreator", "2025-01-01 00:00:00"),
+            ("QmB", "0xviewer", "0xcreator", "2025-01-01T09:00:00+09:00"),
+            ("QmC", "0xviewer", "0xcreator", "1735689600"),
+            ("QmD", "0xviewer", "0xcreator", "not a date"),
+            ("QmE", "0xviewer", "0xcreator", "2025-01-01T00:00:00Z"),
+        ],
+    )
+
+    migrate(db)
+
+    assert schema_version(db) == len(MIGRATIONS)
+    rows = db.fetchall("SELECT cid, timestamp, provider_wallet, price FROM streaming_access_logs ORDER BY id")
+    assert rows == [
+        ("QmA", 1735689600, None, None),
+        ("QmB", 1735689600, None, None),
+        ("QmC", 1735689600, None, None),
+        ("QmD", "not a date", None, None),  # 0 으로 덮어쓰지 않음
+        ("QmE", 1735689600, None, None),
+    ]
+    assert to_iso(rows[0][1]) == "2025-01-01T00:00:00Z"
+
+
+def test_to_epoch_accepts_z_suffix():
+    """Python 3.10 에서도 'Z' / 'z' 접미사를 UTC 로 해석"""
+    assert to_epoch("2025-01-01T00:00:00Z") == to_epoch("2025-01-01T00:00:00z") == 1735689600
+    assert to_epoch("2025-01-01T00:00:00.500Z") == 1735689600
+    assert to_epoch("Z") is None
+
+
+def test_range_queries_use_composite_indexes(tmp_path):
+    """cid / provider_wallet + 기간 + 최신순 정렬이 인덱스만으로 처리됨 (전체 스캔, 임시 정렬 없음)"""
+    db = Database(str(tmp_path / "plan.db"))
+    migrate(db)
+    db.executemany(
+        "INSERT INTO streaming_access_logs (cid, provider_wallet, timestamp) VALUES (?, ?, ?)",
+        [(f"Qm{i % 50}", f"0xprovider{i % 7}", 1735689600 + i) for i in range(2000)],
+    )
+    db.execute("ANALYZE")
+
+    for column, index in (("cid", "idx_access_logs_cid_timestamp"), ("provider_wallet", "idx_access_logs_provider_timestamp")):
+        plan = query_plan(
+            db,
+            f"SELECT * FROM streaming_access_logs WHERE {column} = ? AND timestamp >= ? AND timestamp <= ? ORDER BY timestamp DESC",
+            ("x", to_epoch("2025-01-01T00:00:00Z"), to_epoch("2025-01-31T23:59:59Z")),
+        )
+        assert f"USING INDEX {index}" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_earnings_amounts_are_converted_to_wei(tmp_path):
+    """버전 6 의 REAL(이더) 집계 → wei 정수 문자열"""
+    db = Database(str(tmp_path / "earnings.db"))
+
+    def apply_until_earnings_wei(conn):
+        for migration in MIGRATIONS[:6]:
+            migration(conn)
+        conn.execute("PRAGMA user_version = 6")
+
+    db.write(apply_until_earnings_wei)
+    db.execute(
+        "INSERT INTO earnings_daily (cid, day, provider_wallet, creator_wallet, views, gross, creator_amount, provider_amount) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ("QmOld", "2025-01-01", "0xp", "0xc", 3, 0.3, 0.21, 0.09),
+    )
+    migrate(db)
+
+    assert db.fetchone("SELECT views, gross_wei, creator_wei, provider_wei FROM earnings_daily") == (
+        3, str(3 * 10 ** 17), str(21 * 10 ** 16), str(9 * 10 ** 16),
+    )
+    indexes = {row[1] for row in db.fetchall("PRAGMA index_list(earnings_daily)")}
+    assert {"idx_earnings_provider_day", "idx_earnings_creator_day"} <= indexes
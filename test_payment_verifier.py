@@ -0,0 +1,201 @@
+import time
+
+import pytest
+
+pytest.importorskip("eth_tester")
+
+from fastapi.testclient import TestClient
+from web3 import EthereumTesterProvider, Web3
+
+import gateway
+from db import Database
+from earnings import EarningsRollup
+from migrations import migrate
+from payment_verifier import PaymentVerifier, rpc_batch
+from view_log import ViewLogWriter
+
+PRICE = 0.001
+PRICE_WEI = Web3.to_wei(PRICE, "ether")
+
+
+class BatchingTesterProvider(EthereumTesterProvider):
+    """JSON-RPC batch 를 받는 로컬 개발 체인 (batch 한 번 = RPC 왕복 한 번으로 기록)"""
+
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+        self.web3 = None
+
+    def make_batch_request(self, calls):
+        self.batch_sizes.append(len(calls))
+        request = self.request_func(self.web3, self.web3.middleware_onion)
+        return [request(method, params) for method, params in calls]
+
+
+@pytest.fixture
+def chain():
+    provider = BatchingTesterProvider()
+    web3 = provider.web3 = Web3(provider)
+    viewer, receiver, other = web3.eth.accounts[1:4]
+    return web3, provider, viewer, receiver, other
+
+
+def pay(web3, sender, to, value):
+    return web3.eth.send_transaction({"from": sender, "to": to, "value": value}).to_0x_hex()
+
+
+def make_db(tmp_path):
+    db = Database(str(tmp_path / "payments.db"))
+    migrate(db)
+    return db
+
+
+def view(viewer, tx_hash, timestamp=None, price=PRICE, cid="QmPaid"):
+    return (cid, viewer, "0xprovider", "0xcreator", price, timestamp or int(time.time()), tx_hash)
+
+
+def store(db, rows, rollup=None):
+    writer = ViewLogWriter(db, after_insert=rollup.roll_up if rollup else None)
+    writer.submit(rows)
+    writer.flush()
+
+
+def verified(db):
+    return db.fetchall("SELECT verified, verify_error FROM streaming_access_logs ORDER BY id")
+
+
+def test_rpc_batch_keeps_order_and_missing_results(chain):
+    web3, provider, viewer, receiver, _ = chain
+    tx_hash = pay(web3, viewer, receiver, PRICE_WEI)
+    results = rpc_batch(web3, [("eth_getTransactionReceipt", ["0x" + "00" * 32]), ("eth_getTransactionReceipt", [tx_hash]), ("eth_blockNumber", [])])
+
+    assert provider.batch_sizes == [3]
+    assert results[0] is None
+    assert results[1]["status"] == 1
+    assert results[2] == results[1]["blockNumber"]
+
+
+def test_hundreds_of_views_in_one_round_trip(chain, tmp_path):
+    """검증 대기 기록 200건 (트랜잭션 50개) 을 RPC 왕복 한 번으로 확인"""
+    web3, provider, viewer, receiver, _ = chain
+    db = make_db(tmp_path)
+    rows = []
+    for _ in range(50):
+        tx_hash = pay(web3, viewer, receiver, 4 * PRICE_WEI)
+        rows.extend(view(viewer, tx_hash) for _ in range(4))
+    store(db, rows)
+
+    verifier = PaymentVerifier(db, web3, receiver, batch_size=200, min_confirmations=1)
+    assert verifier.verify_pending() == 200
+    assert provider.batch_sizes == [1 + 2 * 50]
+    assert verified(db) == [(1, None)] * 200
+    assert verifier.stats()["pending"] == 0
+
+
+def test_invalid_payments_are_rejected(chain, tmp_path):
+    web3, provider, viewer, receiver, other = chain
+    db = make_db(tmp_path)
+    paid = pay(web3, viewer, receiver, 2 * PRICE_WEI)
+    elsewhere = pay(web3, viewer, other, PRICE_WEI)
+    unknown = "0x" + "ab" * 32
+    store(db, [
+        view(viewer, paid),
+        view(viewer, paid),
+        view(viewer, paid),  # 송금액을 넘는 세 번째 기록
+        view(other, paid),  # 다른 지갑의 트랜잭션
+        view(viewer, elsewhere),
+        view(viewer, unknown),  # 아직 블록에 없을 수 있으므로 대기
+        view(viewer, unknown, timestamp=int(time.time()) - 2 * 86400),
+    ])
+
+    verifier = PaymentVerifier(db, web3, receiver, min_confirmations=1)
+    assert verifier.verify_pending() == 6
+    assert verified(db) == [
+        (1, None),
+        (1, None),
+        (0, "insufficient payment"),
+        (0, "sender mismatch"),
+        (0, "wrong recipient"),
+        (None, None),
+        (0, "transaction not found"),
+    ]
+
+
+def test_waits_for_confirmations_then_caches(chain, tmp_path):
+    web3, provider, viewer, receiver, _ = chain
+    db = make_db(tmp_path)
+    tx_hash = pay(web3, viewer, receiver, 10 * PRICE_WEI)
+    store(db, [view(viewer, tx_hash)])
+
+    verifier = PaymentVerifier(db, web3, receiver, min_confirmations=3)
+    assert verifier.verify_pending() == 0
+    assert verified(db) == [(None, None)]
+
+    provider.ethereum_tester.mine_blocks(2)
+    assert verifier.verify_pending() == 1
+    assert verified(db) == [(1, None)]
+
+    # 같은 트랜잭션을 쓰는 다음 기록은 RPC 없이 캐시로 판단
+    store(db, [view(viewer, tx_hash)])
+    assert verifier.verify_pending() == 1
+    assert len(provider.batch_sizes) == 2
+    assert verifier.cache_hits == 1
+
+
+def test_only_verified_views_are_rolled_up(chain, tmp_path):
+    """결제 확인 전에는 수익 집계에 없고, 확인된 기록만 한 번씩 더해짐 (거부 / tx_hash 없는 기록은 정산되지 않음)"""
+    web3, provider, viewer, receiver, other = chain
+    db = make_db(tmp_path)
+    rollup = EarningsRollup(db, require_payment=True)
+    paid = pay(web3, viewer, receiver, 2 * PRICE_WEI)
+    elsewhere = pay(web3, viewer, other, PRICE_WEI)
+    store(db, [view(viewer, paid), view(viewer, elsewhere), view(viewer, None)], rollup)
+    assert rollup.query({"cid": "QmPaid"})[0]["views"] == 0
+
+    verifier = PaymentVerifier(db, web3, receiver, min_confirmations=1, after_verify=rollup.add_verified)
+    assert verifier.verify_pending() == 2
+    assert rollup.query({"cid": "QmPaid"})[0]["views"] == 1
+
+    # mark 가 지나가기 전에 확인된 기록은 roll_up 이 집계 (add_verified 와 중복 없음)
+    store(db, [view(viewer, paid)])
+    assert verifier.verify_pending() == 1
+    assert rollup.query({"cid": "QmPaid"})[0]["views"] == 1
+    db.write(rollup.roll_up)
+    (total,) = rollup.query({"cid": "QmPaid"})
+    assert total["views"] == 2
+    assert total["gross_wei"] == str(2 * PRICE_WEI)
+
+
+def test_record_view_accepts_tx_hash():
+    record = {
+        "cid": "QmTxHash",
+        "blockchain_address": "0xpayer",
+        "provider_wallet": "0xprovider",
+        "creator_wallet": "0xcreator",
+        "price": PRICE,
+        "timestamp": 1735689600,
+        "tx_hash": "0x" + "AB" * 32,
+    }
+    with TestClient(gateway.app) as client:
+        assert client.post("/api/record-view", json={**record, "tx_hash": "0x1234"}).status_code == 422
+        assert client.post("/api/record-view", json=record).status_code == 202
+
+    with TestClient(gateway.app) as client:
+        (stored,) = client.get("/api/get-records/cid/QmTxHash").json()["records"]
+        assert stored["tx_hash"] == "0x" + "ab" * 32
+        assert stored["verified"] is None
+
+
+def test_record_view_requires_tx_hash_when_verifying(monkeypatch):
+    monkeypatch.setattr(gateway, "PAYMENT_RECEIVER_ADDRESS", "0x" + "11" * 20)
+    record = {
+        "cid": "QmUnpaid",
+        "blockchain_address": "0xpayer",
+        "provider_wallet": "0xprovider",
+        "creator_wallet": "0xcreator",
+        "price": PRICE,
+        "timestamp": 1735689600,
+    }
+    with TestClient(gateway.app) as client:
+        assert client.post("/api/record-view", json=record).status_code == 422
+        assert client.post("/api/record-views", json=[record]).status_code == 422
@@ -0,0 +1,207 @@
+import pytest
+
+pytest.importorskip("eth_tester")
+
+from eth_account import Account
+from web3 import EthereumTesterProvider, Web3
+
+from payouts import CONFIRMED, PENDING, SIGNED, SUBMITTED, NonceManager, PayoutLedger, PayoutRunner, bump_fees, estimate_fees
+
+
+class Interrupted(BaseException):
+    """전송 직전 프로세스 중단 흉내"""
+
+
+@pytest.fixture
+def chain():
+    provider = EthereumTesterProvider()
+    web3 = Web3(provider)
+    account = Account.from_key(provider.ethereum_tester.backend.account_keys[0])
+    return web3, account
+
+
+def wallets(count):
+    return {Web3.to_checksum_address(f"0x{'ab' * 19}{i:02x}"): (i + 1) * 10 ** 15 for i in range(count)}
+
+
+def test_nonce_manager_allocates_locally(chain):
+    web3, account = chain
+    nonces = NonceManager(web3, account.address)
+    assert [nonces.next() for _ in range(3)] == [0, 1, 2]
+    nonces.resync()
+    assert nonces.next() == web3.eth.get_transaction_count(account.address, "pending")
+
+
+def test_fees_are_eip1559(chain):
+    web3, _ = chain
+    fees = estimate_fees(web3)
+    assert fees["type"] == 2
+    assert fees["maxFeePerGas"] >= fees["maxPriorityFeePerGas"] > 0
+
+
+def test_bump_fees_raises_previous_fee():
+    previous = {"maxFeePerGas": 100, "maxPriorityFeePerGas": 10}
+    assert bump_fees(previous, {"maxFeePerGas": 50, "maxPriorityFeePerGas": 5, "type": 2}) == {
+        "maxFeePerGas": 113, "maxPriorityFeePerGas": 12, "type": 2,
+    }
+    assert bump_fees({"maxFeePerGas": None, "gasPrice": 100}, {"gasPrice": 200}) == {"gasPrice": 200}
+
+
+def test_run_pays_each_wallet_once(chain, tmp_path):
+    web3, account = chain
+    payouts = wallets(20)
+    ledger = PayoutLedger(str(tmp_path / "payouts.db"))
+
+    assert PayoutRunner(web3, account, ledger).run("2025-01", payouts) == {CONFIRMED: 20}
+    assert {wallet: web3.eth.get_balance(wallet) for wallet in payouts} == payouts
+    assert web3.eth.get_transaction_count(account.address) == 20
+
+    # 같은 실행을 다시 돌려도 추가 전송 없음
+    assert PayoutRunner(web3, account, ledger).run("2025-01", payouts) == {CONFIRMED: 20}
+    assert web3.eth.get_transaction_count(account.address) == 20
+
+    with pytest.raises(ValueError):
+        ledger.plan("2025-01", {**payouts, next(iter(payouts)): 1})
+
+
+def test_submit_failure_does_not_leave_nonce_gap(chain, tmp_path, monkeypatch):
+    web3, account = chain
+    payouts = wallets(5)
+    ledger = PayoutLedger(str(tmp_path / "payouts.db"))
+    send = web3.eth.send_raw_transaction
+    calls = []
+
+    def flaky_send(raw_tx):
+        calls.append(raw_tx)
+        if len(calls) == 2:
+            raise ValueError("connection reset")
+        return send(raw_tx)
+
+    monkeypatch.setattr(web3.eth, "send_raw_transaction", flaky_send)
+    # 받았는지 알 수 없는 실패는 같은 raw tx 를 다시 보냄 → 빈 nonce 없이 모두 지급
+    assert PayoutRunner(web3, account, ledger).run("2025-02", payouts) == {CONFIRMED: 5}
+    assert calls[1] == calls[2]
+    assert web3.eth.get_transaction_count(account.address) == 5
+    assert {wallet: web3.eth.get_balance(wallet) for wallet in payouts} == payouts
+
+
+def test_error_after_broadcast_is_not_paid_twice(chain, tmp_path, monkeypatch):
+    """노드가 받은 뒤 타임아웃 / already known 으로 실패해도 다시 서명하지 않음"""
+    web3, account = chain
+    payouts = wallets(3)
+    ledger = PayoutLedger(str(tmp_path / "payouts.db"))
+    send = web3.eth.send_raw_transaction
+    calls = []
+
+    def send_then_raise(raw_tx):
+        calls.append(raw_tx)
+        send(raw_tx)
+        if len(calls) == 1:
+            raise TimeoutError("read timed out")
+        if len(calls) == 2:
+            raise ValueError("already known")
+
+    monkeypatch.setattr(web3.eth, "send_raw_transaction", send_then_raise)
+    assert PayoutRunner(web3, account, ledger).run("2025-04", payouts) == {CONFIRMED: 3}
+    monkeypatch.setattr(web3.eth, "send_raw_transaction", send)
+    assert PayoutRunner(web3, account, ledger).run("2025-04", payouts) == {CONFIRMED: 3}
+    assert web3.eth.get_transaction_count(account.address) == 3
+    assert {wallet: web3.eth.get_balance(wallet) for wallet in payouts} == payouts
+
+
+def test_unknown_submit_result_keeps_signed_transaction(chain, tmp_path, monkeypatch):
+    """계속 응답이 없으면 raw tx 를 유지 → 다음 실행이 같은 트랜잭션을 해시로 확인 / 재전송"""
+    web3, account = chain
+    payouts = wallets(3)
+    ledger = PayoutLedger(str(tmp_path / "payouts.db"))
+    send = web3.eth.send_raw_transaction
+    smallest = min(payouts, key=payouts.get)  # 금액 순으로 보내므로 마지막 지급
+
+    def unreachable_for_last(raw_tx):
+        if any(row["raw_tx"] == raw_tx for row in ledger.rows("2025-05", [SIGNED]) if row["wallet"] == smallest):
+            raise TimeoutError("read timed out")
+        return send(raw_tx)
+
+    monkeypatch.setattr(web3.eth, "send_raw_transaction", unreachable_for_last)
+    assert PayoutRunner(web3, account, ledger).run("2025-05", payouts) == {CONFIRMED: 2, SIGNED: 1}
+    (signed,) = ledger.rows("2025-05", [SIGNED])
+    assert signed["raw_tx"] and signed["wallet"] == smallest
+
+    monkeypatch.setattr(web3.eth, "send_raw_transaction", send)
+    assert PayoutRunner(web3, account, ledger).run("2025-05", payouts) == {CONFIRMED: 3}
+    assert ledger.rows("2025-05", [CONFIRMED])[-1]["tx_hash"] == signed["tx_hash"]
+    assert web3.eth.get_transaction_count(account.address) == 3
+    assert {wallet: web3.eth.get_balance(wallet) for wallet in payouts} == payouts
+
+
+def test_nonce_used_elsewhere_is_signed_again(chain, tmp_path, monkeypatch):
+    """nonce too low 이고 체인에 없으면 확실히 거부된 것 → 새 nonce 로 다시 서명"""
+    web3, account = chain
+    payouts = wallets(2)
+    ledger = PayoutLedger(str(tmp_path / "payouts.db"))
+    send = web3.eth.send_raw_transaction
+    calls = []
+
+    def rejected_once(raw_tx):
+        calls.append(raw_tx)
+        if len(calls) == 1:
+            raise ValueError("nonce too low")
+        return send(raw_tx)
+
+    monkeypatch.setattr(web3.eth, "send_raw_transaction", rejected_once)
+    assert PayoutRunner(web3, account, ledger).run("2025-06", payouts) == {CONFIRMED: 1, PENDING: 1}
+    assert PayoutRunner(web3, account, ledger).run("2025-06", payouts) == {CONFIRMED: 2}
+    assert {wallet: web3.eth.get_balance(wallet) for wallet in payouts} == payouts
+
+
+def test_interrupted_run_resumes_with_same_transaction(chain, tmp_path, monkeypatch):
+    """서명/기록 후 전송 전에 중단되면 다음 실행이 같은 nonce 의 raw tx 를 재전송 (이중 지급 없음)"""
+    web3, account = chain
+    payouts = wallets(3)
+    ledger = PayoutLedger(str(tmp_path / "payouts.db"))
+    send = web3.eth.send_raw_transaction
+    calls = []
+
+    def interrupted_send(raw_tx):
+        calls.append(raw_tx)
+        if len(calls) == 2:
+            raise Interrupted()
+        return send(raw_tx)
+
+    monkeypatch.setattr(web3.eth, "send_raw_transaction", interrupted_send)
+    with pytest.raises(Interrupted):
+        PayoutRunner(web3, account, ledger).run("2025-03", payouts)
+    (signed,) = ledger.rows("2025-03", [SIGNED])
+    monkeypatch.setattr(web3.eth, "send_raw_transaction", send)
+
+    assert PayoutRunner(web3, account, ledger).run("2025-03", payouts) == {CONFIRMED: 3}
+    confirmed = {row["wallet"]: row["tx_hash"] for row in ledger.rows("2025-03", [CONFIRMED])}
+    assert confirmed[signed["wallet"]] == signed["tx_hash"]
+    assert web3.eth.get_transaction_count(account.address) == 3
+    assert {wallet: web3.eth.get_balance(wallet) for wallet in payouts} == payouts
+
+
+def test_stuck_transaction_is_replaced_with_higher_fee(chain, tmp_path):
+    """mempool 에 남은 지급은 같은 nonce, 더 높은 수수료로 교체 (FAILED 처리 후 새 nonce 로 재서명하지 않음)"""
+    web3, account = chain
+    payouts = wallets(1)
+    ledger = PayoutLedger(str(tmp_path / "payouts.db"))
+    tester = web3.provider.ethereum_tester
+
+    tester.disable_auto_mine_transactions()
+    assert PayoutRunner(web3, account, ledger, receipt_timeout=0).run("2025-07", payouts) == {SUBMITTED: 1}
+    stuck = {row["wallet"]: row for row in ledger.rows("2025-07")}
+    stuck_fees = {wallet: web3.eth.get_transaction(row["tx_hash"])["maxFeePerGas"] for wallet, row in stuck.items()}
+
+    assert PayoutRunner(web3, account, ledger, receipt_timeout=0, replace_after=0).run("2025-07", payouts) == {SUBMITTED: 1}
+    for row in ledger.rows("2025-07"):
+        previous = stuck[row["wallet"]]
+        assert row["nonce"] == previous["nonce"]
+        assert row["tx_hash"] != previous["tx_hash"]
+        assert row["replaced"] == [previous["tx_hash"]]
+        assert web3.eth.get_transaction(row["tx_hash"])["maxFeePerGas"] > stuck_fees[row["wallet"]]
+
+    tester.enable_auto_mine_transactions()
+    assert PayoutRunner(web3, account, ledger).run("2025-07", payouts) == {CONFIRMED: 1}
+    assert web3.eth.get_transaction_count(account.address) == 1
+    assert {wallet: web3.eth.get_balance(wallet) for wallet in payouts} == payouts
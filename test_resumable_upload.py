@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+
+from fastapi.testclient import TestClient
+
+import gateway
+from resumable_upload import UploadSessionStore, merge_range
+from upload_stream import original_filename
+
+client = TestClient(gateway.app)
+
+test_meta = {
+    "video_name": "lobster dance",
+    "content_creator_wallet": "0x1234",
+    "creator_share": 70,
+    "provider_share": 30,
+    "price": 0.001
+}
+
+
+def test_merge_range():
+    """수신 구간 병합"""
+    ranges = merge_range([], 10, 20)
+    ranges = merge_range(ranges, 0, 5)
+    assert ranges == [[0, 5], [10, 20]]
+    assert merge_range(ranges, 5, 10) == [[0, 20]]
+
+
+def test_resumable_upload_out_of_order(tmp_path, monkeypatch):
+    """구간을 순서 없이 업로드한 뒤 오프셋 조회 및 조립 확인"""
+    store = UploadSessionStore(str(tmp_path / ".sessions"))
+    monkeypatch.setattr(gateway, "upload_sessions", store)
+    data = os.urandom(10_000)
+
+    response = client.post("/uploads", json={"filename": "clip.mov", "length": len(data), "meta": test_meta})
+    assert response.status_code == 201
+    upload_id = response.json()["upload_id"]
+
+    # 뒤쪽 구간을 먼저 전송
+    response = client.put(f"/uploads/{upload_id}", content=data[6000:],
+                          headers={"Content-Range": f"bytes 6000-9999/{len(data)}"})
+    assert response.status_code == 200
+    assert response.json()["offset"] == 0
+
+    response = client.put(f"/uploads/{upload_id}", content=data[:6000],
+                          headers={"Content-Range": f"bytes 0-5999/{len(data)}"})
+    assert response.json()["complete"] is True
+
+    response = client.head(f"/uploads/{upload_id}")
+    assert response.headers["Upload-Offset"] == str(len(data))
+
+    stored = asyncio.run(store.finalize(upload_id, str(tmp_path)))
+    assert stored.sha256 == hashlib.sha256(data).hexdigest()
+    assert open(stored.path, "rb").read() == data
+    assert original_filename(os.path.basename(stored.path)) == "clip.mov"
+
+
+def test_resumable_upload_rejects_bad_range(tmp_path, monkeypatch):
+    """업로드 길이를 벗어난 Content-Range 거부"""
+    monkeypatch.setattr(gateway, "upload_sessions", UploadSessionStore(str(tmp_path)))
+    upload_id = client.post("/uploads", json={"filename": "clip.mov", "length": 100, "meta": test_meta}).json()["upload_id"]
+
+    response = client.put(f"/uploads/{upload_id}", content=b"x" * 10, headers={"Content-Range": "bytes 95-104/100"})
+    assert response.status_code == 416
+
+    response = client.post(f"/uploads/{upload_id}/finalize")
+    assert response.status_code == 409
+
+
+def test_finalize_does_not_overwrite_same_name(tmp_path):
+    """같은 파일 이름의 세션을 완료해도 기존 업로드를 덮어쓰지 않음"""
+    store = UploadSessionStore(str(tmp_path / ".sessions"))
+    paths = []
+    for data in (b"first", b"second"):
+        session = store.create("clip.mov", len(data), "ipfs", test_meta)
+
+        async def body(data=data):
+            yield data
+
+        asyncio.run(store.write_range(session["upload_id"], 0, len(data), body()))
+        paths.append(asyncio.run(store.finalize(session["upload_id"], str(tmp_path))).path)
+
+    assert paths[0] != paths[1]
+    assert open(paths[0], "rb").read() == b"first" and open(paths[1], "rb").read() == b"second"
+
+
+def test_abandoned_sessions_expire(tmp_path):
+    """TTL 동안 진행이 없는 세션의 .part / 세션 파일 / 잠금 정리"""
+    store = UploadSessionStore(str(tmp_path), ttl=60)
+    stale = store.create("stale.mov", 1_000_000, "ipfs", test_meta)
+    fresh = store.create("fresh.mov", 100, "ipfs", test_meta)["upload_id"]
+    store._lock(stale["upload_id"])
+
+    stale["updated_at"] = int(time.time()) - 120
+    with open(store._info_path(stale["upload_id"]), "w") as f:
+        json.dump(stale, f)
+
+    assert store.sweep_expired() == 1
+    assert sorted(os.listdir(tmp_path)) == [f"{fresh}.json", f"{fresh}.part"]
+    assert stale["upload_id"] not in store._locks
+    assert store.expired == 1
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+import gateway
+from server_selector import ServerSelector, check_node_url, choose, health_key, node_id, probe_url
+from test_stream_registry import redis_db, run  # noqa: F401
+
+
+def candidate(url, load, capacity=10, region=None):
+    return {"stream_url": url, "region": region}, {"load": str(load), "capacity": str(capacity)}
+
+
+def test_choose_prefers_least_loaded():
+    candidates = [candidate("http://a", 9), candidate("http://b", 1), candidate("http://c", 5)]
+    server, _ = choose(candidates, strategy="least_load")
+    assert server["stream_url"] == "http://b"
+
+
+def test_choose_p2c_never_picks_the_busiest():
+    """power-of-two-choices 는 두 후보 중 덜 바쁜 쪽이므로 가장 바쁜 노드는 선택되지 않음"""
+    candidates = [candidate("http://a", 9), candidate("http://b", 1), candidate("http://c", 5)]
+    picked = {choose(candidates, strategy="p2c")[0]["stream_url"] for _ in range(200)}
+    assert "http://a" not in picked
+    assert picked == {"http://b", "http://c"}
+
+
+def test_choose_prefers_client_region():
+    candidates = [candidate("http://a", 0, region="us"), candidate("http://b", 8, region="kr")]
+    assert choose(candidates, region="kr")[0]["stream_url"] == "http://b"
+    # 해당 지역 노드가 없으면 전체에서 선택
+    assert choose(candidates, region="eu")[0]["stream_url"] == "http://a"
+    assert choose([], region="kr") is None
+
+
+def test_heartbeat_expires_after_ttl(redis_db):
+    """하트비트가 끊긴 노드는 TTL 이후 선택 대상에서 제외"""
+    async def scenario(registry):
+        selector = ServerSelector(registry.client, ttl=1)
+        servers = [{"stream_url": "http://a:9000/stream"}, {"stream_url": "http://b:9000/stream"}]
+        await selector.heartbeat("http://a:9000/stream", load=5, capacity=10)
+        await selector.heartbeat("http://b:9000/stream", load=1, capacity=10)
+        server, health = await selector.select(servers)
+        assert server["stream_url"] == "http://b:9000/stream" and health["load"] == "1"
+
+        await asyncio.sleep(1.5)
+        await selector.heartbeat("http://a:9000/stream", load=5, capacity=10)
+        server, _ = await selector.select(servers)
+        assert server["stream_url"] == "http://a:9000/stream"
+
+    run(scenario)
+
+
+def test_prober_drops_unreachable_nodes(redis_db):
+    """프로브 실패가 HEALTH_MAX_FAILURES 번 이어지면 바로 제외, 응답하는 노드는 유지"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    alive = f"http://127.0.0.1:{http.server_port}/stream"
+    dead = "http://127.0.0.1:9/stream"
+
+    async def scenario(registry):
+        selector = ServerSelector(registry.client, allow_private=True)
+        await selector.heartbeat(alive)
+        await selector.heartbeat(dead)
+        for _ in range(3):
+            await selector.probe_all()
+
+        assert await registry.client.exists(health_key(node_id(dead))) == 0
+        assert await registry.client.hget(health_key(node_id(alive)), "latency_ms") is not None
+        assert selector.stats()["probe_failures"] == 3
+
+    try:
+        run(scenario)
+    finally:
+        http.shutdown()
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:9000/stream",
+    "http://localhost/stream",
+    "http://10.0.0.5/stream",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/stream",
+    "http://[::ffff:127.0.0.1]/stream",
+    "file:///etc/passwd",
+    "http://:80/stream",
+])
+def test_internal_node_urls_are_rejected(url):
+    """루프백/사설/링크 로컬 주소와 http(s) 가 아닌 URL 은 노드로 받지 않음"""
+    with pytest.raises(ValueError):
+        asyncio.run(check_node_url(url, allow_private=False))
+
+
+def test_public_node_url_and_probe_path():
+    """공개 주소는 허용, 프로브는 stream_url 경로가 아닌 설정된 헬스 경로로만"""
+    asyncio.run(check_node_url("http://8.8.8.8:9000/stream", allow_private=False))
+    asyncio.run(check_node_url("http://127.0.0.1:9000/stream", allow_private=True))
+    assert probe_url("http://8.8.8.8:9000/admin/delete?all=1") == "http://8.8.8.8:9000/health"
+
+
+def test_register_rejects_internal_stream_url():
+    with TestClient(gateway.app) as client:
+        response = client.post("/register", json={
+            "cid": "QmInternal", "stream_url": "http://169.254.169.254/latest", "video_name": "x",
+            "content_creator_wallet": "0x1", "content_distributor_wallet": "0x2",
+            "creator_share": 70, "provider_share": 30, "price": 0.001,
+        })
+    assert response.status_code == 400
@@ -0,0 +1,198 @@
+import os
+import asyncio
+
+import pytest
+import redis
+import redis.asyncio as aioredis
+
+from stream_registry import StreamRegistry, decode_server, encode_server, migrate_legacy, server_id, cid_key, wallet_cid_key
+
+REDIS_TEST_URL = os.getenv("REDIS_TEST_URL", "redis://localhost:6379/15")
+
+test_server = {
+    "cid": "QmTest",
+    "video_name": "test video",
+    "content_creator_wallet": "0xcreator",
+    "content_distributor_wallet": "0xdistributor",
+    "creator_share": 70,
+    "provider_share": 30,
+    "price": 0.001,
+    "stream_url": "https://node.example.com/stream",
+}
+
+
+@pytest.fixture
+def redis_db():
+    client = redis.Redis.from_url(REDIS_TEST_URL, decode_responses=True)
+    try:
+        client.ping()
+    except redis.RedisError:
+        pytest.skip("redis 서버 없음")
+    client.flushdb()
+    yield client
+    client.flushdb()
+
+
+def run(scenario):
+    """테스트 시나리오를 비동기 레지스트리와 함께 실행"""
+    async def main():
+        client = aioredis.Redis.from_url(REDIS_TEST_URL, decode_responses=True)
+        try:
+            await scenario(StreamRegistry(client))
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_encode_decode_round_trip():
+    """해시 필드(문자열)를 원래 타입으로 복원"""
+    server = {**test_server, "server_id": "abc", "registered_at": 1700000000}
+    assert decode_server(encode_server(server)) == server
+
+
+def test_server_id_is_stable_per_url():
+    """같은 cid/지갑/URL 은 같은 ID, URL 이 다르면 다른 ID"""
+    first = server_id("QmTest", "0xdistributor", "https://a")
+    assert first == server_id("QmTest", "0xdistributor", "https://a")
+    assert first != server_id("QmTest", "0xdistributor", "https://b")
+
+
+def test_reregister_updates_in_place(redis_db):
+    """가격을 바꿔 재등록해도 서버는 하나만 남음"""
+    async def scenario(registry):
+        await registry.register(test_server)
+        await registry.register({**test_server, "price": 0.002})
+
+        servers = await registry.servers_by_cid("QmTest")
+        assert len(servers) == 1
+        assert servers[0]["price"] == 0.002
+        assert await registry.servers_by_wallet_cid("0xdistributor", "QmTest") == servers
+
+    run(scenario)
+
+
+def test_remove_only_touches_own_wallet(redis_db):
+    async def scenario(registry):
+        await registry.register(test_server)
+        other, _ = await registry.register({**test_server, "content_distributor_wallet": "0xother"})
+
+        assert await registry.remove("QmTest", "0xnobody") == []
+        assert len(await registry.remove("QmTest", "0xdistributor")) == 1
+        assert [server["server_id"] for server in await registry.servers_by_cid("QmTest")] == [other["server_id"]]
+
+    run(scenario)
+
+
+def test_remove_single_stream_url(redis_db):
+    """stream_url 을 지정하면 해당 서버만 제거"""
+    async def scenario(registry):
+        first, _ = await registry.register(test_server)
+        await registry.register({**test_server, "stream_url": "https://second.example.com/stream"})
+
+        assert await registry.remove("QmTest", "0xdistributor", "https://second.example.com/stream") != []
+        assert await registry.remove("QmTest", "0xdistributor", "https://second.example.com/stream") == []
+        assert [server["server_id"] for server in await registry.servers_by_cid("QmTest")] == [first["server_id"]]
+
+    run(scenario)
+
+
+def test_migrate_legacy_members(redis_db):
+    """기존 str(dict) 멤버를 해시 + ID 색인으로 변환"""
+    redis_db.sadd(cid_key("QmTest"), str(test_server))
+    redis_db.sadd(wallet_cid_key("0xdistributor", "QmTest"), str(test_server))
+
+    async def scenario(registry):
+        # CID / 지갑+CID 색인에 함께 있던 같은 서버는 한 번만 변환
+        assert await migrate_legacy(registry.client) == 1
+        servers = await registry.servers_by_cid("QmTest")
+        assert len(servers) == 1
+        assert servers[0]["stream_url"] == test_server["stream_url"]
+        assert await migrate_legacy(registry.client) == 0
+
+    run(scenario)
+
+
+def test_migrate_legacy_twice_keeps_new_registration(redis_db):
+    """새 형식으로 이미 등록된 서버는 기존 멤버로 덮어쓰지 않고, 두 번 실행해도 색인이 늘지 않음"""
+    legacy = {**test_server, "price": 0.5}
+    sid = server_id(test_server["cid"], test_server["content_distributor_wallet"], test_server["stream_url"])
+
+    async def scenario(registry):
+        _, lease = await registry.register(test_server)
+        await registry.client.sadd(cid_key("QmTest"), str(legacy))
+        await registry.client.sadd(wallet_cid_key("0xdistributor", "QmTest"), str(legacy))
+
+        assert await migrate_legacy(registry.client) == 0
+        assert await migrate_legacy(registry.client) == 0
+
+        assert await registry.client.smembers(cid_key("QmTest")) == {sid}
+        assert await registry.client.smembers(wallet_cid_key("0xdistributor", "QmTest")) == {sid}
+        (server,) = await registry.servers_by_cid("QmTest")
+        assert server["price"] == test_server["price"]
+        assert await registry.client.zscore("stream_server_leases", sid) == lease["expires_at"]
+
+    run(scenario)
+
+
+def test_cid_listing_pages_with_cursor(redis_db):
+    """CID 색인을 커서로 끝까지 순회하면 모든 CID 를 한 번씩 반환"""
+    async def scenario(registry):
+        for i in range(5):
+            await registry.register({**test_server, "cid": f"Qm{i}"})
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = await registry.list_cids(cursor, 2)
+            seen.extend(page)
+            if cursor is None:
+                break
+        assert seen == [f"Qm{i}" for i in range(5)]
+
+    run(scenario)
+
+
+def test_wallet_listing_uses_index(redis_db):
+    """지갑 목록은 해당 지갑의 CID 만, 서버가 모두 제거되면 색인에서도 제거"""
+    async def scenario(registry):
+        await registry.register({**test_server, "cid": "QmA"})
+        await registry.register({**test_server, "cid": "QmB"})
+        await registry.register({**test_server, "cid": "QmC", "content_distributor_wallet": "0xother"})
+
+        page, cursor = await registry.list_wallet("0xdistributor", None, 10)
+        assert list(page) == ["QmA", "QmB"] and cursor is None
+
+        await registry.remove("QmA", "0xdistributor")
+        assert list((await registry.list_wallet("0xdistributor", None, 10))[0]) == ["QmB"]
+        assert list((await registry.list_cids(None, 10))[0]) == ["QmB", "QmC"]
+
+    run(scenario)
+
+
+def test_renew_extends_only_live_leases(redis_db):
+    """하트비트는 살아 있는 임대만 연장하고 모르는/만료된 ID 는 돌려줌"""
+    async def scenario(registry):
+        server, lease = await registry.register(test_server)
+        assert lease["lease_id"] == server["server_id"]
+
+        renewed, expired = await registry.renew([lease["lease_id"], "unknown"])
+        assert renewed == 1 and expired == ["unknown"]
+
+    run(scenario)
+
+
+def test_expired_leases_are_hidden_and_swept(redis_db):
+    """만료된 서버는 정리 전에도 조회에서 빠지고, 정리 시 색인에서도 제거"""
+    async def scenario(registry):
+        await registry.register({**test_server, "cid": "QmKeep"})
+        expiring = StreamRegistry(registry.client, lease_ttl=-1)
+        for i in range(3):
+            await expiring.register({**test_server, "cid": "QmGone", "stream_url": f"https://node{i}.example.com"})
+
+        assert await registry.servers_by_cid("QmGone") == []
+        assert await registry.sweep_expired(batch=2) == 3
+        assert await registry.client.scard(cid_key("QmGone")) == 0
+        assert list((await registry.list_cids(None, 10))[0]) == ["QmKeep"]
+        assert list((await registry.list_wallet("0xdistributor", None, 10))[0]) == ["QmKeep"]
+
+    run(scenario)
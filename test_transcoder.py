@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import gateway
+import transcoder as transcoder_module
+from ingest_jobs import JobQueue
+from segment_cache import SegmentCache
+from transcoder import Transcoder, parse_renditions
+from test_ingest_jobs import FAKE_CLI
+
+
+def make_transcoder(stream_path, monkeypatch):
+    monkeypatch.setattr(transcoder_module, "FFMPEG_BIN", FAKE_CLI + ["ffmpeg"])
+    monkeypatch.setattr(transcoder_module, "FFPROBE_BIN", FAKE_CLI + ["ffprobe"])
+    cache = SegmentCache(str(stream_path))
+    return Transcoder(str(stream_path), cache, parse_renditions("720p:1280x720:2800k:128k,480p:854x480:1400k:96k"),
+                      JobQueue(workers=1, max_retries=0))
+
+
+def test_transcode_is_idempotent_per_cid(tmp_path, monkeypatch):
+    """같은 CID 요청은 하나의 작업으로 합쳐지고 완료 후에는 재변환하지 않음"""
+    transcoder = make_transcoder(tmp_path, monkeypatch)
+
+    async def scenario():
+        await transcoder.queue.start()
+        first = transcoder.request("QmVideo", "source.mov")
+        second = transcoder.request("QmVideo", "source.mov")
+        await transcoder.queue.join()
+        third = transcoder.request("QmVideo", "source.mov")
+        await transcoder.queue.stop()
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert first is second
+    assert third is None
+    assert first.status == "succeeded", first.error
+    assert first.progress == {"transcode": 1.0}
+
+    master = (tmp_path / "QmVideo" / "master.m3u8").read_text()
+    assert "720p/index.m3u8" in master and "BANDWIDTH=2928000" in master
+    assert (tmp_path / "QmVideo" / "480p" / "seg_00001.ts").exists()
+    assert transcoder.cache.contains("QmVideo")
+
+
+def test_cid_cannot_escape_stream_path(tmp_path, monkeypatch):
+    """경로를 벗어나는 CID 는 작업을 만들지 않음"""
+    transcoder = make_transcoder(tmp_path / "streams", monkeypatch)
+    for cid in ("..", ".", "../escape", "a/b", ".QmHidden.tmp", ""):
+        with pytest.raises(HTTPException) as error:
+            transcoder.request(cid, "source.mov")
+        assert error.value.status_code == 400
+        assert not transcoder.is_ready(cid)
+    assert transcoder.active == {}
+
+
+def test_finished_jobs_are_pruned(tmp_path, monkeypatch):
+    """끝난 작업은 다음 요청 때 active 에서 제거"""
+    transcoder = make_transcoder(tmp_path, monkeypatch)
+
+    async def scenario():
+        await transcoder.queue.start()
+        for cid in ("QmFirst", "QmSecond"):
+            transcoder.request(cid, "source.mov")
+            await transcoder.queue.join()
+        await transcoder.queue.stop()
+
+    asyncio.run(scenario())
+    assert list(transcoder.active) == ["QmSecond"]
+    assert transcoder.is_ready("QmFirst") and transcoder.is_ready("QmSecond")
+
+
+def test_segment_cache_evicts_least_recently_used(tmp_path):
+    """용량 초과 시 가장 오래 사용하지 않은 CID 부터 삭제"""
+    cache = SegmentCache(str(tmp_path), max_bytes=2500)
+    for cid in ("a", "b", "c"):
+        os.makedirs(tmp_path / cid)
+        (tmp_path / cid / "seg.ts").write_bytes(b"x" * 1000)
+        if cid != "c":
+            cache.add(cid)
+
+    cache.touch("a")  # b 가 가장 오래된 항목이 됨
+    cache.add("c")
+
+    assert not (tmp_path / "b").exists()
+    assert cache.contains("a") and cache.contains("c")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_stream_endpoint_serves_transcoded_segments(monkeypatch):
+    """변환된 세그먼트 제공 및 경로 탐색 차단"""
+    transcoder = make_transcoder(gateway.STREAM_PATH, monkeypatch)
+    monkeypatch.setattr(gateway, "transcoder", transcoder)
+    monkeypatch.setattr(gateway, "segment_cache", transcoder.cache)
+
+    gateway.db.execute("INSERT OR IGNORE INTO content_metadata (cid, video_name) VALUES (?, ?)", ("QmServe", "serve"))
+
+    with TestClient(gateway.app) as client:
+        # 모르는 CID 는 변환 작업을 만들지 않음
+        assert client.get("/stream/QmUnknownJunk/master.m3u8").status_code == 404
+        assert client.post("/transcode/QmUnknownJunk").status_code == 404
+        assert "QmUnknownJunk" not in transcoder.active
+
+        response = client.get("/stream/QmServe/master.m3u8")
+        assert response.status_code == 202
+
+        for _ in range(200):
+            if transcoder.is_ready("QmServe"):
+                break
+            time.sleep(0.05)
+
+        response = client.get("/stream/QmServe/480p/index.m3u8")
+        assert response.status_code == 200
+        assert "seg_00000.ts" in response.text
+
+        response = client.get("/stream/QmServe/..%2F..%2Fetc%2Fpasswd")
+        assert response.status_code == 404
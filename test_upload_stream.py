@@ -0,0 +1,80 @@
+import io
+import os
+import asyncio
+import hashlib
+
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+from upload_stream import UploadSizeLimitMiddleware, save_upload_stream
+
+
+def test_save_upload_stream_chunks_and_hash(tmp_path):
+    """청크 단위 저장 후 크기와 SHA-256 확인"""
+    data = os.urandom(300_000)
+    upload = UploadFile(file=io.BytesIO(data), filename="../clip.mov")
+
+    stored = asyncio.run(save_upload_stream(upload, str(tmp_path), chunk_size=64 * 1024))
+
+    assert os.path.dirname(stored.path) == str(tmp_path)
+    assert os.path.basename(stored.path).startswith(hashlib.sha256(data).hexdigest()[:16] + "-")
+    assert stored.path.endswith("-clip.mov")
+    assert stored.size == len(data)
+    assert stored.sha256 == hashlib.sha256(data).hexdigest()
+    assert open(stored.path, "rb").read() == data
+    assert os.listdir(tmp_path) == [os.path.basename(stored.path)]
+
+
+def test_same_name_does_not_overwrite(tmp_path):
+    """같은 이름의 다른 파일은 기존 업로드를 덮어쓰지 않음"""
+    first = asyncio.run(save_upload_stream(UploadFile(file=io.BytesIO(b"first"), filename="clip.mov"), str(tmp_path)))
+    second = asyncio.run(save_upload_stream(UploadFile(file=io.BytesIO(b"second"), filename="clip.mov"), str(tmp_path)))
+
+    assert first.path != second.path
+    assert open(first.path, "rb").read() == b"first"
+    assert open(second.path, "rb").read() == b"second"
+
+
+def test_save_upload_stream_rejects_oversized(tmp_path):
+    """최대 크기 초과 시 413 반환 및 임시 파일 정리"""
+    upload = UploadFile(file=io.BytesIO(b"x" * 1000), filename="big.mov")
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(save_upload_stream(upload, str(tmp_path), chunk_size=100, max_size=500))
+
+    assert exc.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_upload_limit_rejects_before_handler():
+    """Content-Length 가 한도를 넘으면 본문을 받기 전에, chunked 본문은 한도를 넘는 즉시 413 (핸들러 실행 없음)"""
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, paths=("/upload",), max_size=1000, overhead=500)
+    handled = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        handled.append(file.filename)
+        return {"size": file.size}
+
+    @app.post("/other")
+    async def other(file: UploadFile = File(...)):
+        return {"size": file.size}
+
+    with TestClient(app) as client:
+        assert client.post("/upload", files={"file": ("small.mov", b"x" * 900)}).json() == {"size": 900}
+        assert client.post("/other", files={"file": ("big.mov", b"x" * 5000)}).status_code == 200
+
+        response = client.post("/upload", files={"file": ("big.mov", b"x" * 5000)})
+        assert response.status_code == 413
+        assert "1000 bytes" in response.json()["detail"]
+
+        body = b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.mov\"\r\n\r\n" + b"x" * 5000 + b"\r\n--b--\r\n"
+        chunked = client.post(
+            "/upload",
+            content=(body[i:i + 256] for i in range(0, len(body), 256)),
+            headers={"Content-Type": "multipart/form-data; boundary=b"},
+        )
+        assert chunked.status_code == 413
+    assert handled == ["small.mov"]
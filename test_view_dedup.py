@@ -0,0 +1,138 @@
+import time
+import asyncio
+
+import redis.asyncio as aioredis
+from fastapi.testclient import TestClient
+
+import gateway
+from view_dedup import BloomFilter, BloomViewDedup, RedisViewDedup
+from test_stream_registry import REDIS_TEST_URL, redis_db  # noqa: F401
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def view(i, cid="QmDedup", provider="0xprovider"):
+    return (cid, f"0x{i:040x}", provider, "0xcreator", 0.001, 1735689600)
+
+
+def test_bloom_false_positive_rate():
+    """용량만큼 넣어도 오탐률은 목표 근처, 넣은 키는 항상 포함 (false negative 없음)"""
+    bloom = BloomFilter(100000, 0.01)
+    for i in range(100000):
+        bloom.add(bloom.positions(f"in{i}".encode()))
+
+    assert all(f"in{i}".encode() in bloom for i in range(100000))
+    false_positives = sum(f"out{i}".encode() in bloom for i in range(100000))
+    assert false_positives / 100000 < 0.015
+
+
+def test_repeats_dropped_within_window_then_expire():
+    """창 안의 반복은 버리고, 창 + 한 구간이 지나면 다시 기록"""
+    clock = Clock()
+    dedup = BloomViewDedup(window=60, buckets=3, bucket_capacity=1000, clock=clock)
+
+    assert dedup.filter_sync([view(1), view(1), view(1, provider="0xother")]) == [view(1), view(1, provider="0xother")]
+    clock.now = 59
+    assert dedup.filter_sync([view(1), view(2)]) == [view(2)]
+    clock.now = 80
+    assert dedup.filter_sync([view(1)]) == [view(1)]
+    assert (dedup.accepted, dedup.duplicates) == (4, 2)
+
+
+def test_memory_is_bounded():
+    """오래된 구간 필터는 버려서 메모리는 (구간 수 + 1) × 필터 크기를 넘지 않음"""
+    clock = Clock()
+    dedup = BloomViewDedup(window=60, buckets=3, bucket_capacity=1000, clock=clock)
+    for step in range(50):
+        clock.now = step * 10
+        dedup.filter_sync([view(step * 100 + i) for i in range(100)])
+
+    stats = dedup.stats()
+    assert stats["buckets"] == 4
+    assert 0 < stats["memory_bytes"] <= stats["max_memory_bytes"]
+    assert not stats["saturated"]
+
+
+def test_forgotten_rows_pass_once():
+    """저장하지 못한 기록은 재시도 한 번은 통과"""
+    dedup = BloomViewDedup(window=60, bucket_capacity=1000)
+    assert dedup.filter_sync([view(1)]) == [view(1)]
+    asyncio.run(dedup.forget([view(1)]))
+    assert dedup.filter_sync([view(1)]) == [view(1)]
+    assert dedup.filter_sync([view(1)]) == []
+
+
+def test_million_events_throughput_and_accuracy():
+    """100만 건 (절반은 창 안의 반복): 반복은 모두 버리고, 새 기록을 잘못 버리는 비율은 목표 이하"""
+    clock = Clock()
+    dedup = BloomViewDedup(window=600, buckets=4, bucket_capacity=1000000, error_rate=0.001, clock=clock)
+    unique = 500000
+    batch = 10000
+    start = time.perf_counter()
+    accepted = 0
+    for offset in range(0, unique, batch):
+        clock.now = offset / unique * 600  # 창 하나 동안 고르게
+        rows = [view(i, cid=f"Qm{i % 1000}") for i in range(offset, offset + batch)]
+        accepted += len(dedup.filter_sync(rows + rows))
+    elapsed = time.perf_counter() - start
+
+    assert dedup.duplicates >= unique
+    assert (unique - accepted) / unique <= 0.001
+    assert 2 * unique / elapsed > 20000
+    assert dedup.stats()["memory_bytes"] <= dedup.max_memory_bytes
+
+
+def test_redis_set_nx(redis_db):
+    """워커 간 공유: 다른 인스턴스에서도 중복으로 판단, 키는 창 길이 TTL"""
+    async def scenario():
+        clients = [aioredis.Redis.from_url(REDIS_TEST_URL, decode_responses=True) for _ in range(2)]
+        first, second = (RedisViewDedup(client, window=60) for client in clients)
+        try:
+            assert await first.filter([view(1), view(1), view(2)]) == [view(1), view(2)]
+            assert await second.filter([view(1), view(3)]) == [view(3)]
+            assert 0 < await clients[0].ttl(RedisViewDedup.key(view(1))) <= 60
+
+            await second.forget([view(3)])
+            assert await first.filter([view(3)]) == [view(3)]
+            assert (first.duplicates, second.duplicates) == (1, 1)
+        finally:
+            for client in clients:
+                await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_record_view_drops_repeats():
+    record = {
+        "cid": "QmDedupEndpoint",
+        "blockchain_address": "0xrepeat",
+        "provider_wallet": "0xprovider",
+        "creator_wallet": "0xcreator",
+        "price": "0.001",
+        "timestamp": 1735689600,
+    }
+    with TestClient(gateway.app) as client:
+        assert client.post("/api/record-view", json=record).json()["duplicate"] is False
+        assert client.post("/api/record-view", json={**record, "timestamp": 1735689700}).json()["duplicate"] is True
+        response = client.post("/api/record-views", json=[record, {**record, "blockchain_address": "0xother"}])
+        assert (response.json()["accepted"], response.json()["duplicates"]) == (1, 1)
+        assert client.get("/api/record-views/stats").json()["dedup"]["duplicates"] >= 2
+
+    with TestClient(gateway.app) as client:
+        assert len(client.get("/api/get-records/cid/QmDedupEndpoint").json()["records"]) == 2
+
+
+def test_new_payment_is_not_a_duplicate():
+    """창 안이라도 다른 tx_hash 로 다시 결제한 시청은 통과, 같은 tx_hash 재전송만 버림"""
+    dedup = BloomViewDedup(window=60, buckets=3, bucket_capacity=1000, clock=Clock())
+    first, second = (view(1) + ("0x" + "a" * 64,), view(1) + ("0x" + "b" * 64,))
+
+    assert dedup.filter_sync([first, second, first]) == [first, second]
+    assert dedup.filter_sync([view(1) + (None,), view(1)]) == [view(1) + (None,)]
+    assert RedisViewDedup.key(first) != RedisViewDedup.key(second)
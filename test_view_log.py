@@ -0,0 +1,122 @@
+import json
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import gateway
+from db import Database
+from view_log import ViewLogWriter
+
+test_view = {
+    "cid": "QmView",
+    "blockchain_address": "0xviewer",
+    "provider_wallet": "0xprovider",
+    "creator_wallet": "0xcreator",
+    "price": "0.001",
+    "timestamp": "2025-01-01T00:00:00Z",
+}
+
+
+def make_db(tmp_path):
+    db = Database(str(tmp_path / "views.db"))
+    db.execute("""
+        CREATE TABLE streaming_access_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, cid TEXT, blockchain_address TEXT,
+            provider_wallet TEXT, creator_wallet TEXT, price REAL, timestamp TEXT, tx_hash TEXT
+        )
+    """)
+    return db
+
+
+def row(i):
+    return (f"Qm{i}", "0xviewer", "0xprovider", "0xcreator", 0.001, "2025-01-01T00:00:00Z", None)
+
+
+def test_rows_are_group_committed(tmp_path):
+    """max_batch 단위로 묶어서 저장"""
+    db = make_db(tmp_path)
+    writer = ViewLogWriter(db, flush_interval_ms=60000, max_batch=100)
+    writer.submit(row(i) for i in range(250))
+
+    assert writer.flush() == 250
+    assert writer.batches == 3
+    assert db.fetchone("SELECT COUNT(*) FROM streaming_access_logs")[0] == 250
+
+
+def test_stop_flushes_pending_rows(tmp_path):
+    """주기가 오기 전에 종료해도 버퍼의 기록은 모두 저장"""
+    db = make_db(tmp_path)
+    writer = ViewLogWriter(db, flush_interval_ms=60000, max_batch=10000)
+    writer.start()
+    writer.submit(row(i) for i in range(500))
+    writer.stop()
+
+    assert db.fetchone("SELECT COUNT(*) FROM streaming_access_logs")[0] == 500
+    assert writer.stats()["pending"] == 0
+
+
+def test_full_buffer_rejects(tmp_path):
+    writer = ViewLogWriter(make_db(tmp_path), max_pending=10)
+    writer.submit(row(i) for i in range(10))
+    with pytest.raises(HTTPException) as exc:
+        writer.submit([row(10)])
+    assert exc.value.status_code == 503
+
+
+def test_locked_database_keeps_rows(tmp_path):
+    """DB 가 잠겨 있으면 기록을 버리지 않고 다음 주기에 재시도"""
+    db = make_db(tmp_path)
+    writer = ViewLogWriter(Database(db.path, busy_timeout_ms=10, retries=0), dead_letter_path=str(tmp_path / "dead.jsonl"))
+    writer.submit(row(i) for i in range(5))
+
+    blocker = sqlite3.connect(db.path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    assert writer.flush() == 0
+    assert writer.stats()["pending"] == 5
+    assert writer.failures == 1
+    blocker.execute("ROLLBACK")
+
+    assert writer.flush() == 5
+    assert [r[0] for r in db.fetchall("SELECT cid FROM streaming_access_logs ORDER BY id")] == [f"Qm{i}" for i in range(5)]
+    assert not (tmp_path / "dead.jsonl").exists()
+
+
+def test_bad_row_is_dead_lettered(tmp_path):
+    """저장할 수 없는 기록 하나만 dead letter 로 보내고 나머지는 저장 (전체 저장이 멈추지 않음)"""
+    db = make_db(tmp_path)
+    db.execute("CREATE TRIGGER reject_bad BEFORE INSERT ON streaming_access_logs WHEN NEW.price < 0 BEGIN SELECT RAISE(ABORT, 'negative price'); END")
+    dead_letter = tmp_path / "dead.jsonl"
+    writer = ViewLogWriter(db, max_batch=100, dead_letter_path=str(dead_letter))
+    rows = [row(i) for i in range(50)]
+    rows[17] = (*rows[17][:4], -1.0, *rows[17][5:])
+    writer.submit(rows)
+
+    assert writer.flush() == 49
+    assert writer.stats()["pending"] == 0
+    assert writer.dead_lettered == 1
+    (entry,) = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert entry["row"][0] == "Qm17"
+    assert "negative price" in entry["error"]
+    assert db.fetchone("SELECT COUNT(*) FROM streaming_access_logs")[0] == 49
+
+
+def test_record_view_endpoints():
+    """단건/일괄 접속 기록이 종료 시까지 모두 저장되고 조회됨"""
+    with TestClient(gateway.app) as client:
+        response = client.post("/api/record-view", json=test_view)
+        assert response.status_code == 202
+        response = client.post("/api/record-views", json=[{**test_view, "blockchain_address": f"0x{i}"} for i in range(20)])
+        assert response.status_code == 202
+        assert response.json()["accepted"] == 20
+
+    with TestClient(gateway.app) as client:
+        records = client.get("/api/get-records/cid/QmView").json()["records"]
+        assert len(records) == 21
+        assert records[0]["provider_wallet"] == "0xprovider"
+        assert records[0]["price"] == 0.001
+        assert records[0]["timestamp"] == "2025-01-01T00:00:00Z"
+
+        response = client.post("/api/record-view", json={**test_view, "timestamp": "yesterday"})
+        assert response.status_code == 422
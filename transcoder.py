@@ -0,0 +1,207 @@
+import os
+import shlex
+import shutil
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import anyio
+from fastapi import HTTPException
+
+from ingest_jobs import CommandError, Job, JobQueue
+from metrics import observe
+from segment_cache import SegmentCache
+
+FFMPEG_BIN = shlex.split(os.getenv("FFMPEG_BIN", "ffmpeg"))
+FFPROBE_BIN = shlex.split(os.getenv("FFPROBE_BIN", "ffprobe"))
+
+# 동시에 실행할 ffmpeg 프로세스 수
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "2"))
+TRANSCODE_COMMAND_TIMEOUT = float(os.getenv("TRANSCODE_COMMAND_TIMEOUT", "7200"))
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "6"))
+# 이름:가로x세로:비디오 비트레이트:오디오 비트레이트
+HLS_RENDITIONS = os.getenv("HLS_RENDITIONS", "1080p:1920x1080:5000k:192k,720p:1280x720:2800k:128k,480p:854x480:1400k:96k")
+
+MASTER_PLAYLIST = "master.m3u8"
+
+
+@dataclass
+class Rendition:
+    name: str
+    width: int
+    height: int
+    video_bitrate: str
+    audio_bitrate: str
+
+    @property
+    def bandwidth(self) -> int:
+        """master playlist 의 BANDWIDTH (bps)"""
+        return sum(int(rate.rstrip("kK")) * 1000 for rate in (self.video_bitrate, self.audio_bitrate))
+
+
+def parse_renditions(spec: str) -> List[Rendition]:
+    renditions = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, size, video_bitrate, audio_bitrate = item.split(":")
+        width, height = size.lower().split("x")
+        renditions.append(Rendition(name, int(width), int(height), video_bitrate, audio_bitrate))
+    return renditions
+
+
+async def probe_duration(source: str) -> Optional[float]:
+    """ffprobe 로 영상 길이(초) 조회 (진행률 계산용, 실패해도 변환은 진행)"""
+    try:
+        with observe("subprocess", "ffprobe"):
+            process = await asyncio.create_subprocess_exec(
+                *FFPROBE_BIN, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", source,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+            )
+            stdout, _ = await asyncio.wait_for(process.communicate(), 60)
+        return float(stdout.decode().strip())
+    except (OSError, ValueError, asyncio.TimeoutError):
+        return None
+
+
+class Transcoder:
+    """CID 를 HLS 렌디션으로 변환 (CID 가 멱등성 키: 이미 변환됐거나 진행 중이면 새 작업을 만들지 않음)"""
+
+    def __init__(
+        self,
+        stream_path: str,
+        cache: SegmentCache,
+        renditions: List[Rendition] = None,
+        queue: JobQueue = None,
+        segment_seconds: int = HLS_SEGMENT_SECONDS,
+    ):
+        self.stream_path = stream_path
+        self.cache = cache
+        self.renditions = renditions or parse_renditions(HLS_RENDITIONS)
+        self.queue = queue or JobQueue(workers=TRANSCODE_WORKERS)
+        self.segment_seconds = segment_seconds
+        self.active: Dict[str, Job] = {}
+
+    def cid_dir(self, cid: str) -> Optional[str]:
+        """stream_path 바로 아래의 CID 디렉토리 (경로 구분자, '.' 으로 시작하는 이름 등 밖으로 벗어나는 CID 는 None)"""
+        if not cid or cid.startswith(".") or "\x00" in cid:
+            return None
+        root = os.path.realpath(self.stream_path)
+        path = os.path.realpath(os.path.join(root, cid))
+        return path if os.path.dirname(path) == root else None
+
+    def is_ready(self, cid: str) -> bool:
+        path = self.cid_dir(cid)
+        return path is not None and os.path.exists(os.path.join(path, MASTER_PLAYLIST))
+
+    def current(self, cid: str) -> Optional[Job]:
+        job = self.active.get(cid)
+        if job is not None and job.status in ("queued", "running"):
+            return job
+        return None
+
+    def request(self, cid: str, source: str) -> Optional[Job]:
+        """변환 요청 (이미 변환되어 있으면 None, 진행 중이면 기존 작업 반환)"""
+        if self.cid_dir(cid) is None:
+            raise HTTPException(status_code=400, detail="Invalid CID")
+        if self.is_ready(cid):
+            return None
+        job = self.current(cid)
+        if job is None:
+            # 끝난 작업은 /jobs/{job_id} 이력으로만 남기고 여기서는 정리
+            self.active = {c: j for c, j in self.active.items() if j.status in ("queued", "running")}
+            job = self.queue.submit("transcode", lambda job: self._transcode(job, cid, source))
+            job.progress = {"transcode": 0.0}
+            self.active[cid] = job
+        return job
+
+    async def _transcode(self, job: Job, cid: str, source: str) -> dict:
+        final_dir = self.cid_dir(cid)
+        work_dir = os.path.join(os.path.dirname(final_dir), f".{cid}.tmp")
+        await anyio.to_thread.run_sync(lambda: shutil.rmtree(work_dir, ignore_errors=True))
+        os.makedirs(work_dir)
+
+        try:
+            job.set_stage("probe")
+            duration = await probe_duration(source)
+
+            job.set_stage("transcode")
+            await self._run_ffmpeg(job, source, work_dir, duration)
+            job.progress["transcode"] = 1.0
+
+            self._write_master_playlist(work_dir)
+
+            # 모든 렌디션이 끝난 뒤 한 번에 공개
+            await anyio.to_thread.run_sync(self._publish, work_dir, final_dir)
+        except BaseException:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+        # LRU 제거(rmtree, 디렉토리 크기 계산)는 이벤트 루프 밖에서
+        pinned = [c for c in self.active if self.current(c)]
+        await anyio.to_thread.run_sync(lambda: self.cache.add(cid, pinned=pinned))
+        return {
+            "cid": cid,
+            "master_playlist": f"/stream/{cid}/{MASTER_PLAYLIST}",
+            "renditions": [rendition.name for rendition in self.renditions],
+        }
+
+    @staticmethod
+    def _publish(work_dir: str, final_dir: str):
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(work_dir, final_dir)
+
+    async def _run_ffmpeg(self, job: Job, source: str, work_dir: str, duration: Optional[float]):
+        """소스를 한 번만 읽어 모든 렌디션을 출력 (렌디션마다 IPFS 게이트웨이에서 다시 받지 않도록)"""
+        args = FFMPEG_BIN + [
+            "-nostdin", "-y", "-loglevel", "error", "-nostats", "-progress", "pipe:1",
+            "-i", source,
+        ]
+        for rendition in self.renditions:
+            out_dir = os.path.join(work_dir, rendition.name)
+            os.makedirs(out_dir, exist_ok=True)
+            args += [
+                "-map", "0:v:0", "-map", "0:a:0?",
+                "-vf", f"scale=-2:{rendition.height}",
+                "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+                "-b:v", rendition.video_bitrate, "-maxrate", rendition.video_bitrate, "-bufsize", rendition.video_bitrate,
+                "-g", str(self.segment_seconds * 30), "-sc_threshold", "0",
+                "-c:a", "aac", "-b:a", rendition.audio_bitrate, "-ac", "2",
+                "-f", "hls", "-hls_time", str(self.segment_seconds), "-hls_playlist_type", "vod",
+                "-hls_segment_filename", os.path.join(out_dir, "seg_%05d.ts"),
+                os.path.join(out_dir, "index.m3u8"),
+            ]
+        with observe("subprocess", "ffmpeg"):
+            await self._wait_ffmpeg(job, args, duration)
+
+    async def _wait_ffmpeg(self, job: Job, args: List[str], duration: Optional[float]):
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+
+        async def read_progress():
+            # -progress 출력의 out_time_us 로 진행률 갱신 (한 프로세스가 모든 렌디션을 함께 쓰므로 값은 하나)
+            async for line in process.stdout:
+                key, _, value = line.decode(errors="replace").strip().partition("=")
+                if key == "out_time_us" and duration and value.isdigit():
+                    job.progress["transcode"] = min(int(value) / 1e6 / duration, 0.99)
+
+        try:
+            _, stderr = await asyncio.wait_for(
+                asyncio.gather(read_progress(), process.stderr.read()), TRANSCODE_COMMAND_TIMEOUT
+            )
+            await process.wait()
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+
+        if process.returncode != 0:
+            raise CommandError(args, process.returncode, stderr=stderr.decode(errors="replace"))
+
+    def _write_master_playlist(self, work_dir: str):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        for rendition in self.renditions:
+            lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={rendition.bandwidth},RESOLUTION={rendition.width}x{rendition.height}")
+            lines.append(f"{rendition.name}/index.m3u8")
+        with open(os.path.join(work_dir, MASTER_PLAYLIST), "w") as f:
+            f.write("\n".join(lines) + "\n")
@@ -0,0 +1,146 @@
+import os
+import re
+import uuid
+import hashlib
+import tempfile
+from dataclasses import dataclass
+from typing import Sequence
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from metrics import UPLOAD_BYTES
+
+# 업로드 스트리밍 설정 (환경 변수로 조정 가능)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1 MiB
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(20 * 1024 ** 3)))  # 20 GiB
+# multipart 경계 / json_data 등 파일 외 부분에 허용하는 여유 (요청 본문 한도 = MAX_UPLOAD_SIZE + 이 값)
+UPLOAD_FORM_OVERHEAD = int(os.getenv("UPLOAD_FORM_OVERHEAD", str(1024 * 1024)))
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str
+
+
+def safe_filename(filename: str) -> str:
+    """클라이언트가 보낸 파일명에서 경로 성분을 제거"""
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    if name in ("", ".", ".."):
+        raise HTTPException(status_code=400, detail="Invalid file name")
+    return name
+
+
+def stored_filename(name: str, sha256: str) -> str:
+    """업로드마다 다른 저장 파일명 (<SHA-256 앞 16자리>-<임의 8자리>-<원래 이름>)
+
+    같은 이름의 다른 파일이 기존 업로드 (색인이 가리키는 파일) 를 덮어쓰지 않도록
+    """
+    return f"{sha256[:16]}-{uuid.uuid4().hex[:8]}-{name}"
+
+
+def original_filename(stored_name: str) -> str:
+    """stored_filename 으로 저장한 이름 → 클라이언트가 보낸 원래 이름"""
+    return re.sub(r"^[0-9a-f]{16}-[0-9a-f]{8}-", "", stored_name)
+
+
+def too_large(max_size: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File exceeds the maximum upload size ({max_size} bytes)")
+
+
+class UploadSizeLimitMiddleware:
+    """업로드 경로의 요청 본문 크기 제한 (ASGI 미들웨어)
+
+    multipart 본문은 핸들러가 실행되기 전에 임시 파일로 모두 받아지므로 핸들러의 크기 검사로는 늦음,
+    Content-Length 가 한도를 넘으면 본문을 읽기 전에 413, 없거나 (chunked) 실제 본문이 더 길면 받은 바이트가 한도를 넘는 즉시 중단
+    """
+
+    def __init__(self, app, paths: Sequence[str], max_size: int = MAX_UPLOAD_SIZE, overhead: int = UPLOAD_FORM_OVERHEAD):
+        self.app = app
+        self.paths = set(paths)
+        self.max_size = max_size
+        self.limit = max_size + overhead
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.limit:
+            response = JSONResponse({"detail": too_large(self.max_size).detail}, status_code=413, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    # 본문 파싱 중 발생 → FastAPI 가 그대로 다시 던져 413 응답
+                    raise too_large(self.max_size)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class HashingReader:
+    """UploadFile 을 고정 크기 청크로 읽으면서 SHA-256 과 크기를 계산 (최대 크기 초과 시 413)"""
+
+    def __init__(self, file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE, max_size: int = MAX_UPLOAD_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    async def chunks(self):
+        if self.file.size is not None and self.file.size > self.max_size:
+            raise too_large(self.max_size)  # 이미 받아 둔 파일은 읽기 전에 거부
+        received = UPLOAD_BYTES.labels("upload")
+        while True:
+            chunk = await self.file.read(self.chunk_size)
+            if not chunk:
+                break
+            self.size += len(chunk)
+            received.inc(len(chunk))
+            if self.size > self.max_size:
+                raise too_large(self.max_size)
+            self._digest.update(chunk)
+            yield chunk
+
+
+async def save_upload_stream(
+    file: UploadFile,
+    dest_dir: str,
+    filename: str = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    max_size: int = MAX_UPLOAD_SIZE,
+) -> StoredUpload:
+    """업로드 파일을 고정 크기 청크로 임시 파일에 기록하고 SHA-256 계산 후 업로드마다 다른 이름 (stored_filename) 으로 rename"""
+    name = safe_filename(filename or file.filename)
+    reader = HashingReader(file, chunk_size, max_size)
+
+    # 같은 디렉토리에 임시 파일을 만들어야 os.replace 가 원자적으로 동작함
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".part", dir=dest_dir)
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            async for chunk in reader.chunks():
+                buffer.write(chunk)
+        final_path = os.path.join(dest_dir, stored_filename(name, reader.sha256))
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return StoredUpload(path=final_path, size=reader.size, sha256=reader.sha256)
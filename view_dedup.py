@@ -0,0 +1,240 @@
+import os
+import math
+import time
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import anyio
+import redis.asyncio as redis
+
+# 같은 (cid, blockchain_address, provider_wallet[, tx_hash]) 접속 기록이 이 시간(초) 안에 다시 오면 버림
+VIEW_DEDUP_BACKEND = os.getenv("VIEW_DEDUP_BACKEND", "bloom")  # bloom | redis | off
+VIEW_DEDUP_WINDOW = int(os.getenv("VIEW_DEDUP_WINDOW", "600"))
+# bloom: 창을 N 개 시간 구간으로 나눠 구간마다 필터 하나 (오래된 구간은 통째로 버림 → 메모리 상한 = (N+1) × 필터 크기)
+VIEW_DEDUP_BUCKETS = int(os.getenv("VIEW_DEDUP_BUCKETS", "4"))
+VIEW_DEDUP_BUCKET_CAPACITY = int(os.getenv("VIEW_DEDUP_BUCKET_CAPACITY", "1000000"))
+VIEW_DEDUP_ERROR_RATE = float(os.getenv("VIEW_DEDUP_ERROR_RATE", "0.001"))  # 새 기록을 중복으로 잘못 버릴 확률 목표
+# 이보다 많은 기록은 스레드에서 처리 (이벤트 루프를 막지 않도록)
+VIEW_DEDUP_THREAD_THRESHOLD = int(os.getenv("VIEW_DEDUP_THREAD_THRESHOLD", "256"))
+
+VIEW_DEDUP_PREFIX = "view_dedup"
+VIEW_DEDUP_MAX_FORGOTTEN = 100000
+
+
+def view_key(row: tuple) -> bytes:
+    """접속 기록 행 (cid, blockchain_address, provider_wallet, ..., tx_hash) → 중복 판단 키
+    (결제 트랜잭션이 있으면 키에 포함: 창 안에서 새로 결제한 시청은 중복이 아님)"""
+    tx_hash = row[6] if len(row) > 6 else None
+    key = f"{row[0]}\x1f{row[1]}\x1f{row[2]}"
+    return (f"{key}\x1f{tx_hash.lower()}" if tx_hash else key).encode()
+
+
+def bloom_bits(capacity: int, error_rate: float) -> int:
+    """capacity 개를 오탐률 error_rate 로 담는 데 필요한 비트 수"""
+    return max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+
+
+class BloomFilter:
+    """고정 크기 Bloom filter (capacity 개까지 오탐률 error_rate 이하)"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = bloom_bits(capacity, error_rate)
+        # blake2b 한 번(최대 64바이트)을 32비트 값 k 개로 나눠 위치로 사용 → k 는 최대 16
+        self.hashes = min(16, max(1, round(self.size / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        self._unpack = struct.Struct(f"<{self.hashes}I").unpack
+
+    def positions(self, key: bytes) -> List[int]:
+        size = self.size
+        return [value % size for value in self._unpack(hashlib.blake2b(key, digest_size=4 * self.hashes).digest())]
+
+    def contains(self, positions: List[int]) -> bool:
+        bits = self._bits
+        for p in positions:
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def add(self, positions: List[int]):
+        bits = self._bits
+        for p in positions:
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        return self.contains(self.positions(key))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+
+def seen(filters: List[BloomFilter], positions: List[int]) -> bool:
+    for bloom in filters:
+        if bloom.contains(positions):
+            return True
+    return False
+
+
+class BloomViewDedup:
+    """시간 구간별 Bloom filter 로 창 안의 중복 판단 (프로세스 내, 창 길이 ~ 창 + 한 구간 동안 중복으로 처리)"""
+
+    def __init__(
+        self,
+        window: int = VIEW_DEDUP_WINDOW,
+        buckets: int = VIEW_DEDUP_BUCKETS,
+        bucket_capacity: int = VIEW_DEDUP_BUCKET_CAPACITY,
+        error_rate: float = VIEW_DEDUP_ERROR_RATE,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.window = window
+        self.buckets = buckets
+        self.bucket_seconds = max(window / buckets, 1e-3)
+        self.bucket_capacity = bucket_capacity
+        # 최대 buckets + 1 개 필터를 함께 확인하므로 필터 하나의 오탐률은 목표의 1/(buckets+1)
+        self.filter_error_rate = error_rate / (buckets + 1)
+        self.error_rate = error_rate
+        self.max_memory_bytes = (buckets + 1) * ((bloom_bits(bucket_capacity, self.filter_error_rate) + 7) // 8)
+        self.clock = clock
+        self.accepted = 0
+        self.duplicates = 0
+        self._filters: Dict[int, BloomFilter] = {}
+        # 저장하지 못한 기록 (Bloom filter 에서 지울 수 없으므로 다음 한 번은 통과시킴)
+        self._forgotten: "OrderedDict[bytes, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _active(self, now: float) -> List[BloomFilter]:
+        current = int(now // self.bucket_seconds)
+        for index in [index for index in self._filters if index < current - self.buckets]:
+            del self._filters[index]
+        if current not in self._filters:
+            self._filters[current] = BloomFilter(self.bucket_capacity, self.filter_error_rate)
+        return [self._filters[index] for index in sorted(self._filters)]
+
+    def filter_sync(self, rows: List[tuple]) -> List[tuple]:
+        """중복이 아닌 행만 반환 (같은 묶음 안의 중복도 제거)"""
+        accepted = []
+        with self._lock:
+            filters = self._active(self.clock())
+            current = filters[-1]
+            for row in rows:
+                key = view_key(row)
+                positions = current.positions(key)
+                if key in self._forgotten:
+                    del self._forgotten[key]
+                elif seen(filters, positions):
+                    self.duplicates += 1
+                    continue
+                current.add(positions)
+                accepted.append(row)
+            self.accepted += len(accepted)
+        return accepted
+
+    async def filter(self, rows: List[tuple]) -> List[tuple]:
+        if len(rows) > VIEW_DEDUP_THREAD_THRESHOLD:
+            return await anyio.to_thread.run_sync(self.filter_sync, rows)
+        return self.filter_sync(rows)
+
+    async def forget(self, rows: List[tuple]):
+        """filter() 는 통과했지만 저장하지 못한 기록 (재시도가 중복으로 버려지지 않도록)"""
+        with self._lock:
+            for row in rows:
+                self._forgotten[view_key(row)] = None
+            while len(self._forgotten) > VIEW_DEDUP_MAX_FORGOTTEN:
+                self._forgotten.popitem(last=False)
+            self.accepted -= len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            filters = list(self._filters.values())
+        return {
+            "backend": "bloom",
+            "window": self.window,
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "buckets": len(filters),
+            "bucket_fill": [round(bloom.count / bloom.capacity, 4) for bloom in filters],
+            "saturated": any(bloom.count > bloom.capacity for bloom in filters),  # 용량 초과 시 오탐률 증가
+            "memory_bytes": sum(bloom.memory_bytes for bloom in filters),
+            "max_memory_bytes": self.max_memory_bytes,
+            "error_rate": self.error_rate,
+        }
+
+
+class RedisViewDedup:
+    """Redis SET NX EX 로 중복 판단 (워커 간 공유, 오탐 없음, 키는 창이 지나면 만료)"""
+
+    def __init__(self, client: redis.Redis, window: int = VIEW_DEDUP_WINDOW):
+        self.client = client
+        self.window = window
+        self.accepted = 0
+        self.duplicates = 0
+        self.redis_errors = 0
+
+    @staticmethod
+    def key(row: tuple) -> str:
+        return f"{VIEW_DEDUP_PREFIX}:{hashlib.blake2b(view_key(row), digest_size=16).hexdigest()}"
+
+    async def filter(self, rows: List[tuple]) -> List[tuple]:
+        if not rows:
+            return []
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for row in rows:
+                    pipe.set(self.key(row), 1, nx=True, ex=self.window)
+                results = await pipe.execute()
+        except redis.RedisError:
+            # Redis 장애 시 기록을 잃지 않도록 중복 제거 없이 통과
+            self.redis_errors += 1
+            self.accepted += len(rows)
+            return rows
+        accepted = [row for row, created in zip(rows, results) if created]
+        self.accepted += len(accepted)
+        self.duplicates += len(rows) - len(accepted)
+        return accepted
+
+    async def forget(self, rows: List[tuple]):
+        """filter() 는 통과했지만 저장하지 못한 기록 (재시도가 중복으로 버려지지 않도록)"""
+        if not rows:
+            return
+        try:
+            await self.client.delete(*(self.key(row) for row in rows))
+        except redis.RedisError:
+            self.redis_errors += 1
+            return
+        self.accepted -= len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "window": self.window,
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "redis_errors": self.redis_errors,
+            # 키 하나 ≈ 100 바이트, 창 안의 고유 접속 수만큼만 유지
+        }
+
+
+class NoViewDedup:
+    async def filter(self, rows: List[tuple]) -> List[tuple]:
+        return rows
+
+    async def forget(self, rows: List[tuple]):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "off"}
+
+
+def create_view_dedup(client: Optional[redis.Redis], backend: str = VIEW_DEDUP_BACKEND):
+    if backend == "redis":
+        return RedisViewDedup(client)
+    if backend == "off":
+        return NoViewDedup()
+    return BloomViewDedup()
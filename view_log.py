@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Iterable, List, Optional
+
+from fastapi import HTTPException
+
+from db import Database, is_locked
+
+logger = logging.getLogger("gateway")
+
+# 접속 기록은 메모리에 모았다가 N ms 또는 M 건마다 한 트랜잭션으로 저장
+VIEW_FLUSH_INTERVAL_MS = int(os.getenv("VIEW_FLUSH_INTERVAL_MS", "200"))
+VIEW_FLUSH_MAX_ROWS = int(os.getenv("VIEW_FLUSH_MAX_ROWS", "1000"))
+# 저장되지 않은 기록이 이만큼 쌓이면 503 (DB 가 따라오지 못할 때 메모리 무한 증가 방지)
+VIEW_BUFFER_MAX_ROWS = int(os.getenv("VIEW_BUFFER_MAX_ROWS", "100000"))
+# 잠김이 아닌 오류로 저장할 수 없는 기록 (JSON 한 줄씩, 원인 포함) - 나머지 기록은 계속 저장
+VIEW_DEAD_LETTER_PATH = os.getenv("VIEW_DEAD_LETTER_PATH", "./view_dead_letter.jsonl")
+
+VIEW_COLUMNS = ("cid", "blockchain_address", "provider_wallet", "creator_wallet", "price", "timestamp", "tx_hash")
+INSERT_VIEWS = f"""
+    INSERT INTO streaming_access_logs ({", ".join(VIEW_COLUMNS)})
+    VALUES ({", ".join("?" for _ in VIEW_COLUMNS)})
+"""
+
+
+class ViewLogWriter:
+    """streaming_access_logs write-behind 버퍼 (백그라운드 스레드가 묶어서 group commit, 종료 시 남은 기록 모두 저장)"""
+
+    def __init__(
+        self,
+        db: Database,
+        flush_interval_ms: int = VIEW_FLUSH_INTERVAL_MS,
+        max_batch: int = VIEW_FLUSH_MAX_ROWS,
+        max_pending: int = VIEW_BUFFER_MAX_ROWS,
+        after_insert: Optional[Callable[[sqlite3.Connection], Any]] = None,
+        dead_letter_path: str = VIEW_DEAD_LETTER_PATH,
+    ):
+        self.db = db
+        self.dead_letter_path = dead_letter_path
+        self.after_insert = after_insert  # 같은 트랜잭션에서 실행할 후처리 (예: 수익 집계 갱신)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.last_flush_ms = 0.0
+        self._pending: Deque[tuple] = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, rows: Iterable[tuple]) -> int:
+        """기록 추가 (저장은 비동기, 버퍼가 가득 차면 503)"""
+        rows = list(rows)
+        with self._cond:
+            if len(self._pending) + len(rows) > self.max_pending:
+                raise HTTPException(status_code=503, detail="접속 기록 버퍼가 가득 찼습니다. 잠시 후 다시 시도하세요.")
+            self._pending.extend(rows)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return len(rows)
+
+    def _take(self) -> List[tuple]:
+        with self._cond:
+            count = min(len(self._pending), self.max_batch)
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _insert(self, conn: sqlite3.Connection, batch: List[tuple]):
+        conn.executemany(INSERT_VIEWS, batch)
+        if self.after_insert is not None:
+            self.after_insert(conn)
+
+    def _dead_letter(self, row: tuple, error: Exception):
+        self.dead_lettered += 1
+        logger.error("view log row dropped to %s: %s %r", self.dead_letter_path, error, row)
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"row": list(row), "error": str(error), "failed_at": int(time.time())}) + "\n")
+        except OSError as e:
+            logger.error("failed to write view log dead letter: %s", e)
+
+    def _write(self, batch: List[tuple]) -> List[tuple]:
+        """한 트랜잭션으로 저장, 잠김 때문에 저장하지 못한 기록 반환
+
+        잠김이 아닌 오류 (잘못된 기록, after_insert 실패 등) 는 묶음을 반씩 나눠 다시 저장하고
+        한 건만 남아도 실패하는 기록은 dead letter 파일로 보냄 → 기록 하나가 전체 저장을 막지 않음
+        """
+        start = time.perf_counter()
+        try:
+            self.db.write(lambda conn: self._insert(conn, batch))
+        except Exception as e:
+            self.failures += 1
+            if is_locked(e):
+                return batch
+            if len(batch) == 1:
+                self._dead_letter(batch[0], e)
+                return []
+            logger.warning("view log flush failed (%d rows), splitting the batch: %s", len(batch), e)
+            middle = len(batch) // 2
+            left = self._write(batch[:middle])
+            if left:
+                return left + batch[middle:]
+            return self._write(batch[middle:])
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+        self.written += len(batch)
+        self.batches += 1
+        return []
+
+    def flush(self) -> int:
+        """버퍼에 있는 기록을 모두 저장 (저장한 건수 반환)"""
+        written = self.written
+        while True:
+            batch = self._take()
+            if not batch:
+                break
+            left = self._write(batch)
+            if left:
+                # DB 가 잠겨 있으면 순서를 유지한 채 버퍼 앞쪽으로 되돌리고 다음 주기에 재시도
+                logger.warning("view log flush failed, database is locked (%d rows kept)", len(left))
+                with self._cond:
+                    self._pending.extendleft(reversed(left))
+                break
+        return self.written - written
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._pending) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="view-log-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """남은 기록을 모두 저장한 뒤 스레드 종료"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "max_batch": self.max_batch,
+        }